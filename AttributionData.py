@@ -0,0 +1,150 @@
+### Columnar input layer for PortfolioAttribution.py
+### Orders, NAV, history and holidays are read from Parquet, CSV or Arrow (Feather) files, only the columns named in the
+### mappings are read, and the frames come back already mapped (target column names, SIDE values, typed columns), so
+### portfolio_attribution uses them as they are. load_workbook converts the Excel workbook once into columnar copies
+### in cache_dir and reads those on later runs.
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from PortfolioAttribution import nav_mapping, orders_mapping, orders_value_mapping
+
+DEFAULT_CACHE_DIR = '.attribution_cache'
+
+# Sheets of the attribution workbook
+workbook_sheets = {'orders': 'Ordens', 'history': 'Historico', 'holidays': 'Feriados', 'nav': 'Cotas'}
+
+# Types of the mapped columns, the ones not listed stay as read
+orders_dtypes = {'DATE': 'datetime64[ns]', 'QUANTITY': np.float64, 'PRICE': np.float64, 'TOTAL ORDER VALUE': np.float64}
+nav_dtypes = {'DATE': 'datetime64[ns]', 'NAV': np.float64, 'QUANTITY': np.float64, 'NAVPS': np.float64}
+
+
+def _file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.parquet', '.pq'):
+        return 'parquet'
+    if extension in ('.feather', '.arrow', '.ipc'):
+        return 'feather'
+    if extension in ('.csv', '.txt'):
+        return 'csv'
+    raise ValueError(f"File format '{extension}' is not supported, use Parquet, CSV or Arrow (Feather).")
+
+
+def _file_columns(path):
+    # Column names from the file schema, without reading any data
+    file_format = _file_format(path)
+    if file_format == 'csv':
+        return list(pd.read_csv(path, nrows=0).columns)
+    import pyarrow as pa # Only needed for the columnar formats
+    import pyarrow.parquet as pq
+
+    schema = pq.read_schema(path) if file_format == 'parquet' else pa.ipc.open_file(path).schema
+    return list(schema.names)
+
+
+def read_table(path, columns=None):
+    # Reads a Parquet, CSV or Arrow (Feather) file, only the given columns when columns is not None
+    file_format = _file_format(path)
+    if file_format == 'parquet':
+        return pd.read_parquet(path, columns=columns)
+    if file_format == 'feather':
+        return pd.read_feather(path, columns=columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+def _read_mapped(path, column_mapping, dtypes, value_mappings=None, drop_empty=False):
+    # Reads only the mapped source columns and returns them under the target names, with the value mappings and dtypes
+    # applied. Target columns whose source is missing from the file stay empty, like create_dataframe_from_mapping.
+    # drop_empty drops the rows with every mapped column empty (the orders); the NAV keeps all its rows, since the
+    # attribution takes its base dates by position
+    value_mappings = value_mappings or {}
+    available = set(_file_columns(path))
+    sources = [source for source in dict.fromkeys(column_mapping.values()) if source in available]
+    data = read_table(path, sources)
+    if drop_empty:
+        data = data.dropna(how='all')
+
+    mapped = pd.DataFrame(index=data.index)
+    for target, source in column_mapping.items():
+        column = data[source] if source in available else pd.Series(np.nan, index=data.index)
+        if target in value_mappings:
+            column = column.map(value_mappings[target]).fillna(column)
+        mapped[target] = column.astype(dtypes[target]) if target in dtypes else column
+    return mapped
+
+
+def load_orders(path):
+    return _read_mapped(path, orders_mapping, orders_dtypes, orders_value_mapping, drop_empty=True)
+
+
+def load_nav(path):
+    return _read_mapped(path, nav_mapping, nav_dtypes)
+
+
+def load_history(path):
+    # Dates in the first column, one float64 column per security or currency
+    history = read_table(path)
+    history = history.set_index(history.columns[0]) if not isinstance(history.index, pd.DatetimeIndex) else history
+    history.index = pd.to_datetime(history.index)
+    return history.astype(np.float64)
+
+
+def load_holidays(path):
+    return pd.to_datetime(read_table(path).iloc[:, 0])
+
+
+def _workbook_signature(path):
+    # What the cached copies were made from: the workbook's absolute path, size and modification time
+    status = os.stat(path)
+    return {'source': os.path.abspath(path), 'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+
+
+def _read_signature(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_sheet(workbook, sheet, cache_path):
+    # Columnar copy of one sheet
+    if sheet == workbook_sheets['history']:
+        data = pd.read_excel(workbook, sheet_name=sheet, index_col=0).rename_axis('Data').reset_index()
+    elif sheet == workbook_sheets['holidays']:
+        data = pd.read_excel(workbook, sheet_name=sheet, header=None).iloc[:, :1].set_axis(['Data'], axis=1)
+    else:
+        data = pd.read_excel(workbook, sheet_name=sheet)
+    data.columns = data.columns.astype(str)
+
+    file_format = _file_format(cache_path)
+    if file_format == 'parquet':
+        data.to_parquet(cache_path, index=False)
+    elif file_format == 'feather':
+        data.to_feather(cache_path)
+    else:
+        data.to_csv(cache_path, index=False)
+
+
+def load_workbook(path, cache_dir=DEFAULT_CACHE_DIR, cache_format='parquet'):
+    # Orders, history, holidays and NAV of the attribution workbook, through columnar copies of its sheets in cache_dir.
+    # Returns (orders, history, holidays, nav_data) ready for portfolio_attribution.
+    # The copies are named after the workbook and a hash of its absolute path, so workbooks with the same name in other
+    # folders never share them, and are only used while the workbook keeps the size and modification time recorded in
+    # their signature file (written last, so an interrupted conversion is redone).
+    os.makedirs(cache_dir, exist_ok=True)
+    signature = _workbook_signature(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    prefix = os.path.join(cache_dir, f"{name}-{hashlib.blake2b(signature['source'].encode(), digest_size=8).hexdigest()}")
+    files = {key: f'{prefix}.{sheet}.{cache_format}' for key, sheet in workbook_sheets.items()}
+    if _read_signature(prefix + '.json') != signature or not all(os.path.exists(file) for file in files.values()):
+        for key, sheet in workbook_sheets.items():
+            _write_sheet(path, sheet, files[key])
+        with open(prefix + '.json.tmp', 'w') as file:
+            json.dump(signature, file)
+        os.replace(prefix + '.json.tmp', prefix + '.json')
+    return load_orders(files['orders']), load_history(files['history']), load_holidays(files['holidays']), load_nav(files['nav'])
@@ -0,0 +1,70 @@
+### Business-day calendar for the attribution date logic
+### Built once from the holiday list: a sorted array of business days (weekdays that are not holidays) answers the
+### next/previous business day, date range and month/year boundary queries with binary searches (O(log n)) instead of
+### walking the dates one day at a time. Every query takes a single date or an array of dates.
+
+import numpy as np
+import pandas as pd
+
+
+class BusinessCalendar:
+    def __init__(self, holidays=(), start='1970-01-01', end='2100-12-31'):
+        holidays = pd.to_datetime(pd.Index(list(holidays))).dropna()
+        self.holidays = np.unique(holidays.to_numpy().astype('datetime64[D]'))
+        days = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
+        self.days = days[np.is_busday(days, holidays=self.holidays)]
+
+    @staticmethod
+    def _to_days(dates):
+        if isinstance(dates, np.ndarray) and dates.dtype.kind == 'M':
+            return dates.astype('datetime64[D]')
+        if np.ndim(dates):
+            return pd.to_datetime(dates).to_numpy().astype('datetime64[D]')
+        return np.asarray(pd.Timestamp(dates).to_datetime64()).astype('datetime64[D]')
+
+    def _from_positions(self, positions, scalar):
+        if np.any((positions < 0) | (positions >= len(self.days))):
+            raise ValueError(f'Dates must be within the calendar ({self.days[0]} to {self.days[-1]}).')
+        days = self.days[positions]
+        return pd.Timestamp(days) if scalar else pd.DatetimeIndex(days.astype('datetime64[ns]'))
+
+    def next(self, dates):
+        # First business day on or after each date
+        days = self._to_days(dates)
+        return self._from_positions(np.searchsorted(self.days, days, side='left'), days.ndim == 0)
+
+    def previous(self, dates):
+        # Last business day on or before each date
+        days = self._to_days(dates)
+        return self._from_positions(np.searchsorted(self.days, days, side='right') - 1, days.ndim == 0)
+
+    def is_business_day(self, dates):
+        days = self._to_days(dates)
+        positions = np.minimum(np.searchsorted(self.days, days), len(self.days) - 1)
+        return self.days[positions] == days
+
+    def range(self, start_date, end_date):
+        # Business days between start_date and end_date (inclusive)
+        start, end = np.searchsorted(self.days, self._to_days(start_date)), np.searchsorted(self.days, self._to_days(end_date), side='right')
+        return pd.DatetimeIndex(self.days[start:end].astype('datetime64[ns]'))
+
+    def month_start(self, dates):
+        # First business day of the month of each date
+        return self.next(self._to_days(dates).astype('datetime64[M]').astype('datetime64[D]'))
+
+    def previous_month_end(self, dates):
+        # Last business day of the month before the month of each date
+        return self.previous(self._to_days(dates).astype('datetime64[M]').astype('datetime64[D]') - 1)
+
+    def year_start(self, dates):
+        # First business day of the year of each date
+        return self.next(self._to_days(dates).astype('datetime64[Y]').astype('datetime64[D]'))
+
+    def previous_year_end(self, dates):
+        # Last business day of the year before the year of each date
+        return self.previous(self._to_days(dates).astype('datetime64[Y]').astype('datetime64[D]') - 1)
+
+
+def business_calendar(holidays):
+    # The calendar itself, or one built from a holiday list (Series, DatetimeIndex or list of dates)
+    return holidays if isinstance(holidays, BusinessCalendar) else BusinessCalendar(holidays)
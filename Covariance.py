@@ -0,0 +1,112 @@
+### Covariance estimators for the optimizers, all computed from a returns frame (dates x assets)
+### The sample, Ledoit-Wolf and EWMA estimators return dense matrices (DataFrames like returns.cov()). The factor model
+### returns a FactorCovariance (loadings B, factor covariance F and specific variances d, Sigma = B F B' + diag(d)) that
+### the optimizers use without ever building the N x N matrix: every Sigma @ w costs O(N*k) instead of O(N^2).
+
+import numpy as np
+import pandas as pd
+
+
+class FactorCovariance:
+    def __init__(self, loadings, factor_covariance, specific_variance, index=None):
+        self.loadings = np.asarray(loadings, dtype=float)                     # N x k
+        self.factor_covariance = np.asarray(factor_covariance, dtype=float)   # k x k
+        self.specific_variance = np.asarray(specific_variance, dtype=float)   # N
+        self.index = index
+
+    @property
+    def shape(self):
+        return (len(self.specific_variance), len(self.specific_variance))
+
+    def dot(self, weights):
+        # Sigma @ weights for a vector or an (N x m) matrix of weights
+        weights = np.asarray(weights, dtype=float)
+        specific = self.specific_variance if weights.ndim == 1 else self.specific_variance[:, None]
+        return self.loadings @ (self.factor_covariance @ (self.loadings.T @ weights)) + specific * weights
+
+    __matmul__ = dot
+
+    def variance(self, weights):
+        exposures = self.loadings.T @ weights
+        return exposures @ self.factor_covariance @ exposures + np.sum(self.specific_variance * weights ** 2)
+
+    def diagonal(self):
+        return np.einsum('ik,kl,il->i', self.loadings, self.factor_covariance, self.loadings) + self.specific_variance
+
+    def to_dense(self):
+        return self.loadings @ self.factor_covariance @ self.loadings.T + np.diag(self.specific_variance)
+
+    def __array__(self, dtype=None, copy=None):
+        # Dense fallback for the code that needs the full matrix (np.asarray(factor_covariance))
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+
+def sample_covariance(returns):
+    return returns.cov()
+
+
+def ledoit_wolf_covariance(returns):
+    # Ledoit-Wolf (2004) shrinkage of the sample covariance towards a scaled identity with the optimal intensity,
+    # (1 - delta) S + delta * mean(diag(S)) * I. The intensity is kept in the attrs of the result ('Shrinkage').
+    X = returns.to_numpy(dtype=float)
+    X = X - X.mean(axis=0)
+    n_obs, n_assets = X.shape
+    S = X.T @ X / n_obs
+    mu = np.trace(S) / n_assets
+
+    squared_norm = np.sum(S ** 2)
+    # Sum of the squared distances between every x x' and S, without building the outer products
+    beta = (np.sum(np.sum(X ** 2, axis=1) ** 2) / n_obs - squared_norm) / n_obs
+    delta = squared_norm - 2 * mu * np.trace(S) + n_assets * mu ** 2 # ||S - mu I||^2
+    shrinkage = min(beta, delta) / delta if delta > 0 else 0.0
+
+    shrunk = (1 - shrinkage) * S
+    shrunk[np.diag_indices(n_assets)] += shrinkage * mu
+    covariance = pd.DataFrame(shrunk, index=returns.columns, columns=returns.columns)
+    covariance.attrs['Shrinkage'] = shrinkage
+    return covariance
+
+
+def ewma_covariance(returns, decay=0.94):
+    # Exponentially weighted covariance (RiskMetrics): the weight of each day falls by decay per day into the past
+    X = returns.to_numpy(dtype=float)
+    weights = decay ** np.arange(len(X) - 1, -1, -1)
+    weights /= weights.sum()
+    X = X - weights @ X
+    covariance = (X * weights[:, None]).T @ X
+    return pd.DataFrame(covariance, index=returns.columns, columns=returns.columns)
+
+
+def factor_covariance(returns, n_factors=5, factors=None):
+    # Low-rank plus diagonal model. With factors (a dates x k frame of factor returns) the loadings come from a
+    # regression of every asset on them; otherwise the factors are the first n_factors principal components.
+    X = returns.to_numpy(dtype=float)
+    X = X - X.mean(axis=0)
+    n_obs = len(X)
+
+    if factors is None:
+        if not 0 < n_factors < min(X.shape):
+            raise ValueError('n_factors must be positive and smaller than the number of dates and assets')
+        _, singular_values, components = np.linalg.svd(X, full_matrices=False)
+        loadings = components[:n_factors].T
+        factor_cov = np.diag(singular_values[:n_factors] ** 2 / (n_obs - 1))
+        residuals = X - (X @ loadings) @ loadings.T
+    else:
+        F = factors.reindex(returns.index).to_numpy(dtype=float)
+        F = F - F.mean(axis=0)
+        loadings = np.linalg.lstsq(F, X, rcond=None)[0].T
+        factor_cov = F.T @ F / (n_obs - 1)
+        residuals = X - F @ loadings.T
+
+    # Specific variances are floored so the model stays positive definite
+    specific = np.maximum(residuals.var(axis=0, ddof=1), 1e-12)
+    return FactorCovariance(loadings, factor_cov, specific, index=returns.columns)
+
+
+def estimate_covariance(returns, method='sample', **kwargs):
+    # method: 'sample', 'ledoit-wolf', 'ewma' or 'factor' (the keyword arguments go to the estimator)
+    estimators = {'sample': sample_covariance, 'ledoit-wolf': ledoit_wolf_covariance, 'ewma': ewma_covariance, 'factor': factor_covariance}
+    if method not in estimators:
+        raise ValueError('Method must be sample, ledoit-wolf, ewma or factor')
+    return estimators[method](returns, **kwargs)
@@ -1,9 +1,8 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-from PortfolioOptimization import PortfolioSimpleOptimization
-from scipy.optimize import minimize
-import matplotlib.pyplot as plt
+import Frontier
+from MarketData import load_prices
+from Covariance import estimate_covariance
 
 # Portfolio initial weights:
 portfolio =  {'XLF': 0.25,
@@ -14,59 +13,60 @@ portfolio =  {'XLF': 0.25,
 start_date, end_date = '2018-01-01', '2023-09-23' # Date range
 weight_change = 1.4 # Maximum weight change for each asset
 return_rows = 10 ** 4 # Number of return points on the efficient frontier
+covariance_method = 'sample' # 'sample', 'ledoit-wolf', 'ewma' or 'factor' (Covariance.py)
+covariance_options = {} # Estimator arguments, e.g. {'n_factors': 2} for 'factor' or {'decay': 0.97} for 'ewma'
 
-# Download stock price data
-prices = pd.DataFrame()
-for stock in list(portfolio.keys()):
-    prices[stock] = yf.download(stock).loc[start_date:end_date]['Adj Close']
 
-returns = prices.pct_change().dropna()
+def main():
+    # Load stock price data (cached on disk, only missing dates are downloaded)
+    prices = load_prices(list(portfolio.keys()), start_date, end_date)
 
-# Calculate expected covariance and returns
-expected_covariance = returns.cov()
-expected_returns = returns.mean()
+    returns = prices.pct_change().dropna()
 
-# Define the objective function to maximize return so we can optimize for maximum and minimum portfolio
-def objective(wts):
-  return np.sum((expected_returns * wts * 252))
+    # Calculate expected covariance and returns (the critical line algorithm works on the dense matrix)
+    expected_covariance = np.asarray(estimate_covariance(returns, covariance_method, **covariance_options))
+    expected_returns = returns.mean()
 
-initial_weights = np.array(list(portfolio.values()))
+    initial_weights = np.array(list(portfolio.values()))
 
-# Define bounds for portfolio weights
-bounds = []
-for wt in initial_weights:
-    bounds.append((max(-1, wt - weight_change), min(1, wt + weight_change)))
+    # Define bounds for portfolio weights
+    bounds = []
+    for wt in initial_weights:
+        bounds.append((max(-1, wt - weight_change), min(1, wt + weight_change)))
 
-# Optimize for minimum and maximum return portfolios
-min_ret_port = minimize(objective, initial_weights, method='SLSQP', bounds=bounds, constraints={'type': 'eq', 'fun': lambda x: 1 - sum(x)}).x
-max_ret_port = minimize(lambda x: -1 * objective(x), initial_weights, method='SLSQP', bounds=bounds, constraints={'type': 'eq', 'fun': lambda x: 1 - sum(x)}).x
+    # Create a range of target returns between the minimum and maximum return portfolios
+    min_return, max_return = Frontier.return_range(expected_returns.values, bounds)
+    target_returns = np.linspace(min_return, max_return, return_rows)
 
-# Create a range of target returns
-efficient_frontier = pd.DataFrame()
-efficient_frontier['Expected Return'] = np.linspace(objective(min_ret_port), objective(max_ret_port), return_rows)
+    # Calculate the efficient frontier (daily figures, annualized below)
+    frontier = Frontier.efficient_frontier(expected_returns.values, expected_covariance, target_returns, bounds, initial_weights)
 
-# Calculate the efficient frontier
-for row in efficient_frontier.index:
-    target_return = efficient_frontier.loc[row, 'Expected Return'] / 252
-    pfolio_weights = np.array(PortfolioSimpleOptimization(expected_returns.to_dict(),portfolio,expected_covariance,'MinRisk',target_return,weight_change)['Optimal Weights'])
-    efficient_frontier.loc[row, 'Expected Volatility'] = np.sqrt(np.dot(pfolio_weights.T, np.dot(expected_covariance * 252, pfolio_weights)))
+    efficient_frontier = pd.DataFrame({
+        'Expected Return': frontier['Expected Return'] * 252,
+        'Expected Volatility': frontier['Expected Volatility'] * np.sqrt(252)
+    })
     efficient_frontier['Sharpe'] = efficient_frontier['Expected Return'] / efficient_frontier['Expected Volatility']
 
-print(efficient_frontier)
+    print(efficient_frontier)
 
-# Find portfolios with max Sharpe ratio and min volatility
-max_sharpe_portfolio = efficient_frontier.loc[efficient_frontier['Sharpe'].idxmax()]
-min_volatility_portfolio = efficient_frontier.loc[efficient_frontier['Expected Volatility'].idxmin()]
+    # Find portfolios with max Sharpe ratio and min volatility
+    max_sharpe_portfolio = efficient_frontier.loc[efficient_frontier['Sharpe'].idxmax()]
+    min_volatility_portfolio = efficient_frontier.loc[efficient_frontier['Expected Volatility'].idxmin()]
 
-# Plot the efficient frontier
-plt.scatter(efficient_frontier['Expected Volatility'], efficient_frontier['Expected Return'], c=efficient_frontier['Sharpe'], cmap='viridis')
-plt.colorbar(label='Sharpe Ratio')
-plt.xlabel('Volatility')
-plt.ylabel('Return')
+    # Plot the efficient frontier (matplotlib is only needed here)
+    import matplotlib.pyplot as plt
+    plt.scatter(efficient_frontier['Expected Volatility'], efficient_frontier['Expected Return'], c=efficient_frontier['Sharpe'], cmap='viridis')
+    plt.colorbar(label='Sharpe Ratio')
+    plt.xlabel('Volatility')
+    plt.ylabel('Return')
 
-# Highlight the portfolios with max Sharpe ratio and min volatility
-plt.scatter(max_sharpe_portfolio['Expected Volatility'], max_sharpe_portfolio['Expected Return'], c='red', marker='*', s=100)
-plt.scatter(min_volatility_portfolio['Expected Volatility'], min_volatility_portfolio['Expected Return'], c='blue', marker='*', s=100)
+    # Highlight the portfolios with max Sharpe ratio and min volatility
+    plt.scatter(max_sharpe_portfolio['Expected Volatility'], max_sharpe_portfolio['Expected Return'], c='red', marker='*', s=100)
+    plt.scatter(min_volatility_portfolio['Expected Volatility'], min_volatility_portfolio['Expected Return'], c='blue', marker='*', s=100)
 
-plt.title('Efficient Frontier')
-plt.show()
\ No newline at end of file
+    plt.title('Efficient Frontier')
+    plt.show()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,477 @@
+### Efficient frontier engine used by EfficientFrontier.py and MeanCVaR_Optimization.py
+### Every function works on plain arrays (daily expected returns, covariance matrix or return scenarios and a list of
+### (lower, upper) bounds per asset) and returns preallocated NumPy arrays, so a dense frontier does not depend on
+### pandas cell-by-cell writes.
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog, minimize
+
+from Instrumentation import enabled, record, stage
+
+
+def return_range(expected_returns, bounds):
+    # Minimum and maximum return reachable with fully invested weights inside the bounds
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    min_weights, _ = _max_return_weights(-expected_returns, bounds)
+    max_weights, _ = _max_return_weights(expected_returns, bounds)
+    return min_weights @ expected_returns, max_weights @ expected_returns
+
+
+def max_return_weights(expected_returns, bounds):
+    # Fully invested weights inside the bounds with the maximum return
+    return _max_return_weights(np.asarray(expected_returns, dtype=float), bounds)[0]
+
+
+def _max_return_weights(expected_returns, bounds):
+    # LP solution of the max return portfolio: the best assets go up to their upper bound, the rest stays at the lower bound.
+    # Also returns the last asset that received weight (the only one that can sit strictly inside its bounds)
+    lower, upper = np.asarray(bounds, dtype=float).T
+    remaining = 1 - lower.sum()
+    if remaining < 0 or upper.sum() < 1:
+        raise ValueError('Bounds must allow the weights to sum to 1')
+    weights = lower.copy()
+    for i in np.argsort(expected_returns)[::-1]:
+        added = min(upper[i] - lower[i], remaining)
+        weights[i] += added
+        remaining -= added
+        if remaining <= 0:
+            break
+    return weights, i
+
+
+def _bordered_inverse(covarF_inv, covar_col, covar_ii):
+    # Inverse of [[covarF, covar_col], [covar_col', covar_ii]] from the inverse of covarF in O(k^2)
+    u = covarF_inv @ covar_col
+    schur = covar_ii - covar_col @ u
+    k = len(u)
+    inverse = np.empty((k + 1, k + 1))
+    inverse[:k, :k] = covarF_inv + np.outer(u, u) / schur
+    inverse[:k, k] = inverse[k, :k] = -u / schur
+    inverse[k, k] = 1 / schur
+    return inverse
+
+
+def _reduced_inverse(covarF_inv, j):
+    # Inverse of covarF without its j-th row and column from the inverse of covarF in O(k^2)
+    keep = np.arange(len(covarF_inv)) != j
+    return covarF_inv[np.ix_(keep, keep)] - np.outer(covarF_inv[keep, j], covarF_inv[j, keep]) / covarF_inv[j, j]
+
+
+def _break_ties(expected_returns):
+    # Assets with the same expected return (up to rounding) leave the maximum return portfolio, where the path starts,
+    # undetermined and send the pivots off the path. Within every group of ties the assets are lifted by 1e-6 of the
+    # smallest gap between distinct returns, scaled by their rank in the group, so the order is fixed and the other
+    # assets keep theirs. The solution moves by the same negligible amount.
+    order = np.argsort(expected_returns, kind='stable')
+    sorted_returns = expected_returns[order]
+    gaps = np.diff(sorted_returns)
+    tied = gaps <= 1e-12 * max(np.abs(sorted_returns).max(initial=0), np.finfo(float).tiny)
+    if not tied.any():
+        return expected_returns
+    distinct_gaps = gaps[~tied]
+    gap = distinct_gaps.min() if len(distinct_gaps) else max(np.abs(sorted_returns).max(), 1e-12)
+    group_start = np.maximum.accumulate(np.where(np.concatenate([[True], ~tied]), np.arange(len(order)), 0))
+    perturbed = expected_returns.copy()
+    perturbed[order] += 1e-6 * gap * (np.arange(len(order)) - group_start) / len(order)
+    return perturbed
+
+
+def _corner_violation(turning_weights, lambdas, mean, covar, bounds):
+    # Largest violation of the optimality (KKT) conditions of min w'Sw/2 - lambda * mu'w, sum(w) = 1, box bounds over
+    # the turning points, relative to the size of the gradient: free assets share one gradient value gamma, assets at
+    # their lower bound have a gradient >= gamma and assets at their upper bound <= gamma
+    lower, upper = np.asarray(bounds, dtype=float).T
+    tol_w = 1e-9 * max(1.0, np.abs(lower).max(), np.abs(upper).max())
+    violation = 0.0
+    for weights, lam in zip(turning_weights, lambdas):
+        violation = max(violation, abs(weights.sum() - 1), (lower - weights).max(), (weights - upper).max())
+        if not np.isfinite(lam):
+            continue
+        gradient = covar @ weights - lam * mean
+        scale = np.abs(covar @ weights).max() + lam * np.abs(mean).max()
+        at_lower, at_upper = weights <= lower + tol_w, weights >= upper - tol_w
+        free = ~(at_lower | at_upper)
+        if free.any():
+            gamma = np.median(gradient[free])
+            violation = max(violation, np.abs(gradient[free] - gamma).max() / scale)
+        else:
+            gamma = gradient[at_upper & ~at_lower].max(initial=-np.inf)
+        violation = max(violation, (gamma - gradient[at_lower & ~at_upper]).max(initial=0) / scale,
+                        (gradient[at_upper & ~at_lower] - gamma).max(initial=0) / scale)
+    return violation
+
+
+def critical_line(expected_returns, covariance, bounds):
+    # Critical Line Algorithm (Markowitz) for min w'Sw/2 - lambda * mu'w subject to sum(w) = 1 and box bounds.
+    # Returns the turning points from the maximum return portfolio (lambda = inf) down to the minimum variance portfolio
+    # (lambda = 0), between two turning points the optimal weights are linear in the target return.
+    # The inverse of the free covariance block is updated in O(k^2) per event and every candidate event is evaluated
+    # in one vectorized pass, so the whole path costs O(n^2) per turning point.
+    # Ties in the expected returns are broken by a tiny perturbation (see _break_ties), and a ValueError is raised when
+    # a turning point misses the optimality conditions (see _corner_violation).
+    turning_weights, lambdas, violation = _critical_line(expected_returns, covariance, bounds)
+    if violation > 1e-6:
+        raise ValueError(f'Critical line turning point is not optimal (relative KKT violation {violation:.1e})')
+    return turning_weights, lambdas
+
+
+def _critical_line(expected_returns, covariance, bounds):
+    # critical_line without the check, also returns the KKT violation of the turning points
+    mean = _break_ties(np.asarray(expected_returns, dtype=float))
+    covar = np.asarray(covariance, dtype=float)
+    lower, upper = np.asarray(bounds, dtype=float).T
+    n = len(mean)
+
+    # Start at the maximum return portfolio, the last asset that was filled is the first free asset
+    weights, free_asset = _max_return_weights(mean, bounds)
+    free = [free_asset]
+    covarF_inv = np.array([[1 / covar[free_asset, free_asset]]])
+    turning_weights, lambdas = [weights.copy()], [np.inf]
+    current_lambda = np.inf
+
+    while True:
+        is_free = np.zeros(n, dtype=bool)
+        is_free[free] = True
+        F, B = np.array(free), np.flatnonzero(~is_free)
+        meanF, wB = mean[F], weights[B]
+        c4 = covarF_inv.sum(axis=1)             # covarF_inv @ 1
+        c2 = covarF_inv @ meanF
+        c1, c3 = c4.sum(), c4 @ meanF
+        covar_wB = covar[:, B] @ wB
+        l1 = wB.sum()
+        l2 = covarF_inv @ covar_wB[F]
+        l3 = l2.sum()
+        tolerance = 1e-9 * max(1, abs(current_lambda)) if np.isfinite(current_lambda) else 0
+
+        # Case a) one free asset moves to the bound it is heading to. A free asset that already sits on that bound
+        # (degenerate corner, e.g. uniform bounds that fill exactly) hits it at the current lambda and is bounded right away
+        lambda_in = None
+        if len(F) > 1:
+            c = -c1 * c2 + c3 * c4
+            bi = np.where(c > 0, upper[F], lower[F])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lam = ((1 - l1 + l3) * c4 - c1 * (bi + l2)) / c
+            lam[(c == 0) | ~(lam <= current_lambda + tolerance)] = -np.inf
+            # Rounding of the event lambda (large after a tie was broken) must not let an asset on its bound go past it
+            on_bound = np.where(c > 0, weights[F] >= upper[F] - 1e-12, weights[F] <= lower[F] + 1e-12)
+            lam[on_bound & (c != 0)] = current_lambda
+            j = np.argmax(lam)
+            if np.isfinite(lam[j]):
+                lambda_in, position_in, bound_in = min(lam[j], current_lambda), j, bi[j]
+
+        # Case b) one bounded asset becomes free, the enlarged system is expressed through the bordered inverse
+        lambda_out = None
+        if len(B):
+            covarFB = covar[np.ix_(F, B)]
+            u = covarF_inv @ covarFB
+            ones_u = c4 @ covarFB
+            u_mean = c2 @ covarFB
+            u_covar = (covarFB * u).sum(axis=0)
+            schur = covar[B, B] - u_covar
+            wi = weights[B]
+            c1b = c1 + (1 - ones_u) ** 2 / schur
+            c2b = (mean[B] - u_mean) / schur
+            c3b = c3 + (1 - ones_u) * (mean[B] - u_mean) / schur
+            c4b = (1 - ones_u) / schur
+            cb = -c1b * c2b + c3b * c4b
+            u_z = l2 @ covarFB - u_covar * wi
+            z_i = covar_wB[B] - covar[B, B] * wi
+            l2b = (z_i - u_z) / schur
+            l3b = l3 - ones_u * wi + (1 - ones_u) * (z_i - u_z) / schur
+            with np.errstate(divide='ignore', invalid='ignore'):
+                lam = ((1 - (l1 - wi) + l3b) * c4b - c1b * (wi + l2b)) / cb
+            lam[(cb == 0) | ~(lam < current_lambda - tolerance)] = -np.inf
+            j = np.argmax(lam)
+            if np.isfinite(lam[j]):
+                lambda_out, asset_out = lam[j], B[j]
+
+        if (lambda_in is None or lambda_in < 0) and (lambda_out is None or lambda_out < 0):
+            # No more events before lambda = 0: finish at the minimum variance portfolio
+            lam = 0.0
+        elif lambda_out is None or (lambda_in is not None and lambda_in > lambda_out):
+            lam = lambda_in
+            weights[free.pop(position_in)] = bound_in
+            covarF_inv = _reduced_inverse(covarF_inv, position_in)
+        else:
+            lam = lambda_out
+            covarF_inv = _bordered_inverse(covarF_inv, covar[free, asset_out], covar[asset_out, asset_out])
+            free.append(asset_out)
+
+        # Weights of the free assets at the new lambda
+        is_free = np.zeros(n, dtype=bool)
+        is_free[free] = True
+        F, B = np.array(free), np.flatnonzero(~is_free)
+        wB = weights[B]
+        c4 = covarF_inv.sum(axis=1)
+        c2 = covarF_inv @ mean[F]
+        w1 = covarF_inv @ (covar[np.ix_(F, B)] @ wB)
+        g = (-lam * (c4 @ mean[F]) + 1 - wB.sum() + w1.sum()) / c4.sum()
+        weights[F] = -w1 + g * c4 + lam * c2
+
+        # Degenerate pivots only change the free set, the turning point is the same
+        if lam < current_lambda:
+            turning_weights.append(weights.copy())
+            lambdas.append(lam)
+        current_lambda = lam
+        if lam == 0:
+            break
+
+    turning_weights, lambdas = np.array(turning_weights), np.array(lambdas)
+    return turning_weights, lambdas, _corner_violation(turning_weights, lambdas, mean, covar, bounds)
+
+
+def _interpolate_turning_points(turning_weights, expected_returns, target_returns):
+    # Weights are linear in the target return between consecutive turning points
+    turning_returns = turning_weights @ expected_returns
+    order = np.argsort(turning_returns, kind='stable')
+    turning_returns, turning_weights = turning_returns[order], turning_weights[order]
+    weights = np.empty((len(target_returns), turning_weights.shape[1]))
+    for j in range(turning_weights.shape[1]):
+        weights[:, j] = np.interp(target_returns, turning_returns, turning_weights[:, j])
+    return weights
+
+
+def _variance_sweep(expected_returns, covariance, target_returns, bounds, x0):
+    # Minimum variance SLSQP solves for the targets in the given order, every solve starts from the previous solution.
+    # Returns the weights and the (iterations, function evaluations, success) of every solve
+    weights = np.empty((len(target_returns), len(expected_returns)))
+    solves = np.empty((len(target_returns), 3))
+    ones = np.ones(len(expected_returns))
+
+    # Daily variances are ~1e-4, scale them so SLSQP's tolerance is relative to the problem
+    scale = 1 / np.mean(np.diag(covariance))
+
+    def objective(w):
+        cov_weights = scale * (covariance @ w)
+        return w @ cov_weights, 2 * cov_weights
+
+    for row, target in enumerate(target_returns):
+        constraints = [{'type': 'eq', 'fun': lambda w: 1 - w.sum(), 'jac': lambda w: -ones},
+                       {'type': 'eq', 'fun': lambda w: expected_returns @ w - target, 'jac': lambda w: expected_returns}]
+        result = minimize(objective, x0, method='SLSQP', jac=True, bounds=bounds, constraints=constraints)
+        x0 = weights[row] = result.x
+        solves[row] = result.nit, result.nfev, result.success
+    return weights, solves
+
+
+def historical_cvar(portfolio_returns, alpha=0.05):
+    # Same figure as ValueAtRisk.calculate_cvar(type='normal') on a NumPy array: mean of the returns below the alpha quantile
+    var = np.quantile(portfolio_returns, alpha)
+    return portfolio_returns[portfolio_returns <= var].mean()
+
+
+def _cvar_sweep(expected_returns, scenarios, target_returns, bounds, x0, alpha):
+    # Minimum CVaR SLSQP solves over the historical scenarios (T x N), warm-started like _variance_sweep
+    weights = np.empty((len(target_returns), len(expected_returns)))
+    solves = np.empty((len(target_returns), 3))
+
+    def objective(w):
+        return -historical_cvar(scenarios @ w, alpha)
+
+    for row, target in enumerate(target_returns):
+        constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1},
+                       {'type': 'eq', 'fun': lambda w: np.sum(w * expected_returns) - target}]
+        result = minimize(objective, x0, method='SLSQP', bounds=bounds, constraints=constraints)
+        x0 = weights[row] = result.x
+        solves[row] = result.nit, result.nfev, result.success
+    return weights, solves
+
+
+def _cvar_lp_sweep(expected_returns, scenarios, target_returns, bounds, alpha):
+    # Rockafellar-Uryasev linear program for the minimum CVaR portfolio of every target, solved with HiGHS:
+    #   min  zeta + sum(u) / (alpha * T)
+    #   s.t. u_t >= -r_t'w - zeta, u_t >= 0, sum(w) = 1, mu'w = target, lower <= w <= upper
+    # HiGHS solves the dual much faster (N + 1 rows instead of T), so that is the problem passed to linprog:
+    #   max  a + b * target + lower'p - upper's
+    #   s.t. R'q + a + b * mu + p - s = 0, sum(q) = 1, 0 <= q <= 1 / (alpha * T), p, s >= 0
+    # and the optimal weights are minus the marginals of the first N equality rows.
+    # The constraint matrix is built once, only the target return changes between solves.
+    # Returns the weights and the solve figures like _variance_sweep (a linear program has no function evaluations: NaN)
+    n_scenarios, n_assets = scenarios.shape
+    lower, upper = np.asarray(bounds, dtype=float).T
+    identity = sparse.identity(n_assets)
+    A_eq = sparse.vstack([
+        sparse.hstack([sparse.csr_matrix(scenarios.T), np.ones((n_assets, 1)), expected_returns[:, None], identity, -identity]),
+        sparse.csr_matrix(np.concatenate([np.ones(n_scenarios), np.zeros(2 + 2 * n_assets)]))
+    ], format='csr')
+    b_eq = np.concatenate([np.zeros(n_assets), [1]])
+    lp_bounds = [(0, 1 / (alpha * n_scenarios))] * n_scenarios + [(None, None)] * 2 + [(0, None)] * (2 * n_assets)
+
+    weights = np.empty((len(target_returns), n_assets))
+    solves = np.empty((len(target_returns), 3))
+    for row, target in enumerate(target_returns):
+        cost = np.concatenate([np.zeros(n_scenarios), [-1, -target], -lower, upper])
+        result = linprog(cost, A_eq=A_eq, b_eq=b_eq, bounds=lp_bounds, method='highs')
+        if result.status != 0:
+            raise ValueError(f'CVaR linear program failed for target return {target}: {result.message}')
+        weights[row] = -result.eqlin.marginals[:n_assets]
+        solves[row] = result.nit, np.nan, result.success
+    return weights, solves
+
+
+def _record_solves(source, risk, method, target_returns, solves):
+    # One 'solve' record per frontier point, skipped as a whole when Instrumentation is off
+    if not enabled():
+        return
+    for target, (iterations, evaluations, success) in zip(target_returns, solves):
+        record('solve', source=source, risk=risk, backend=method, target=float(target), iterations=int(iterations),
+               function_evaluations=None if np.isnan(evaluations) else int(evaluations), success=bool(success))
+
+
+def efficient_frontier(expected_returns, covariance, target_returns, bounds, initial_weights=None, method='critical-line'):
+    # Minimum variance portfolio for every target return.
+    # method='critical-line' traces the exact piecewise linear solution path once and evaluates every target on it,
+    # and falls back to the SLSQP sweep when a turning point misses the optimality conditions or a target inside the
+    # path's return range is missed (a 'fallback' record with Instrumentation active).
+    # method='slsqp' sweeps the targets in order and warm-starts every solve from the previous point's weights.
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    covariance = np.asarray(covariance, dtype=float)
+    target_returns = np.asarray(target_returns, dtype=float)
+    n_points, n_assets = len(target_returns), len(expected_returns)
+
+    with stage('efficient_frontier', method=method, points=n_points, assets=n_assets):
+        if method == 'critical-line':
+            # The efficient branch goes from the max return to the min variance portfolio,
+            # the inefficient branch is the same path for -mu (from the min return to the min variance portfolio)
+            efficient_weights, _, efficient_violation = _critical_line(expected_returns, covariance, bounds)
+            inefficient_weights, _, inefficient_violation = _critical_line(-expected_returns, covariance, bounds)
+            turning_weights = np.vstack([inefficient_weights, efficient_weights])
+            weights = _interpolate_turning_points(turning_weights, expected_returns, target_returns)
+            turning_returns = turning_weights @ expected_returns
+            inside = (target_returns >= turning_returns.min()) & (target_returns <= turning_returns.max())
+            scale = max(np.abs(expected_returns).max(), np.finfo(float).tiny)
+            missed = np.abs(weights[inside] @ expected_returns - target_returns[inside]).max(initial=0) / scale
+            violation = max(efficient_violation, inefficient_violation)
+            if violation > 1e-6 or missed > 1e-9:
+                record('fallback', source='efficient_frontier', method=method, kkt_violation=violation, target_miss=missed)
+                method = 'slsqp'
+
+        if method == 'slsqp':
+            # Sweep the targets in increasing order, so every warm start is the neighbouring point
+            x0 = np.full(n_assets, 1 / n_assets) if initial_weights is None else np.asarray(initial_weights, dtype=float)
+            order = np.argsort(target_returns, kind='stable')
+            weights = np.empty((n_points, n_assets))
+            weights[order], solves = _variance_sweep(expected_returns, covariance, target_returns[order], bounds, x0)
+            _record_solves('efficient_frontier', 'variance', method, target_returns[order], solves)
+
+        elif method != 'critical-line':
+            raise ValueError('method must be critical-line or slsqp')
+
+    portfolio_returns = weights @ expected_returns
+    portfolio_volatility = np.sqrt(((weights @ covariance) * weights).sum(axis=1))
+
+    return {
+        "Target Return": target_returns,
+        "Expected Return": portfolio_returns,
+        "Expected Volatility": portfolio_volatility,
+        "Sharpe": portfolio_returns / portfolio_volatility,
+        "Weights": weights
+    }
+
+
+def _frontier_chunk(data, risk, method, target_returns, bounds, x0, alpha):
+    if risk == 'variance':
+        return _variance_sweep(data['expected_returns'], data['covariance'], target_returns, bounds, x0)
+    if method == 'lp':
+        return _cvar_lp_sweep(data['expected_returns'], data['scenarios'], target_returns, bounds, alpha)
+    return _cvar_sweep(data['expected_returns'], data['scenarios'], target_returns, bounds, x0, alpha)
+
+
+# Arrays the pool workers read from shared memory, attached once per worker by _attach_shared_arrays
+_worker_data = {}
+
+
+def _share_arrays(arrays):
+    # Copy the arrays into shared memory blocks, the workers only receive the block names
+    blocks, specs = [], {}
+    for name, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def _attach_shared_arrays(specs):
+    # Pool initializer: attach to the parent's blocks once per worker (the parent closes and unlinks them)
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_data[name + '_block'] = block
+        _worker_data[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _worker_chunk(args):
+    return _frontier_chunk(_worker_data, *args)
+
+
+def compute_frontier(expected_returns, target_returns, bounds, covariance=None, scenarios=None, risk='variance',
+                     alpha=0.05, initial_weights=None, workers=1, chunk_size=250, method=None):
+    # Frontier of independent solves for every target return, minimizing the variance (covariance required) or the
+    # historical CVaR at alpha (scenarios T x N required).
+    # The variance is minimized with SLSQP. The CVaR is minimized with the Rockafellar-Uryasev linear program
+    # (method='lp', default) or with SLSQP directly on the historical CVaR (method='slsqp').
+    # The sorted targets are split into chunks of chunk_size points, every chunk starts from initial_weights and is
+    # warm-started internally. The chunk layout does not depend on workers, so any number of workers returns exactly
+    # the serial result (workers=1). With workers > 1 the chunks run on a process pool that reads the covariance and
+    # scenarios from shared memory instead of receiving a pickled copy per task.
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    target_returns = np.asarray(target_returns, dtype=float)
+    n_points, n_assets = len(target_returns), len(expected_returns)
+
+    if risk == 'variance':
+        if covariance is None:
+            raise ValueError("risk='variance' requires the covariance matrix")
+        data = {'expected_returns': expected_returns, 'covariance': np.ascontiguousarray(covariance, dtype=float)}
+    elif risk == 'cvar':
+        if scenarios is None:
+            raise ValueError("risk='cvar' requires the return scenarios")
+        data = {'expected_returns': expected_returns, 'scenarios': np.ascontiguousarray(scenarios, dtype=float)}
+    else:
+        raise ValueError('risk must be variance or cvar')
+
+    if method is None:
+        method = 'slsqp' if risk == 'variance' else 'lp'
+    elif method not in ('slsqp', 'lp') or (method == 'lp' and risk == 'variance'):
+        raise ValueError("method must be slsqp, or lp for risk='cvar'")
+
+    x0 = np.full(n_assets, 1 / n_assets) if initial_weights is None else np.asarray(initial_weights, dtype=float)
+    order = np.argsort(target_returns, kind='stable')
+    chunks = [order[start:start + chunk_size] for start in range(0, n_points, chunk_size)]
+    tasks = [(risk, method, target_returns[chunk], bounds, x0, alpha) for chunk in chunks]
+
+    with stage('compute_frontier', risk=risk, method=method, points=n_points, assets=n_assets, workers=workers):
+        if workers == 1:
+            results = [_frontier_chunk(data, *task) for task in tasks]
+        else:
+            blocks, specs = _share_arrays(data)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_arrays, initargs=(specs,)) as executor:
+                    results = list(executor.map(_worker_chunk, tasks))
+            finally:
+                for block in blocks:
+                    block.close()
+                    block.unlink()
+
+    # The solve figures come back with the weights, so the records cover the pool's solves too
+    weights = np.empty((n_points, n_assets))
+    for chunk, (chunk_weights, solves) in zip(chunks, results):
+        weights[chunk] = chunk_weights
+        _record_solves('compute_frontier', risk, method, target_returns[chunk], solves)
+
+    portfolio_returns = weights @ expected_returns
+    if risk == 'variance':
+        portfolio_risk = np.sqrt(((weights @ data['covariance']) * weights).sum(axis=1))
+    else:
+        scenario_returns = data['scenarios'] @ weights.T
+        portfolio_risk = -np.array([historical_cvar(scenario_returns[:, i], alpha) for i in range(n_points)])
+
+    return {
+        "Target Return": target_returns,
+        "Expected Return": portfolio_returns,
+        "Risk": portfolio_risk,
+        "Weights": weights
+    }
@@ -0,0 +1,137 @@
+### Array-backed frontier results and adaptive frontier refinement
+### A FrontierStore keeps the target return, expected return, risk and weights of up to capacity frontier points in
+### buffers allocated once, the weights in float64 or float32 (half the memory for dense frontiers of large universes).
+### With a path the buffers are memory-mapped .npy files in that directory, so a frontier larger than memory is written
+### as it is solved and FrontierStore.open reads it back lazily (np.load(..., mmap_mode='r') works on the files too).
+### refine_frontier places the points where the risk/return curve bends instead of on a fixed grid of targets: it
+### starts from a coarse grid and adds midpoints around every point that lies too far from the chord of its neighbours.
+
+import json
+import os
+
+import numpy as np
+
+from Frontier import compute_frontier, return_range
+
+_columns = ['Target Return', 'Expected Return', 'Risk', 'Weights']
+_files = {'Target Return': 'target_return.npy', 'Expected Return': 'expected_return.npy', 'Risk': 'risk.npy', 'Weights': 'weights.npy'}
+
+
+class FrontierStore:
+    def __init__(self, capacity, n_assets, dtype=np.float64, path=None, risk='variance'):
+        # risk only labels the Risk column ('variance' stores volatilities, like compute_frontier)
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError('dtype must be float32 or float64')
+        self.capacity, self.n_assets, self.dtype, self.path, self.risk = capacity, n_assets, dtype, path, risk
+        self.size = 0
+        shapes = {'Target Return': ((capacity,), np.float64), 'Expected Return': ((capacity,), np.float64),
+                  'Risk': ((capacity,), np.float64), 'Weights': ((capacity, n_assets), dtype)}
+        if path is None:
+            self._arrays = {name: np.empty(shape, dtype=array_dtype) for name, (shape, array_dtype) in shapes.items()}
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._arrays = {name: np.lib.format.open_memmap(os.path.join(path, _files[name]), mode='w+', dtype=array_dtype, shape=shape)
+                            for name, (shape, array_dtype) in shapes.items()}
+            self._write_size()
+
+    @classmethod
+    def open(cls, path, mode='r'):
+        # Store written with a path, memory-mapped read-only ('r') or for more appends ('r+')
+        with open(os.path.join(path, 'frontier.json')) as file:
+            meta = json.load(file)
+        store = cls.__new__(cls)
+        store._arrays = {name: np.load(os.path.join(path, _files[name]), mmap_mode=mode) for name in _columns}
+        store.capacity, store.n_assets = store._arrays['Weights'].shape
+        store.dtype, store.path, store.risk, store.size = store._arrays['Weights'].dtype, path, meta['risk'], meta['size']
+        return store
+
+    def _write_size(self):
+        # Filled rows, rewritten after every append so a reader never counts rows that are not written yet
+        temporary = os.path.join(self.path, 'frontier.json.tmp')
+        with open(temporary, 'w') as file:
+            json.dump({'size': self.size, 'risk': self.risk}, file)
+        os.replace(temporary, os.path.join(self.path, 'frontier.json'))
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name):
+        # Filled rows of a column, in insertion order (a view, not a copy)
+        return self._arrays[name][:self.size]
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self._arrays.values())
+
+    def append(self, frontier):
+        # Adds the points of a compute_frontier or efficient_frontier result (Expected Volatility taken as the Risk)
+        risk = frontier['Risk'] if 'Risk' in frontier else frontier['Expected Volatility']
+        n_points = len(frontier['Target Return'])
+        if self.size + n_points > self.capacity:
+            raise ValueError(f'FrontierStore is full: {self.size} of {self.capacity} points, {n_points} more given')
+        rows = slice(self.size, self.size + n_points)
+        self._arrays['Target Return'][rows] = frontier['Target Return']
+        self._arrays['Expected Return'][rows] = frontier['Expected Return']
+        self._arrays['Risk'][rows] = risk
+        self._arrays['Weights'][rows] = frontier['Weights']
+        self.size += n_points
+        if self.path is not None:
+            self.flush()
+
+    def flush(self):
+        if self.path is not None:
+            for array in self._arrays.values():
+                if isinstance(array, np.memmap):
+                    array.flush()
+            self._write_size()
+
+    def order(self):
+        # Row order by target return (the points are stored in the order they were solved)
+        return np.argsort(self['Target Return'], kind='stable')
+
+    def frontier(self):
+        # Copy of the points sorted by target return, in the layout of compute_frontier
+        order = self.order()
+        return {name: self[name][order] for name in _columns}
+
+
+def _bend(risk, portfolio_returns):
+    # Distance of every interior point from the chord between its neighbours, with risk and return both scaled to the
+    # span of the frontier so the two axes weigh the same
+    x = (risk - risk.min()) / max(np.ptp(risk), np.finfo(float).tiny)
+    y = (portfolio_returns - portfolio_returns.min()) / max(np.ptp(portfolio_returns), np.finfo(float).tiny)
+    chord_x, chord_y = x[2:] - x[:-2], y[2:] - y[:-2]
+    cross = chord_x * (y[1:-1] - y[:-2]) - chord_y * (x[1:-1] - x[:-2])
+    return np.abs(cross) / np.maximum(np.hypot(chord_x, chord_y), np.finfo(float).tiny)
+
+
+def refine_frontier(expected_returns, bounds, covariance=None, scenarios=None, risk='variance', alpha=0.05,
+                    initial_weights=None, initial_points=17, max_points=1000, tolerance=1e-3, dtype=np.float64, path=None,
+                    workers=1, chunk_size=250, method=None):
+    # Frontier over the whole return range (see Frontier.return_range) with points only where they are needed.
+    # Starts from initial_points evenly spaced targets, then every round solves, in one compute_frontier call, the
+    # midpoints on both sides of each point that bends by more than tolerance (distance from its neighbours' chord as a
+    # fraction of the frontier's span), the sharpest bends first, until no point bends that much or max_points are
+    # solved. The other arguments are those of compute_frontier, dtype and path those of FrontierStore.
+    # Returns the FrontierStore of the points (store.frontier() for the sorted arrays).
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    store = FrontierStore(max_points, len(expected_returns), dtype, path, risk)
+    min_return, max_return = return_range(expected_returns, bounds)
+    min_spacing = 1e-9 * max(max_return - min_return, np.finfo(float).tiny) # Targets closer than this are not split
+    target_returns = np.linspace(min_return, max_return, max(3, min(initial_points, max_points)))
+
+    while len(target_returns):
+        store.append(compute_frontier(expected_returns, target_returns, bounds, covariance, scenarios, risk, alpha,
+                                      initial_weights, workers, chunk_size, method))
+        order = store.order()
+        targets = store['Target Return'][order]
+        bend = _bend(store['Risk'][order], store['Expected Return'][order])
+
+        # Intervals (by their left point) around the bending points, sharpest first, while there is room
+        bending = np.flatnonzero(bend > tolerance)
+        bending = bending[np.argsort(-bend[bending], kind='stable')] + 1
+        intervals = [i for i in dict.fromkeys(np.ravel(np.column_stack([bending - 1, bending]))) if targets[i + 1] - targets[i] > min_spacing]
+        intervals = np.array(intervals[:store.capacity - store.size], dtype=int)
+        target_returns = (targets[intervals] + targets[intervals + 1]) / 2
+    return store
@@ -0,0 +1,180 @@
+### Opt-in profiling of the optimizer, frontier and attribution runs
+### While a Recorder is active (start/stop or the recording context manager) the instrumented code adds structured
+### records to it: a 'solve' record per optimization (backend, iterations, function evaluations, convergence)
+### and a 'stage' record per timed block (wall time and, with memory=True, the peak of the memory traced by
+### tracemalloc above the memory at the start of the block). Records are plain dicts, written as JSON lines or handed
+### to a sink callable as they are made, for a local collector to pick up.
+### With no active Recorder stage() returns a shared no-op context manager and record() returns at once, so the
+### instrumented code costs a function call per block or solve. memory=True slows the traced code down (every
+### allocation is traced), use it to find the stage that holds the memory, not for timings.
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+
+def _json_value(value):
+    # NumPy scalars and arrays, dates and anything else json does not know
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def jsonl_sink(path):
+    # Sink appending every record to path as one JSON line, flushed so a collector tailing the file sees it at once
+    def write(record):
+        with open(path, 'a') as file:
+            file.write(json.dumps(record, default=_json_value) + '\n')
+    return write
+
+
+class Recorder:
+    def __init__(self, memory=False, sink=None):
+        self.memory = memory
+        self.sink = sink
+        self.records = []
+        self.context = {} # Fields added to every record (see context())
+        self._stages = [] # [name, highest nested peak] of the open stages, outermost first
+        self._started_tracing = False
+
+    def record(self, kind, **fields):
+        entry = {'kind': kind, 'time': time.time(), **self.context, **fields}
+        self.records.append(entry)
+        if self.sink is not None:
+            self.sink(entry)
+        return entry
+
+    def extend(self, records):
+        # Records made elsewhere (e.g. by a Recorder in a pool worker), with this Recorder's context added
+        for entry in records:
+            entry = {**entry, **self.context}
+            self.records.append(entry)
+            if self.sink is not None:
+                self.sink(entry)
+
+    @contextmanager
+    def stage(self, name, **fields):
+        # The traced peak is a single global figure: it is reset at the start and end of every stage, and a stage's
+        # peak is the highest of its own and its nested stages' peaks
+        parent = '/'.join(stage[0] for stage in self._stages)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stages:
+                self._stages[-1][1] = max(self._stages[-1][1], peak)
+            tracemalloc.reset_peak()
+        self._stages.append([name, 0])
+        status = 'error'
+        start = time.perf_counter()
+        try:
+            yield
+            status = 'ok'
+        finally:
+            seconds = time.perf_counter() - start
+            _, nested_peak = self._stages.pop()
+            if self.memory:
+                peak = max(tracemalloc.get_traced_memory()[1], nested_peak)
+                fields['peak_memory_mb'] = (peak - current) / 2 ** 20
+                if self._stages:
+                    self._stages[-1][1] = max(self._stages[-1][1], peak)
+                tracemalloc.reset_peak()
+            self.record('stage', name=name, parent=parent, seconds=seconds, status=status, **fields)
+
+    def to_jsonl(self, path):
+        with open(path, 'w') as file:
+            for entry in self.records:
+                file.write(json.dumps(entry, default=_json_value) + '\n')
+
+    def to_frame(self):
+        # Only needed for the table view, the recording itself does not use pandas
+        import pandas as pd
+        return pd.DataFrame(self.records)
+
+    def summary(self):
+        # Total seconds, count and (with memory) highest peak of every stage name, slowest first
+        frame = self.to_frame()
+        if frame.empty or 'name' not in frame:
+            return frame
+        stages = frame[frame['kind'] == 'stage']
+        aggregations = {'seconds': ['sum', 'count']}
+        if 'peak_memory_mb' in stages:
+            aggregations['peak_memory_mb'] = 'max'
+        summary = stages.groupby(['parent', 'name'])[list(aggregations)].agg(aggregations)
+        summary.columns = ['Seconds', 'Count', 'Peak Memory (MB)'][:len(summary.columns)]
+        return summary.sort_values('Seconds', ascending=False)
+
+
+# The active Recorder, None when instrumentation is off
+_recorder = None
+_disabled = nullcontext()
+
+
+def enabled():
+    return _recorder is not None
+
+
+def active():
+    # The active Recorder, or None
+    return _recorder
+
+
+def start(memory=False, sink=None):
+    # Makes a new Recorder the active one and returns it (starting tracemalloc for memory=True if it is not running)
+    global _recorder
+    _recorder = Recorder(memory, sink)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _recorder._started_tracing = True
+    return _recorder
+
+
+def stop():
+    # Deactivates and returns the active Recorder (None if there is none)
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None and recorder._started_tracing:
+        tracemalloc.stop()
+    return recorder
+
+
+@contextmanager
+def recording(memory=False, sink=None):
+    # with recording() as recorder: ... records the block, then restores the Recorder active before it
+    global _recorder
+    previous = _recorder
+    recorder = start(memory, sink)
+    try:
+        yield recorder
+    finally:
+        stop()
+        _recorder = previous
+
+
+def stage(name, **fields):
+    # with stage('name'): ... times the block while a Recorder is active
+    if _recorder is None:
+        return _disabled
+    return _recorder.stage(name, **fields)
+
+
+def record(kind, **fields):
+    if _recorder is not None:
+        _recorder.record(kind, **fields)
+
+
+@contextmanager
+def context(**fields):
+    # Adds the fields (e.g. fund=...) to every record made in the block
+    if _recorder is None:
+        yield
+        return
+    recorder, previous = _recorder, _recorder.context
+    recorder.context = {**previous, **fields}
+    try:
+        yield
+    finally:
+        recorder.context = previous
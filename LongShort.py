@@ -0,0 +1,133 @@
+### Long-short and leveraged portfolios: gross exposure, net exposure and turnover limits as smooth linear constraints
+### Every weight is split into its current holding w0 and trades that never cross each other:
+###   w = w0 + s * (a - c - f),  s = sign of the holding (+1 when flat)
+### a >= 0 adds to the side of the holding, 0 <= c <= |w0| reduces it towards zero and f >= 0 goes past zero to the
+### other side. Filled in that order |w| = |w0| + a - c + f and |w - w0| = a + c + f are linear, so
+###   gross exposure  sum |w| <= G          ->  sum(a - c + f) + slack = G - sum |w0|,  0 <= slack <= G
+###   turnover        sum |w - w0| <= T     ->  sum(a + c + f) + slack = T,             0 <= slack <= T
+###   net exposure    lo <= sum(w) <= hi    ->  sum(w) - n = 0,                          lo <= n <= hi
+### A solution with trades out of order only overstates the gross exposure and the turnover, so it never breaches a
+### limit, and the tiny ridge added to the quadratic problems makes the in-order split the optimal one.
+### The problems keep the form of QuadraticProgramming.box_qp (bounds and a few equality rows) and stay smooth for
+### SLSQP, unlike |w| terms. Without a turnover limit the trades start from zero (the plain long/short split w = a - f),
+### and the trades that can only be 0 are dropped, so a long-only problem keeps one variable per asset.
+
+import numpy as np
+from scipy.optimize import linprog
+
+
+class SplitWeights:
+    def __init__(self, bounds, holdings=None, gross=None, net=None, turnover=None):
+        # bounds: N x 2 (lower, upper) of the weights; holdings: current weights, needed for a turnover limit
+        # gross, turnover: upper limits or None; net: (lo, hi) of sum(w) or None for no net exposure row
+        lower, upper = np.asarray(bounds, dtype=float).T
+        if turnover is not None and holdings is None:
+            raise ValueError('A turnover limit needs the holdings')
+        if (gross is not None and gross < 0) or (turnover is not None and turnover < 0):
+            raise ValueError('Gross exposure and turnover limits must be positive')
+        self.n_assets = len(lower)
+        self.base = np.zeros(self.n_assets) if turnover is None else np.asarray(holdings, dtype=float)
+
+        # Bounds of the trades in the direction of the holding (u = s * w)
+        sign = np.where(self.base < 0, -1.0, 1.0)
+        held = np.abs(self.base)
+        low, high = np.where(sign > 0, lower, -upper), np.where(sign > 0, upper, -lower)
+        forced = np.maximum(0, held - high) # Reduction needed when the holding is above its upper bound
+        trades = [(np.maximum(0, low - held), np.maximum(0, high - held), 1.0, 1.0), # a
+                  (np.minimum(forced, held), np.minimum(held, np.maximum(0, held - low)), -1.0, -1.0), # c
+                  (np.maximum(0, forced - held), np.maximum(0, -low), -1.0, 1.0)] # f
+        keep = [high_k > 0 for _, high_k, _, _ in trades]
+        self.asset = np.concatenate([np.flatnonzero(kept) for kept in keep])
+        self.direction = np.concatenate([sign[kept] * w_coef for kept, (_, _, w_coef, _) in zip(keep, trades)])
+        self.gross_coef = np.concatenate([np.full(kept.sum(), g_coef) for kept, (_, _, _, g_coef) in zip(keep, trades)])
+        self.n_trades = len(self.asset)
+        bounds_lower = [low_k[kept] for kept, (low_k, _, _, _) in zip(keep, trades)]
+        bounds_upper = [high_k[kept] for kept, (_, high_k, _, _) in zip(keep, trades)]
+
+        # Limit rows over [trades, extra variables]: each limit adds one row, the bounded limits one variable
+        rows, values, extras = [], [], []
+        if gross is not None:
+            rows.append((self.gross_coef, len(extras), 1.0))
+            values.append(gross - held.sum())
+            extras.append((0.0, gross))
+        if turnover is not None:
+            rows.append((np.ones(self.n_trades), len(extras), 1.0))
+            values.append(turnover)
+            extras.append((0.0, turnover))
+        if net is not None:
+            net_lower, net_upper = net
+            if net_lower > net_upper:
+                raise ValueError('The net exposure range must have min <= max')
+            if net_lower == net_upper:
+                rows.append((self.direction, None, 0.0))
+                values.append(net_lower - self.base.sum())
+            else:
+                rows.append((self.direction, len(extras), -1.0))
+                values.append(-self.base.sum())
+                extras.append((net_lower, net_upper))
+
+        self.n_variables = self.n_trades + len(extras)
+        self.lower = np.concatenate(bounds_lower + [np.array([low_e for low_e, _ in extras])])
+        self.upper = np.concatenate(bounds_upper + [np.array([high_e for _, high_e in extras])])
+        self.limit_rows = np.zeros((len(rows), self.n_variables))
+        for i, (coefficients, extra, extra_coef) in enumerate(rows):
+            self.limit_rows[i, :self.n_trades] = coefficients
+            if extra is not None:
+                self.limit_rows[i, self.n_trades + extra] = extra_coef
+        self.limit_values = np.array(values)
+        self._trade_bounds = trades
+
+    def weights(self, z):
+        return self.base + np.bincount(self.asset, self.direction * z[:self.n_trades], minlength=self.n_assets)
+
+    def linear(self, c):
+        # Coefficients of c'w in the split variables (also the chain rule of a gradient with respect to w)
+        linear = np.zeros(self.n_variables)
+        linear[:self.n_trades] = self.direction * np.asarray(c, dtype=float)[self.asset]
+        return linear
+
+    def quadratic(self, H, c):
+        # min 1/2 w'Hw - c'w as min 1/2 z'H_z z - c_z'z (constant dropped). H (dense N x N) is singular in the split
+        # variables (a and f of an asset move w the same), a ridge of 1e-8 of its mean diagonal makes it definite and
+        # picks the in-order split, changing the solution by that relative amount only.
+        H = np.asarray(H, dtype=float)
+        H_split = np.zeros((self.n_variables, self.n_variables))
+        H_split[:self.n_trades, :self.n_trades] = H[np.ix_(self.asset, self.asset)] * np.outer(self.direction, self.direction)
+        H_split[np.diag_indices(self.n_variables)] += 1e-8 * max(np.abs(np.diag(H)).mean(), np.finfo(float).tiny)
+        return H_split, self.linear(np.asarray(c, dtype=float) - H @ self.base)
+
+    def rows(self, E=None, e=None):
+        # Equality rows E w = e in the split variables, with the limit rows appended
+        if E is None:
+            return self.limit_rows, self.limit_values
+        E = np.atleast_2d(np.asarray(E, dtype=float))
+        E_split = np.zeros((len(E), self.n_variables))
+        E_split[:, :self.n_trades] = E[:, self.asset] * self.direction
+        return np.vstack([E_split, self.limit_rows]), np.concatenate([np.asarray(e, dtype=float) - E @ self.base, self.limit_values])
+
+    def split(self, weights):
+        # In-order split of the weights (clipped into the trade bounds), with the extra variables that close the limit rows
+        trade = np.where(self.base < 0, -1.0, 1.0) * (np.asarray(weights, dtype=float) - self.base)
+        a = np.maximum(trade, 0)
+        c = np.minimum(np.maximum(-trade, 0), self._trade_bounds[1][1])
+        f = np.maximum(-trade, 0) - c
+        z = np.zeros(self.n_variables)
+        start = 0
+        for value, (low_k, high_k, _, _) in zip([a, c, f], self._trade_bounds):
+            kept = high_k > 0
+            z[start:start + kept.sum()] = np.clip(value, low_k, high_k)[kept]
+            start += kept.sum()
+        for i in range(self.n_trades, self.n_variables):
+            row = np.flatnonzero(self.limit_rows[:, i])[0]
+            residual = self.limit_values[row] - self.limit_rows[row, :self.n_trades] @ z[:self.n_trades]
+            z[i] = np.clip(residual / self.limit_rows[row, i], self.lower[i], self.upper[i])
+        return z
+
+    def max_return(self, expected_returns):
+        # Weights of the highest return within the bounds and the limits (linear program)
+        E, e = self.rows()
+        result = linprog(-self.linear(expected_returns), A_eq=E if len(E) else None, b_eq=e if len(e) else None,
+                         bounds=list(zip(self.lower, self.upper)), method='highs')
+        if result.status != 0:
+            raise ValueError(f'No portfolio within the bounds and exposure limits: {result.message}')
+        return self.weights(result.x)
@@ -0,0 +1,194 @@
+### Shared price loading layer for EfficientFrontier.py, ValueAtRisk.py and MeanCVaR_Optimization.py
+### load_prices returns one aligned float64 frame (dates x tickers) for many tickers at once. The prices come from a
+### pluggable provider (Yahoo Finance or local CSV/Parquet files) through an on-disk cache that stores, per ticker,
+### the prices and the date ranges already fetched, so only the missing ranges are requested again.
+### A provider's fetch returns a column for every ticker it answered for, with no rows where it has no prices (weekends,
+### holidays, before the listing or after the delisting), and leaves out the tickers it failed to get: an answered range
+### is covered even without prices, a failed one stays uncovered and is asked for again on the next call.
+
+import os
+from datetime import date, timedelta
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = '.price_cache'
+
+
+def _no_prices(error):
+    # Yahoo reports a range without trading days as an error too ("possibly delisted; no price data found", or
+    # "No data found for this date range" in older yfinance), it is an answer without prices, not a failure
+    error = str(error).lower()
+    return 'no price data found' in error or 'no data found' in error
+
+
+class YahooProvider:
+    # Adjusted close prices from Yahoo Finance, all tickers of a range in a single yf.download call
+    def __init__(self, field='Adj Close'):
+        self.field = field
+
+    def fetch(self, tickers, start_date, end_date):
+        import yfinance as yf # Only needed when something is actually downloaded
+
+        data = yf.download(list(tickers), start=start_date, end=end_date + timedelta(days=1), auto_adjust=False, progress=False)
+        if data.empty:
+            prices = pd.DataFrame(columns=list(tickers), dtype=float)
+        else:
+            prices = data[self.field]
+            if isinstance(prices, pd.Series):
+                prices = prices.to_frame(tickers[0])
+        # yf.download does not raise on a failed ticker, it records the error of the call in yfinance.shared._ERRORS
+        errors = getattr(getattr(yf, 'shared', None), '_ERRORS', None)
+        if errors is None:
+            # No error record in this yfinance version: a ticker without prices may have failed, it is left out
+            return prices.dropna(axis=1, how='all')
+        failed = {ticker for ticker in tickers if ticker.upper() in errors and not _no_prices(errors[ticker.upper()])}
+        return prices.reindex(columns=[ticker for ticker in tickers if ticker not in failed])
+
+
+class FileProvider:
+    # Offline stand-in: a wide CSV/Parquet file (dates in the first column, one column per ticker)
+    # or a directory with one <ticker>.csv/.parquet file per ticker (dates and a single price column). A ticker without
+    # a file or a column is a failure, left out of the prices; one without dates in the range is an answer without prices
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def _read(path, columns=None):
+        if path.endswith('.parquet'):
+            data = pd.read_parquet(path)
+            if not isinstance(data.index, pd.DatetimeIndex):
+                data = data.set_index(data.columns[0])
+        else:
+            data = pd.read_csv(path, index_col=0)
+        data.index = pd.to_datetime(data.index)
+        return data if columns is None else data[[column for column in columns if column in data.columns]]
+
+    def fetch(self, tickers, start_date, end_date):
+        if os.path.isdir(self.path):
+            # Aligned on the union of the files' dates (assigning columns one by one would keep only the first file's)
+            series = []
+            for ticker in tickers:
+                for extension in ('.parquet', '.csv'):
+                    path = os.path.join(self.path, ticker + extension)
+                    if os.path.exists(path):
+                        series.append(self._read(path).iloc[:, 0].rename(ticker))
+                        break
+            prices = pd.concat(series, axis=1) if series else pd.DataFrame(index=pd.DatetimeIndex([]), dtype=float)
+        else:
+            prices = self._read(self.path, list(tickers))
+        return prices.sort_index().loc[start_date:end_date]
+
+
+class PriceCache:
+    # One <ticker>.npz file per ticker holding three columns: dates (int64 days), prices (float64)
+    # and the covered date ranges (inclusive, int64 days) that were already requested from the provider
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ticker):
+        return os.path.join(self.directory, quote(ticker, safe='') + '.npz')
+
+    def read(self, ticker):
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty((0, 2), dtype=np.int64)
+        with np.load(path) as stored:
+            return stored['dates'], stored['prices'], stored['covered']
+
+    def write(self, ticker, dates, prices, covered):
+        np.savez(self._path(ticker), dates=dates, prices=prices, covered=covered)
+
+
+# Dates are stored as int64 days since the epoch
+def _to_day(value):
+    return np.int64(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+
+def _to_days(index):
+    return pd.DatetimeIndex(index).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def _from_days(days):
+    return pd.DatetimeIndex(np.asarray(days, dtype=np.int64).astype('datetime64[D]'))
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return np.array(merged, dtype=np.int64).reshape(-1, 2)
+
+
+def _missing_ranges(covered, start, end):
+    # Parts of [start, end] not covered by the (merged, sorted) covered ranges
+    missing, cursor = [], start
+    for covered_start, covered_end in covered:
+        if covered_end < cursor or covered_start > end:
+            continue
+        if covered_start > cursor:
+            missing.append((cursor, covered_start - 1))
+        cursor = max(cursor, covered_end + 1)
+    if cursor <= end:
+        missing.append((cursor, end))
+    return missing
+
+
+def load_prices(tickers, start_date, end_date, provider=None, cache_dir=DEFAULT_CACHE_DIR):
+    # Prices of every ticker between start_date and end_date (inclusive) as one float64 frame aligned on the union of
+    # the dates (NaN where a ticker has no price). With cache_dir=None the provider is called directly.
+    provider = YahooProvider() if provider is None else provider
+    tickers = list(tickers)
+    start, end = _to_day(start_date), _to_day(end_date)
+
+    if cache_dir is None:
+        prices = provider.fetch(tickers, _from_days([start])[0], _from_days([end])[0])
+        return prices.reindex(columns=tickers).astype(np.float64).sort_index()
+
+    cache = PriceCache(cache_dir)
+    # Never mark days after yesterday as covered, they may still get prices
+    coverage_end = min(end, _to_day(date.today()) - 1)
+    stored = {ticker: cache.read(ticker) for ticker in tickers}
+
+    # Tickers missing the same date ranges are fetched together in one provider call
+    requests = {}
+    for ticker, (_, _, covered) in stored.items():
+        for missing in _missing_ranges(covered, start, end):
+            requests.setdefault(missing, []).append(ticker)
+
+    new_prices = {ticker: [] for ticker in tickers}
+    new_ranges = {ticker: [] for ticker in tickers}
+    for (missing_start, missing_end), group in requests.items():
+        data = provider.fetch(group, _from_days([missing_start])[0], _from_days([missing_end])[0])
+        for ticker in group:
+            if ticker not in data.columns:
+                # The provider failed for it (download error, missing file): the range stays uncovered so the next
+                # call asks for it again
+                continue
+            # An answer without prices (no trading days in the range) still covers it
+            series = data[ticker].dropna()
+            if not series.empty:
+                new_prices[ticker].append((_to_days(series.index), series.to_numpy(dtype=np.float64)))
+            if missing_start <= coverage_end:
+                new_ranges[ticker].append((missing_start, min(missing_end, coverage_end)))
+
+    columns = []
+    for ticker in tickers:
+        dates, values, covered = stored[ticker]
+        if new_prices[ticker] or new_ranges[ticker]:
+            dates = np.concatenate([dates] + [d for d, _ in new_prices[ticker]]).astype(np.int64)
+            values = np.concatenate([values] + [v for _, v in new_prices[ticker]])
+            dates, unique = np.unique(dates[::-1], return_index=True) # Newer prices win on overlapping dates
+            values = values[::-1][unique]
+            covered = _merge_ranges([tuple(r) for r in covered] + new_ranges[ticker])
+            cache.write(ticker, dates, values, covered)
+        in_range = (dates >= start) & (dates <= end)
+        columns.append(pd.Series(values[in_range], index=_from_days(dates[in_range]), name=ticker))
+
+    prices = pd.concat(columns, axis=1) if columns else pd.DataFrame()
+    return prices.reindex(columns=tickers).astype(np.float64).sort_index()
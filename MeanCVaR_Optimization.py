@@ -1,9 +1,7 @@
 import numpy as np
 import pandas as pd
-import yfinance as yf
-from scipy.optimize import minimize
-import matplotlib.pyplot as plt
-from ValueAtRisk import calculate_cvar
+from MarketData import load_prices
+from FrontierStore import refine_frontier
 
 # Portfolio initial weights:
 portfolio = {
@@ -16,74 +14,60 @@ portfolio = {
 start_date, end_date = '2018-01-01', '2023-09-23'  # Date range
 weight_change = 1  # Maximum weight change for each asset
 alpha = 0.05  # Confidence level for VaR
-return_rows = 10 ** 3  # Number of return points on the efficient frontier
-
-# Download stock price data
-prices = pd.DataFrame()
-for stock in list(portfolio.keys()):
-    prices[stock] = yf.download(stock).loc[start_date:end_date]['Adj Close']
-
-returns = prices.pct_change().dropna()
-
-# Calculate expected covariance and returns
-expected_covariance = returns.cov()
-expected_returns = returns.mean()
-
-# Define the objective function to minimize VaR
-def objective(wts):
-    pfolio_returns = (returns * wts).sum(axis=1)
-    portfolio_cvar = calculate_cvar(pfolio_returns, alpha)
-    return -portfolio_cvar
-
-initial_weights = np.array(list(portfolio.values()))
-
-# Define bounds for portfolio weights
-bounds = []
-for wt in initial_weights:
-    bounds.append((max(-1, wt - weight_change), min(1, wt + weight_change)))
- 
-# Define the objective function to maximize return so we can optimize for maximum and minimum portfolio
-def objective_returns(wts):
-  return np.sum((expected_returns * wts * 252))
-
-# Optimize for minimum and maximum return portfolios
-min_ret_port = ((minimize(objective_returns, initial_weights, method='SLSQP', bounds=bounds, constraints={'type': 'eq', 'fun': lambda x: 1 - sum(x)}).x) * expected_returns).sum()
-max_ret_port = ((minimize(lambda x: -1 * objective_returns(x), initial_weights, method='SLSQP', bounds=bounds, constraints={'type': 'eq', 'fun': lambda x: 1 - sum(x)}).x) * expected_returns).sum()
-
-# Create a range of target returns
-efficient_frontier = pd.DataFrame()
-efficient_frontier['Expected Return'] = np.linspace(min_ret_port, max_ret_port, return_rows)
-
-# Calculate the efficient frontier using VaR as the risk measure
-for row in efficient_frontier.index:
-    target_return = efficient_frontier.loc[row, 'Expected Return']
-    
-    # Define the constraint to enforce the target return
-    constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1},  # Sum of weights constraint
-                   {'type': 'eq', 'fun': lambda w: np.sum(w * expected_returns) - target_return}]
-    
-    result = minimize(objective, initial_weights, method='SLSQP', bounds=bounds, constraints=constraints)
-    pfolio_weights = result.x
-    pfolio_daily_returns = (pfolio_weights * returns).sum(axis=1)
-    portfolio_returns = pfolio_daily_returns.mean() * 252
-    efficient_frontier.loc[row, 'Portfolio Returns'] = portfolio_returns.round(4)
-    efficient_frontier.loc[row, 'Portfolio CVaR'] = calculate_cvar(pfolio_daily_returns, alpha) * -1
-
-# Find portfolios with max Sharpe ratio and min volatility
-max_return_portfolio = efficient_frontier.loc[efficient_frontier['Portfolio Returns'].idxmax()]
-min_cvar_portfolio = efficient_frontier.loc[efficient_frontier['Portfolio CVaR'].idxmin()]
-
-# Plot the efficient frontier
-plt.scatter(efficient_frontier['Portfolio CVaR'], efficient_frontier['Portfolio Returns'])
-plt.xlabel('Value-at-Risk')
-plt.ylabel('Return')
-
-# Highlight the portfolios with max Sharpe ratio and min volatility
-plt.scatter(max_return_portfolio['Portfolio CVaR'], max_return_portfolio['Portfolio Returns'], c='red', marker='*', s=100)
-plt.scatter(min_cvar_portfolio['Portfolio CVaR'], min_cvar_portfolio['Portfolio Returns'], c='blue', marker='*', s=100)
-
-plt.title('Efficient CVaR Portfolios')
-plt.show()
+return_rows = 10 ** 3  # Maximum number of return points on the efficient frontier
+bend_tolerance = 1e-3  # Points are added where the curve bends more than this fraction of its span
+workers = 1  # Number of processes solving the frontier points
+method = 'lp'  # CVaR minimization: 'lp' (Rockafellar-Uryasev linear program) or 'slsqp'
 
 
+def main():
+    # Load stock price data (cached on disk, only missing dates are downloaded)
+    prices = load_prices(list(portfolio.keys()), start_date, end_date)
 
+    returns = prices.pct_change().dropna()
+
+    # Calculate expected covariance and returns
+    expected_covariance = returns.cov()
+    expected_returns = returns.mean()
+
+    initial_weights = np.array(list(portfolio.values()))
+
+    # Define bounds for portfolio weights
+    bounds = []
+    for wt in initial_weights:
+        bounds.append((max(-1, wt - weight_change), min(1, wt + weight_change)))
+
+    # Calculate the efficient frontier using CVaR as the risk measure, between the minimum and maximum return
+    # portfolios with the points placed where the curve bends (the weights of every point are kept)
+    frontier = refine_frontier(expected_returns.values, bounds, scenarios=returns.values, risk='cvar', alpha=alpha,
+                               initial_weights=initial_weights, max_points=return_rows, tolerance=bend_tolerance,
+                               workers=workers, method=method).frontier()
+
+    efficient_frontier = pd.DataFrame()
+    efficient_frontier['Expected Return'] = frontier['Target Return']
+    efficient_frontier['Portfolio Returns'] = (frontier['Expected Return'] * 252).round(4)
+    efficient_frontier['Portfolio CVaR'] = frontier['Risk']
+    frontier_weights = pd.DataFrame(frontier['Weights'], columns=list(portfolio.keys()))
+
+    # Find portfolios with max Sharpe ratio and min volatility
+    max_return_portfolio = efficient_frontier.loc[efficient_frontier['Portfolio Returns'].idxmax()]
+    min_cvar_portfolio = efficient_frontier.loc[efficient_frontier['Portfolio CVaR'].idxmin()]
+    print(frontier_weights.loc[[max_return_portfolio.name, min_cvar_portfolio.name]].round(3))
+
+    # Plot the efficient frontier (matplotlib is only needed here)
+    import matplotlib.pyplot as plt
+    plt.scatter(efficient_frontier['Portfolio CVaR'], efficient_frontier['Portfolio Returns'])
+    plt.xlabel('Value-at-Risk')
+    plt.ylabel('Return')
+
+    # Highlight the portfolios with max Sharpe ratio and min volatility
+    plt.scatter(max_return_portfolio['Portfolio CVaR'], max_return_portfolio['Portfolio Returns'], c='red', marker='*', s=100)
+    plt.scatter(min_cvar_portfolio['Portfolio CVaR'], min_cvar_portfolio['Portfolio Returns'], c='blue', marker='*', s=100)
+
+    plt.title('Efficient CVaR Portfolios')
+    plt.show()
+
+
+# The guard lets the process pool re-import this script
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+### Monte Carlo VaR and CVaR
+### Scenarios come from a multivariate normal or Student-t model calibrated from a returns frame (dates x assets). The
+### simulation runs in fixed-size chunks, each one with its own random stream spawned from a single seed (SeedSequence),
+### so the figures depend only on the seed, the number of scenarios and the chunk size, never on the number of workers.
+### Every chunk is reduced to its smallest returns as soon as it is drawn and merged into a running tail holding the
+### returns of the whole simulation below the VaR, so the figures are those of all the scenarios drawn at once. That tail
+### grows with the number of scenarios (about max(alphas) x n_scenarios x K returns): past tail_size returns the chunks
+### are drawn again from their seeds instead, to narrow down the order statistics of the VaR pass after pass, so memory
+### stays within tail_size returns plus the chunks in flight whatever the number of scenarios.
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from Covariance import FactorCovariance
+
+
+class ScenarioModel:
+    def __init__(self, mean, covariance, distribution='normal', dof=None, index=None):
+        if distribution not in ('normal', 't'):
+            raise ValueError('distribution must be normal or t')
+        if distribution == 't' and not (dof is not None and dof > 2):
+            raise ValueError('dof must be greater than 2 for the t distribution')
+        self.mean = np.asarray(mean, dtype=float)
+        self.covariance = covariance if isinstance(covariance, FactorCovariance) else np.asarray(covariance, dtype=float)
+        self.distribution = distribution
+        self.dof = dof if distribution == 't' else None
+        self.index = index
+        self._factor = None
+
+    def factor(self):
+        # L with L L' equal to the covariance of the normal draws (for the t the scale matrix, covariance * (dof - 2) / dof,
+        # so the scenarios keep the calibrated covariance)
+        if self._factor is None:
+            covariance = np.asarray(self.covariance)
+            try:
+                factor = np.linalg.cholesky(covariance)
+            except np.linalg.LinAlgError:
+                # Singular covariance (e.g. more assets than dates), factored through its non-negative eigenvalues
+                values, vectors = np.linalg.eigh(covariance)
+                factor = vectors * np.sqrt(np.maximum(values, 0))
+            self._factor = factor * np.sqrt((self.dof - 2) / self.dof) if self.distribution == 't' else factor
+        return self._factor
+
+    def project(self, weights):
+        # Model of the portfolio returns scenarios @ weights (weights: N x K). Both distributions are elliptical, so the
+        # projection has the same law as the portfolio returns of the asset scenarios with only K dimensions to draw.
+        weights = np.asarray(weights, dtype=float)
+        weights = weights[:, None] if weights.ndim == 1 else weights
+        return ScenarioModel(self.mean @ weights, weights.T @ (self.covariance @ weights), self.distribution, self.dof)
+
+    def sample(self, n_scenarios, random_state=None):
+        # n_scenarios x N scenarios (random_state: seed, SeedSequence or Generator)
+        rng = np.random.default_rng(random_state)
+        scenarios = rng.standard_normal((n_scenarios, len(self.mean))) @ self.factor().T
+        if self.distribution == 't':
+            scenarios *= np.sqrt(self.dof / rng.chisquare(self.dof, n_scenarios))[:, None]
+        scenarios += self.mean
+        return scenarios
+
+
+def scenario_model(returns, distribution='normal', dof=None, covariance=None):
+    # Model with the mean and covariance of returns (or the given covariance, e.g. from Covariance.estimate_covariance).
+    # For the t without dof, the degrees of freedom match the average excess kurtosis of the assets (6 / (dof - 4)).
+    frame = returns.to_frame() if isinstance(returns, pd.Series) else returns
+    covariance = frame.cov() if covariance is None else covariance
+    if distribution == 't' and dof is None:
+        kurtosis = frame.kurt().mean()
+        dof = min(4 + 6 / kurtosis, 1000.0) if kurtosis > 0 else 1000.0
+    return ScenarioModel(frame.mean(), covariance, distribution, dof, index=frame.columns)
+
+
+def _chunk_sizes(n_scenarios, chunk_size):
+    if n_scenarios < 1 or chunk_size < 1:
+        raise ValueError('n_scenarios and chunk_size must be positive')
+    sizes = [chunk_size] * (n_scenarios // chunk_size)
+    return sizes + [n_scenarios % chunk_size] if n_scenarios % chunk_size else sizes
+
+
+def simulate_scenarios(model, n_scenarios, chunk_size=2 ** 14, seed=None):
+    # Generator of the scenarios in chunks of chunk_size x N (the last one with the remainder)
+    sizes = _chunk_sizes(n_scenarios, chunk_size)
+    for size, seed_sequence in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        yield model.sample(size, seed_sequence)
+
+
+def _smallest(returns, count):
+    # The count smallest returns of every column (all of them if there are fewer), unordered
+    if count >= len(returns):
+        return returns
+    return np.partition(returns, count - 1, axis=0)[:count]
+
+
+def _tail_var_cvar(tail, n_scenarios, alphas):
+    # VaR and CVaR (len(alphas) x K) from the smallest returns of n_scenarios, with the quantile convention of
+    # calculate_var: the interpolated order statistics and every return at or below the VaR lie in the tail
+    ordered = np.sort(tail, axis=0)
+    positions = (n_scenarios - 1) * alphas
+    lower = np.floor(positions).astype(int)
+    upper = np.minimum(lower + 1, n_scenarios - 1)
+    var_values = ordered[lower] + (positions - lower)[:, None] * (ordered[upper] - ordered[lower])
+
+    cvar_values = np.empty_like(var_values)
+    for i, var in enumerate(var_values):
+        in_tail = ordered <= var
+        cvar_values[i] = np.where(in_tail, ordered, 0).sum(axis=0) / in_tail.sum(axis=0)
+    return var_values, cvar_values
+
+
+def _below_edges(returns, edges):
+    # Number and sum of the returns of every column below each edge (edges: len(alphas) x K x m), with the column
+    # minimum and maximum
+    ordered = np.sort(returns, axis=0)
+    prefix = np.concatenate([np.zeros((1, ordered.shape[1])), np.cumsum(ordered, axis=0)])
+    counts = np.empty(edges.shape, dtype=np.int64)
+    for k in range(ordered.shape[1]):
+        counts[:, k] = np.searchsorted(ordered[:, k], edges[:, k])
+    sums = prefix[counts, np.arange(ordered.shape[1])[:, None]]
+    return counts, sums, ordered[0], ordered[-1]
+
+
+def _between(returns, lower, upper):
+    # The returns of every column in [lower, upper) (len(alphas) x K bounds), flat and grouped by alpha then column,
+    # with the size of every group
+    ordered = np.sort(returns, axis=0)
+    starts, ends = np.empty(lower.shape, dtype=np.int64), np.empty(upper.shape, dtype=np.int64)
+    for k in range(ordered.shape[1]):
+        starts[:, k] = np.searchsorted(ordered[:, k], lower[:, k])
+        ends[:, k] = np.searchsorted(ordered[:, k], upper[:, k])
+    sizes = (ends - starts).ravel()
+    offsets = np.cumsum(sizes) - sizes
+    rows = np.arange(sizes.sum()) + np.repeat(starts.ravel() - offsets, sizes)
+    columns = np.repeat(np.tile(np.arange(ordered.shape[1]), len(lower)), sizes)
+    return ordered[rows, columns], ends - starts
+
+
+def _model_quantiles(model, probabilities):
+    # Quantiles (len(alphas) x K x m) of the marginal law of every column at probabilities (len(alphas) x m)
+    from scipy.stats import norm, t # Only needed when the tail does not fit in memory
+    scale = np.sqrt(np.maximum(np.diag(np.asarray(model.covariance)), 0))
+    if model.distribution == 't':
+        standard = t.ppf(probabilities, model.dof) * np.sqrt((model.dof - 2) / model.dof)
+    else:
+        standard = norm.ppf(probabilities)
+    return model.mean[:, None] + scale[:, None] * standard[:, None, :]
+
+
+def _sample_reduce(model, reduce, size, seed_sequence):
+    # One chunk drawn and reduced where it is drawn, only the reduction leaves the worker
+    return reduce(model.sample(size, seed_sequence))
+
+
+_process_model = None
+_process_reduce = None
+
+def _set_process_state(model, reduce):
+    # Pool initializer: every process receives the model and the reduction once per pass instead of with every chunk
+    global _process_model, _process_reduce
+    _process_model, _process_reduce = model, reduce
+
+def _process_sample_reduce(size, seed_sequence):
+    return _sample_reduce(_process_model, _process_reduce, size, seed_sequence)
+
+
+def _reduced_chunks(model, reduce, sizes, seeds, workers, executor):
+    # The reductions of every chunk, in the order of the chunks. With workers > 1 at most 2 x workers chunks are in
+    # flight, so finished results never pile up while the caller merges them.
+    if workers <= 1:
+        for size, seed_sequence in zip(sizes, seeds):
+            yield _sample_reduce(model, reduce, size, seed_sequence)
+        return
+    if executor == 'process':
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_set_process_state, initargs=(model, reduce))
+        function, arguments = _process_sample_reduce, ()
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        function, arguments = _sample_reduce, (model, reduce)
+    try:
+        pending = deque()
+        for size, seed_sequence in zip(sizes, seeds):
+            if len(pending) == 2 * workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(function, *arguments, size, seed_sequence))
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _selected_var_cvar(model, n_scenarios, alphas, sizes, seeds, workers, executor, tail_size, max_passes=32):
+    # VaR and CVaR of n_scenarios without holding their tail, from the same chunks drawn again from their seeds.
+    # Every pass counts (and sums) the returns below a grid of edges per alpha and column and keeps the narrowest
+    # interval [lo, hi) holding both order statistics of the VaR: the first grid spans the quantiles of the model
+    # around alpha, so that one pass nearly always suffices, later ones split the interval evenly. Once the intervals
+    # hold at most tail_size returns in all, a last pass collects them.
+    n_alphas, n_columns = len(alphas), len(model.mean)
+    positions = (n_scenarios - 1) * alphas
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, n_scenarios - 1)
+    bins = min(256, max(4, tail_size // (n_alphas * n_columns)))
+
+    # The order statistics lie within a few standard deviations (sqrt(alpha (1 - alpha) / n)) of alpha
+    half_width = 8 * np.sqrt(alphas * (1 - alphas) / n_scenarios) + 4 / n_scenarios
+    probabilities = alphas[:, None] + half_width[:, None] * np.linspace(-1, 1, bins + 1)
+    edges = _model_quantiles(model, np.clip(probabilities, 0.25 / n_scenarios, 1 - 0.25 / n_scenarios))
+    for _ in range(max_passes):
+        counts, sums = 0, 0.0
+        minimum, maximum = np.full(n_columns, np.inf), np.full(n_columns, -np.inf)
+        for chunk_counts, chunk_sums, chunk_minimum, chunk_maximum in _reduced_chunks(
+                model, partial(_below_edges, edges=edges), sizes, seeds, workers, executor):
+            counts, sums = counts + chunk_counts, sums + chunk_sums
+            minimum, maximum = np.minimum(minimum, chunk_minimum), np.maximum(maximum, chunk_maximum)
+
+        # Last edge with at most lower returns below it and first one with more than upper, the column minimum and
+        # just above its maximum where there is none
+        low = (counts <= lower[:, None, None]).sum(axis=2) - 1
+        high = (counts <= upper[:, None, None]).sum(axis=2)
+        at_low, at_high = np.maximum(low, 0)[..., None], np.minimum(high, edges.shape[2] - 1)[..., None]
+        lo = np.maximum(np.where(low >= 0, np.take_along_axis(edges, at_low, axis=2)[..., 0], -np.inf), minimum)
+        hi = np.minimum(np.where(high < edges.shape[2], np.take_along_axis(edges, at_high, axis=2)[..., 0], np.inf),
+                        np.nextafter(maximum, np.inf))
+        below = np.where(low >= 0, np.take_along_axis(counts, at_low, axis=2)[..., 0], 0)
+        below_sum = np.where(low >= 0, np.take_along_axis(sums, at_low, axis=2)[..., 0], 0.0)
+        inside = np.where(high < edges.shape[2], np.take_along_axis(counts, at_high, axis=2)[..., 0], n_scenarios) - below
+        # An interval without a float between its ends holds a single value (e.g. a riskless portfolio), known already
+        single = hi <= np.nextafter(lo, np.inf)
+        if np.where(single, 0, inside).sum() <= tail_size:
+            break
+        edges = np.linspace(lo, hi, bins + 1, axis=-1)
+    else:
+        raise ValueError(f'the VaR intervals still hold more than tail_size={tail_size} returns after {max_passes} passes')
+
+    chunk_values, chunk_sizes = [], []
+    for values, group_sizes in _reduced_chunks(model, partial(_between, lower=np.where(single, hi, lo), upper=hi),
+                                               sizes, seeds, workers, executor):
+        chunk_values.append(values)
+        chunk_sizes.append(group_sizes.ravel())
+    # Every interval's returns in order, interval after interval
+    groups = np.repeat(np.tile(np.arange(n_alphas * n_columns), len(chunk_sizes)), np.concatenate(chunk_sizes))
+    values = np.concatenate(chunk_values)
+    order = np.lexsort((values, groups))
+    values, groups = values[order], groups[order]
+    group_starts = np.cumsum(np.where(single, 0, inside).ravel()) - np.where(single, 0, inside).ravel()
+
+    lower_values, upper_values = lo.ravel().copy(), lo.ravel().copy()
+    collected = ~single.ravel()
+    lower_at = (group_starts + (lower[:, None] - below).ravel())[collected]
+    upper_at = (group_starts + (upper[:, None] - below).ravel())[collected]
+    lower_values[collected], upper_values[collected] = values[lower_at], values[upper_at]
+    var_values = lower_values + np.repeat(positions - lower, n_columns) * (upper_values - lower_values)
+
+    # Every return below lo is at or below the VaR, those of the interval are counted up to the VaR
+    in_tail = values <= var_values[groups]
+    tail_sum = below_sum.ravel() + np.bincount(groups, weights=np.where(in_tail, values, 0), minlength=len(var_values))
+    tail_count = below.ravel() + np.bincount(groups, weights=in_tail, minlength=len(var_values))
+    # A single valued interval is entirely at the VaR
+    tail_sum[~collected] += (lo * inside).ravel()[~collected]
+    tail_count[~collected] += inside.ravel()[~collected]
+    return var_values.reshape(n_alphas, n_columns), (tail_sum / tail_count).reshape(n_alphas, n_columns)
+
+
+def simulate_var_cvar(model, weights=None, alphas=(0.05,), n_scenarios=10 ** 6, chunk_size=2 ** 14, seed=None, workers=1,
+                      executor='thread', tail_size=2 ** 22):
+    # Monte Carlo VaR and CVaR at several alphas, returned as two arrays (len(alphas) x K) like calculate_var_cvar_batch.
+    # model: ScenarioModel or a returns frame (calibrated with the defaults of scenario_model)
+    # weights: N or N x K portfolios, None for the VaR and CVaR of every asset
+    # workers > 1 spreads the chunks over a 'thread' or 'process' pool, the figures stay the same for the same seed.
+    # tail_size: most returns held for the tail. The tail of one pass holds about max(alphas) x n_scenarios x K returns;
+    # when that exceeds tail_size the chunks are drawn two or more times instead (_selected_var_cvar), the same
+    # figures in bounded memory for two to three times the time.
+    # Memory: 2 x workers x chunk_size x K values for the chunks in flight and about tail_size values for the tail.
+    if not isinstance(model, ScenarioModel):
+        model = scenario_model(model)
+    if weights is not None:
+        model = model.project(weights)
+    if executor not in ('thread', 'process'):
+        raise ValueError('executor must be thread or process')
+    if tail_size < 1:
+        raise ValueError('tail_size must be positive')
+    model.factor() # Factored once here, not in every chunk
+    alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+    sizes = _chunk_sizes(n_scenarios, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    # Returns up to the order statistic above the largest VaR position, enough for every VaR and CVaR
+    count = min(int(np.floor((n_scenarios - 1) * alphas.max())) + 2, n_scenarios)
+    if count * len(model.mean) > tail_size:
+        return _selected_var_cvar(model, n_scenarios, alphas, sizes, seeds, workers, executor, tail_size)
+
+    # Running tail of the smallest returns drawn so far, merged chunk by chunk
+    tail = np.empty((0, len(model.mean)))
+    for chunk_tail in _reduced_chunks(model, partial(_smallest, count=count), sizes, seeds, workers, executor):
+        tail = _smallest(np.concatenate([tail, chunk_tail]), count)
+    return _tail_var_cvar(tail, n_scenarios, alphas)
@@ -2,15 +2,13 @@
 ### The mappings are designed to transform the input data in a data the function can read, and the user should change the values according to his input file.
 
 import pandas as pd
+import numpy as np
 import datetime as dt
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-## Importing Data:
-path = "C:/Users/joaop/OneDrive/Documentos/Estudos/Planilhas e Códigos/Códigos/Portfolio/Attribution/Attribution.xlsx"
-orders = pd.read_excel(path, sheet_name='Ordens').dropna(how="all")
-history = pd.read_excel(path, sheet_name='Historico',index_col=0)
-holidays = pd.read_excel(path, sheet_name='Feriados', parse_dates=True, header=None).iloc[:,0]
-nav_data = pd.read_excel(path, sheet_name='Cotas', parse_dates=True)
+from BusinessCalendar import business_calendar
+from Instrumentation import active, context, recording, stage
 
 #Inputs:
 start_date = ""
@@ -59,207 +57,527 @@ gains_mapping = {
     "Ações Listadas na B3": "Change"
 }
 
+# Column of the history dataframe with the currency of each type of stock
 gains_currency_value_mapping = {
-    "Ações Americanas": history['PTAX'],
-    "Ações Europeias": history['EUR/BRL']
+    "Ações Americanas": 'PTAX',
+    "Ações Europeias": 'EUR/BRL'
 }
 
 
-def portfolio_attribution(orders, nav, history, holidays, attribution_type="Gross", cash=None, benchmark=None, start_date=None, end_date=None):
-    ## Mapping Data: (Code starts here)
-    def create_dataframe_from_mapping(data_df, column_mapping):
-        # Create an empty dataframe based on the target column names
-        target_columns = list(column_mapping.keys())
-        new_df = pd.DataFrame(columns=target_columns)
-
-        # Loop through the dictionary to extract and rename columns
-        for target_column, source_column in column_mapping.items():
-            if source_column in data_df.columns:
-                new_df[target_column] = data_df[source_column]
-
-        return new_df
-
-    def replace_values_in_columns(data_df, column_value_mappings):
-        # Create a copy of the DataFrame to avoid modifying the original
-        modified_df = data_df.copy()
-
-        for column_name, value_mapping in column_value_mappings.items():
-            # Replace values in the specified column based on the mapping
-            modified_df[column_name] = modified_df[column_name].map(value_mapping).fillna(modified_df[column_name])
-
-        return modified_df
-
-    def calculate_gains(df, type, *args):
-        if type == 'Exposure':
-            return df
-        elif type == 'Change_Currency':
-            if len(args) != 1:
-                raise ValueError("The 'Change_Currency' type requires one additional argument (currency_df).")
-            currency_df = args[0]
-            return df * currency_df - df.shift(1) * currency_df.shift(1)
-        elif type == 'Change':
-            return df - df.shift(1)
-        else:
-            raise ValueError(f"Type '{type}' is not supported.")
-    
-    #Mapping inputs from the column values
+def create_dataframe_from_mapping(data_df, column_mapping):
+    # Frames from the columnar loader (AttributionData.py) already carry the target column names
+    target_columns = list(column_mapping.keys())
+    if all(column in data_df.columns for column in target_columns):
+        return data_df[target_columns].copy()
 
-    orders = replace_values_in_columns(create_dataframe_from_mapping(orders, orders_mapping), orders_value_mapping).set_index('DATE')
-    nav = create_dataframe_from_mapping(nav, nav_mapping).set_index('DATE')
-    cash = create_dataframe_from_mapping(cash, cash_mapping).set_index('DATE')
-    benchmark = create_dataframe_from_mapping(benchmark, benchmark_mapping).set_index('DATE')
+    # Select and rename the source columns in one go, the ones missing from data_df stay empty
+    new_df = data_df.reindex(columns=list(column_mapping.values()))
+    new_df.columns = target_columns
 
-    # Set default start and end dates if not provided
-    start_date = start_date if start_date is not None else nav.index[0].strftime("%Y-%m-%d")
-    end_date = end_date if end_date is not None else nav.index[-1].strftime("%Y-%m-%d")
+    return new_df
 
-    # Calculate benchmark returns
-    benchmark_returns = benchmark.pct_change().fillna(method='ffill')
 
-    # Calculate adjusted quantities in orders
-    orders['ADJUSTED_QUANTITY'] = orders['QUANTITY'] * orders['SIDE'].apply(lambda x: -1 if x == 'Sell' else 1)
+def replace_values_in_columns(data_df, column_value_mappings):
+    # Create a copy of the DataFrame to avoid modifying the original
+    modified_df = data_df.copy()
 
-    # Create a table with positions
-    positions = (
-        pd.pivot_table(orders, values=['ADJUSTED_QUANTITY'], columns=['BOOK','SECURITY'], index=orders.index)
-        .reindex(pd.bdate_range(orders.index[0]-dt.timedelta(1), end_date, freq='C', holidays=holidays.to_list()))
-        .fillna(0)
-        .cumsum()
-        .droplevel(0, 1)
-        .loc[start_date:]
-    )
-
-    # Create a table with securities and their types
-    classes = orders[['SECURITY','SECURITY TYPE']].drop_duplicates(subset='SECURITY').set_index('SECURITY')
-
-    # Create a dataframe with financial exposure per day
-    exposures = pd.DataFrame(index=positions.index,columns=positions.columns)
-
-    for book in positions.columns.levels[0].tolist():
-        prices_data = history[positions[book].columns.intersection(history.columns)].fillna(0)
-        exposures[book] = positions[book] * prices_data
-
-    # Create a dataframe with daily gains for each type of stock
-    gains = pd.DataFrame(index=exposures.loc[:end_date].index, columns=exposures.columns)
-
-    for book, security in gains.columns.to_flat_index():
-        security_type = classes.loc[security, 'SECURITY TYPE']
-        calculation_type = gains_mapping.get(security_type, "Change")
-    
-        if calculation_type == "Change_Currency":
-            currency_df = gains_currency_value_mapping.get(security_type, 1)
-        else:
-            currency_df = 1
-    
-        gains[(book, security)] = calculate_gains(exposures[(book, security)], calculation_type, currency_df)  
-
-    if attribution_type == "Net":
-        gains -= exposures * benchmark_returns.values
-    elif attribution_type != "Gross":
-        pass
-
-    # Create a dataframe with the value spent/received from every operation and add it to the gains dataframe
-    operations = (
-        pd.pivot_table(orders, values=['TOTAL ORDER VALUE'], columns=['BOOK', 'SECURITY'], index=orders.index)
-        .reindex(pd.bdate_range(orders.index[0] - dt.timedelta(1), gains.index[-1], freq='C', holidays=holidays.to_list()))
-        .fillna(0)
-    )['TOTAL ORDER VALUE']
-
-    gains_adjusted = gains.copy()
-
-    for (book, security) in gains.columns.to_flat_index():
-        security_type = classes.loc[security, 'SECURITY TYPE']
-        mapping_type = gains_mapping.get(security_type, "Change")
-
-        if mapping_type != "Exposure":
-            gains_adjusted[(book, security)] += operations[(book, security)]
-
-
-    # Calculate the contribution of the value in cash + costs
-    gains_adjusted['Cash'] = (((nav['NAV'] - nav['NAV'].shift(1))) - gains_adjusted.sum(axis=1))
-
-    # Define dates of the attribution
-    def get_first_business_day_in_month(date, holidays): #Primeiro dia útil do mês da end_date
-        date = datetime.strptime(date, '%Y-%m-%d')
-        start_date = datetime(date.year, date.month, 1)
-        while start_date.weekday() >= 5 or start_date in holidays:
-            start_date += timedelta(days=1)
-        return start_date
-
-    def get_last_business_day_in_previous_month(date, holidays): #Último dia útil do mês anterior a end_date
-        date = datetime.strptime(date, '%Y-%m-%d')
-        first_of_month = datetime(date.year, date.month, 1)
-        end_of_last_month = first_of_month - timedelta(days=1)
-        while end_of_last_month.weekday() >= 5 or end_of_last_month in holidays:
-            end_of_last_month -= timedelta(days=1)
-        return end_of_last_month
-
-    def get_first_day_of_year(date, nav_index, holidays): #Primeiro dia útil do ano da end_date (ou segundo dia o fundo)
-        date = datetime.strptime(date, '%Y-%m-%d')
-        start_date = datetime(date.year, 1, 1)
-        if start_date.weekday() >= 5 or start_date in holidays:
-            start_date += timedelta(days=1)
-        start_date = max(start_date, nav_index[1])
-        while start_date.weekday() >= 5 or start_date in holidays:
-            start_date += timedelta(days=1)
-        return start_date
-
-    def get_last_business_day_of_previous_year(date, nav_index, holidays): #Último dia anterior do ano anterior a end_date (ou primeiro dia do fundo)
-        date = datetime.strptime(date, '%Y-%m-%d')
-        start_date = datetime(date.year - 1, 12, 31)
-        start_date = max(start_date, nav_index[0])
-        while start_date.weekday() >= 5 or start_date in holidays:
-            start_date -= timedelta(days=1)
-        return start_date
-
-    start_month = get_first_business_day_in_month(end_date, holidays)
+    for column_name, value_mapping in column_value_mappings.items():
+        # Replace values in the specified column based on the mapping
+        modified_df[column_name] = modified_df[column_name].map(value_mapping).fillna(modified_df[column_name])
+
+    return modified_df
+
+
+def calculate_gains(df, type, *args):
+    if type == 'Exposure':
+        return df
+    elif type == 'Change_Currency':
+        if len(args) != 1:
+            raise ValueError("The 'Change_Currency' type requires one additional argument (currency_df).")
+        currency_df = args[0]
+        if not isinstance(currency_df, pd.Series):
+            return df * currency_df - df.shift(1) * currency_df
+        # The currency is shifted on its own (history) dates and then aligned with the rows of df
+        return df.mul(currency_df.reindex(df.index), axis=0) - df.shift(1).mul(currency_df.shift(1).reindex(df.index), axis=0)
+    elif type == 'Change':
+        return df - df.shift(1)
+    else:
+        raise ValueError(f"Type '{type}' is not supported.")
+
+
+def _attribution_gains(orders, nav, history, holidays, attribution_type="Gross", cash=None, benchmark=None, start_date=None, end_date=None):
+    ## Mapping Data: (Code starts here)
+    #Mapping inputs from the column values
+
+    with stage('mapping'):
+        calendar = business_calendar(holidays)
+        orders = replace_values_in_columns(create_dataframe_from_mapping(orders, orders_mapping), orders_value_mapping).set_index('DATE')
+        nav = create_dataframe_from_mapping(nav, nav_mapping).set_index('DATE')
+        cash = create_dataframe_from_mapping(cash, cash_mapping).set_index('DATE') if cash is not None else None
+        benchmark = create_dataframe_from_mapping(benchmark, benchmark_mapping).set_index('DATE') if benchmark is not None else None
+
+        # Set default start and end dates if not provided
+        start_date = start_date if start_date is not None else nav.index[0].strftime("%Y-%m-%d")
+        end_date = end_date if end_date is not None else nav.index[-1].strftime("%Y-%m-%d")
+
+        # Calculate benchmark returns
+        benchmark_returns = benchmark.pct_change().fillna(method='ffill') if benchmark is not None else None
+
+        # Calculate adjusted quantities in orders
+        orders['ADJUSTED_QUANTITY'] = orders['QUANTITY'] * orders['SIDE'].apply(lambda x: -1 if x == 'Sell' else 1)
+
+    with stage('positions'):
+        # Create a table with positions
+        positions = (
+            pd.pivot_table(orders, values=['ADJUSTED_QUANTITY'], columns=['BOOK','SECURITY'], index=orders.index)
+            .reindex(calendar.range(orders.index[0]-dt.timedelta(1), end_date))
+            .fillna(0)
+            .cumsum()
+            .droplevel(0, 1)
+            .loc[start_date:]
+        )
+
+    with stage('exposures'):
+        # Create a table with securities and their types
+        classes = orders[['SECURITY','SECURITY TYPE']].drop_duplicates(subset='SECURITY').set_index('SECURITY')
+
+        # Calculation type and currency (history column) of every (book, security) column
+        securities = positions.columns.get_level_values('SECURITY')
+        security_types = classes['SECURITY TYPE'].reindex(securities)
+        calculation_types = pd.Series(security_types.map(gains_mapping).fillna("Change").values)
+        currencies = pd.Series(security_types.map(gains_currency_value_mapping).values)
+
+        # Create a dataframe with financial exposure per day (whole matrix, securities without history stay NaN)
+        priced_securities = securities.unique().intersection(history.columns)
+        prices_data = history[priced_securities].fillna(0).reindex(index=positions.index, columns=securities)
+        exposures = positions * prices_data.values
+
+    with stage('gains'):
+        # Create a dataframe with daily gains, one pass per calculation type and currency
+        exposures_until_end = exposures.loc[:end_date]
+        gains_values = np.empty(exposures_until_end.shape)
+        groups = pd.DataFrame({'type': calculation_types, 'currency': currencies}).groupby(['type', 'currency'], dropna=False).indices
+
+        for (calculation_type, currency), columns in groups.items():
+            if calculation_type == "Change_Currency":
+                currency_df = history[currency] if isinstance(currency, str) else 1
+                gains_values[:, columns] = calculate_gains(exposures_until_end.iloc[:, columns], calculation_type, currency_df).values
+            else:
+                gains_values[:, columns] = calculate_gains(exposures_until_end.iloc[:, columns], calculation_type).values
+
+        gains = pd.DataFrame(gains_values, index=exposures_until_end.index, columns=exposures.columns)
+
+        if attribution_type == "Net":
+            gains -= exposures * benchmark_returns.values
+        elif attribution_type != "Gross":
+            pass
+
+        # Create a dataframe with the value spent/received from every operation and add it to the gains dataframe
+        operations = (
+            pd.pivot_table(orders, values=['TOTAL ORDER VALUE'], columns=['BOOK', 'SECURITY'], index=orders.index)
+            .reindex(calendar.range(orders.index[0] - dt.timedelta(1), gains.index[-1]))
+            .fillna(0)
+        )['TOTAL ORDER VALUE']
+
+        gains_adjusted = gains.copy()
+        adjusted_columns = (calculation_types != "Exposure").values
+        gains_adjusted.iloc[:, adjusted_columns] += operations.reindex(index=gains.index, columns=gains.columns).values[:, adjusted_columns]
+
+        # Calculate the contribution of the value in cash + costs
+        gains_adjusted['Cash'] = (((nav['NAV'] - nav['NAV'].shift(1))) - gains_adjusted.sum(axis=1))
+
+    return orders, nav, benchmark, start_date, end_date, positions, exposures, gains_adjusted, classes
+
+
+# Define dates of the attribution (holidays is the holiday list or a BusinessCalendar built from it)
+def get_first_business_day_in_month(date, holidays): #Primeiro dia útil do mês da end_date
+    return business_calendar(holidays).month_start(date)
+
+
+def get_last_business_day_in_previous_month(date, holidays): #Último dia útil do mês anterior a end_date
+    return business_calendar(holidays).previous_month_end(date)
+
+
+def get_first_day_of_year(date, nav_index, holidays): #Primeiro dia útil do ano da end_date (ou segundo dia o fundo)
+    calendar = business_calendar(holidays)
+    return calendar.next(max(calendar.year_start(date), nav_index[1]))
+
+
+def get_last_business_day_of_previous_year(date, nav_index, holidays): #Último dia anterior do ano anterior a end_date (ou primeiro dia do fundo)
+    calendar = business_calendar(holidays)
+    return calendar.previous(max(calendar.previous_year_end(date), nav_index[0]))
+
+
+def _fixed_point_text(values, prefix, suffix, decimal, thousands):
+    # Text of the values with two decimals, like '{:,.2f}' with the given separators, written digit by digit into a
+    # (cells x characters) code point matrix. Cells whose rounding could differ from Python's correctly rounded text
+    # (values within a hair of a half cent), nan/inf and huge values are formatted by Python instead.
+    values = np.asarray(values, dtype=float).ravel()
+    scaled = np.abs(values) * 100
+    vectorized = np.isfinite(scaled) & (scaled < 1e17)
+    vectorized[vectorized] = np.abs(scaled[vectorized] - np.floor(scaled[vectorized]) - 0.5) > 1e-13 * np.maximum(scaled[vectorized], 1)
+    integers, fractions = np.divmod(np.where(vectorized, np.rint(scaled), 0).astype(np.int64), 100)
+    n_digits = 1 + sum((integers >= 10 ** k).astype(np.int64) for k in range(1, 17))
+
+    max_digits = int(n_digits.max()) if len(values) else 1
+    width = len(prefix) + 1 + max_digits + (max_digits - 1) // 3 * len(thousands) + len(decimal) + 2 + len(suffix)
+    codes = np.zeros((len(values), width), dtype=np.uint32)
+    rows = np.arange(len(values))
+
+    # Right aligned first: suffix, cents, decimal separator and the integer digits from the least significant one
+    tail = [ord(c) for c in decimal] + [0, 0] + [ord(c) for c in suffix]
+    codes[:, width - len(tail):] = tail
+    codes[:, width - len(suffix) - 2] = 48 + fractions // 10
+    codes[:, width - len(suffix) - 1] = 48 + fractions % 10
+    cursor = np.full(len(values), width - len(tail))
+    for k in range(max_digits):
+        active = k < n_digits
+        if k and k % 3 == 0:
+            for character in reversed(thousands):
+                cursor[active] -= 1
+                codes[rows[active], cursor[active]] = ord(character)
+        cursor[active] -= 1
+        codes[rows[active], cursor[active]] = 48 + (integers[active] // 10 ** k) % 10
+    negative = np.signbit(values)
+    cursor[negative] -= 1
+    codes[rows[negative], cursor[negative]] = ord('-')
+    for character in reversed(prefix):
+        cursor -= 1
+        codes[rows, cursor] = ord(character)
+
+    # Shift every row to the left edge, the trailing zeros are dropped by the unicode view
+    source = np.arange(width) + cursor[:, None]
+    codes = np.where(source < width, codes[rows[:, None], np.minimum(source, width - 1)], 0)
+    text = codes.view(f'<U{width}').ravel().astype(object)
+
+    separators = str.maketrans({',': thousands, '.': decimal})
+    for i in np.flatnonzero(~vectorized):
+        text[i] = prefix + '{:,.2f}'.format(values[i]).translate(separators) + suffix
+    return text
+
+
+def format_percentage(values, decimal=','):
+    # Same text as '{:.2%}'.format(x) with the given decimal separator
+    return _fixed_point_text(np.asarray(values, dtype=float) * 100, '', '%', decimal, '')
+
+
+def format_currency(values, symbol='R$', decimal=',', thousands='.'):
+    # Same text as 'R${:,.2f}'.format(x) with the given separators
+    return _fixed_point_text(values, symbol, '', decimal, thousands)
+
+
+def render_attribution(attribution, symbol='R$', decimal=',', thousands='.'):
+    # Locale formatted (text) copy of the float attribution, for display and reports only
+    with stage('formatting'):
+        rendered = attribution.astype(object)
+        for column in attribution.columns:
+            if column.startswith('Contribution'):
+                rendered[column] = format_percentage(attribution[column].to_numpy(), decimal)
+            else:
+                rendered[column] = format_currency(attribution[column].to_numpy(), symbol, decimal, thousands)
+    return rendered
+
+
+def _base_nav(nav, holidays, end_date):
+    # NAV each period is divided by: the NAV of the day before, the last NAV of the previous month, and the last NAV
+    # of the year before or the initial NAV (whichever comes first)
     end_month = get_last_business_day_in_previous_month(end_date, holidays)
-    start_year = get_first_day_of_year(end_date, nav.index, holidays)
     end_year = get_last_business_day_of_previous_year(end_date, nav.index, holidays)
-    day_before = nav.index[-2]
+    day_before = nav.loc[:end_date].index[-2]
+    return {'Day': nav.loc[day_before, 'NAV'], 'Month': nav.loc[end_month, 'NAV'], 'Year': nav.loc[end_year, 'NAV']}
 
-    # Stack the dataframe to calculate the contribution
-    gains_adjusted_stacked = (
-        gains_adjusted.stack(level=0)
-        .stack()
-        .reset_index()
-        .rename(columns={'level_0': 'DATE', 0: 'GAIN'})
-        .set_index('DATE')
-    )
 
-    gains_adjusted_stacked.loc[end_date:,'Contribution Day'] = ((gains_adjusted_stacked.loc[end_date:, 'GAIN'] / nav.loc[day_before,'NAV']))
-    gains_adjusted_stacked.loc[end_date:,'Gain Day'] = gains_adjusted_stacked.loc[end_date:, 'GAIN']
+def _period_gains(gains_adjusted, nav, holidays, end_date):
+    # Gains of the day, month and year summed directly over the wide (dates x columns) gains matrix, so at most a year
+    # of rows is touched, and the NAV each period is divided by
+    calendar = business_calendar(holidays)
+    start_month = get_first_business_day_in_month(end_date, calendar)
+    start_year = get_first_day_of_year(end_date, nav.index, calendar)
 
-    # Divide all gains of the month by the last NAV of the previous month
-    gains_adjusted_stacked.loc[start_month:,'Contribution Month'] = (gains_adjusted_stacked.loc[start_month:, 'GAIN'] / nav.loc[end_month,'NAV'])
-    gains_adjusted_stacked.loc[start_month:,'Gain Month'] = gains_adjusted_stacked.loc[start_month:, 'GAIN']
+    gains = pd.DataFrame({
+        'Gain Day': gains_adjusted.loc[end_date:].sum(),
+        'Gain Month': gains_adjusted.loc[start_month:].sum(),
+        'Gain Year': gains_adjusted.loc[start_year:].sum()
+    })
+    return gains, _base_nav(nav, calendar, end_date)
 
-    # Divide all gains of the year by the last NAV of the year before, or by the initial NAV (whichever comes first)
-    gains_adjusted_stacked.loc[start_year:,'Contribution Year'] = (gains_adjusted_stacked.loc[start_year:, 'GAIN'] / nav.loc[end_year,'NAV'])
-    gains_adjusted_stacked.loc[start_year:,'Gain Year'] = gains_adjusted_stacked.loc[start_year:, 'GAIN']
 
-    gains_adjusted_stacked = gains_adjusted_stacked.fillna(0)
+def _consolidate_attribution(gains, reported, base_nav):
+    # One row per (book, security) with at least one gain in the history, then the subtotal of every book and the cash
+    attribution = gains.loc[reported].sort_index().copy()
+    for period in ['Day', 'Month', 'Year']:
+        attribution[f'Contribution {period}'] = attribution[f'Gain {period}'] / base_nav[period]
+    attribution = attribution[['Contribution Day', 'Contribution Month', 'Contribution Year', 'Gain Day', 'Gain Month', 'Gain Year']]
+    attribution.index.names = [None, None]
 
     # Consolidate Attribution
-    attribution = pd.pivot_table(gains_adjusted_stacked, values=['Contribution Day', 'Gain Day', 'Contribution Month', 'Gain Month', 'Contribution Year', 'Gain Year'], columns=['BOOK','SECURITY'], aggfunc=sum).T
     subtotal = attribution.groupby(level=0).sum()
     subtotal.index = pd.MultiIndex.from_tuples([(x, 'Total') for x in subtotal.index])
     attribution = attribution.drop('Cash')
     attribution = pd.concat([attribution, subtotal])
 
-    # Format Adjustments
-    format_percentage = lambda x: '{:.2%}'.format(x)
-    format_currency = lambda x: "R${:,.2f}".format(x)
-    replace_decimal = lambda x: x.replace('.', ';').replace(',', '.').replace(';', ',')
+    return attribution
+
+
+def portfolio_attribution(orders, nav, history, holidays, attribution_type="Gross", cash=None, benchmark=None, start_date=None, end_date=None):
+    # With Instrumentation active the run adds a 'stage' record for mapping, positions, exposures, gains and
+    # consolidation (render_attribution adds formatting)
+    holidays = business_calendar(holidays)
+    orders, nav, benchmark, start_date, end_date, positions, exposures, gains_adjusted, classes = _attribution_gains(
+        orders, nav, history, holidays, attribution_type, cash, benchmark, start_date, end_date)
+
+    with stage('consolidation'):
+        gains, base_nav = _period_gains(gains_adjusted, nav, holidays, end_date)
+        return _consolidate_attribution(gains, gains_adjusted.notna().any(), base_nav)
+
+
+## Incremental attribution:
+# The state keeps what the next business day needs (end of day positions, exposures and prices, the last NAV and the
+# Day/Month/Year gain accumulators with their base NAVs), so a daily run only processes that day's orders and prices.
+
+def attribution_state(orders, nav, history, holidays, attribution_type="Gross", cash=None, benchmark=None, start_date=None, end_date=None):
+    # Full computation up to end_date, done once to seed the incremental runs
+    holidays = business_calendar(holidays)
+    orders, nav, benchmark, start_date, end_date, positions, exposures, gains_adjusted, classes = _attribution_gains(
+        orders, nav, history, holidays, attribution_type, cash, benchmark, start_date, end_date)
+    nav = nav.loc[:end_date]
+    gains, base_nav = _period_gains(gains_adjusted, nav, holidays, end_date)
+    benchmark_levels = benchmark['BENCHMARK'].loc[:end_date] if attribution_type == "Net" else pd.Series(dtype=float)
+
+    return {
+        'Date': positions.index[-1],
+        'Calendar': holidays,
+        'Attribution Type': attribution_type,
+        'Security Types': classes['SECURITY TYPE'],
+        'Positions': positions.iloc[-1],
+        'Exposures': exposures.iloc[-1],
+        'Prices': history.loc[:end_date].iloc[-1],
+        'NAV': nav['NAV'].iloc[-1],
+        'Benchmark': benchmark_levels.iloc[-1] if len(benchmark_levels) else np.nan,
+        'Benchmark Return': benchmark_levels.pct_change().ffill().iloc[-1] if len(benchmark_levels) > 1 else np.nan,
+        'Base NAV': base_nav,
+        'Gains': gains,
+        # Rows with at least one gain in the history, the others never show up in the attribution
+        'Reported': gains_adjusted.notna().any()
+    }
+
+
+def update_attribution_state(state, orders, nav, history, benchmark=None, date=None):
+    # Rolls the state forward by one business day: orders, nav, history and benchmark only need that day's rows
+    # (orders of other dates are ignored). Returns a new state, the given one is left untouched.
+    # The date must be the business day after the state's date (on the state's calendar): a skipped day would drop its
+    # orders and fold its price moves into the next day's gains, so every day is updated in turn.
+    nav = create_dataframe_from_mapping(nav, nav_mapping).set_index('DATE')
+    date = pd.Timestamp(date) if date is not None else nav.index[-1]
+    next_date = state['Calendar'].next(state['Date'] + dt.timedelta(1))
+    if date != next_date:
+        raise ValueError(f"The date must be {next_date:%Y-%m-%d}, the business day after the last date of the state ({state['Date']:%Y-%m-%d}).")
+
+    # Quantities and order values of the day, aggregated per (book, security) like the positions table
+    orders = replace_values_in_columns(create_dataframe_from_mapping(orders, orders_mapping), orders_value_mapping).set_index('DATE')
+    orders = orders.loc[orders.index == date]
+    orders['ADJUSTED_QUANTITY'] = orders['QUANTITY'] * orders['SIDE'].apply(lambda x: -1 if x == 'Sell' else 1)
+    trades = orders.groupby(['BOOK', 'SECURITY'])[['ADJUSTED_QUANTITY', 'TOTAL ORDER VALUE']].mean()
+
+    security_types = state['Security Types']
+    new_types = orders.drop_duplicates(subset='SECURITY').set_index('SECURITY')['SECURITY TYPE']
+    security_types = pd.concat([security_types, new_types[~new_types.index.isin(security_types.index)]])
+
+    # Like portfolio_attribution, every exposure of a business day missing from the history is NaN, including those of
+    # the securities first traded the day after (the state's prices are named after the day of their history row)
+    priced_before = state['Prices'].name == state['Date']
+    columns = state['Positions'].index.union(trades.index)
+    positions = state['Positions'].reindex(columns, fill_value=0) + trades['ADJUSTED_QUANTITY'].reindex(columns, fill_value=0)
+    previous_exposures = state['Exposures'].reindex(columns, fill_value=0 if priced_before else np.nan)
+
+    # Exposures with the prices of the day (securities without history stay NaN). The state keeps the last history
+    # row, which the currency changes are measured against, as the currency column is shifted on the history's dates.
+    priced = date in history.index
+    prices = history.loc[date] if priced else state['Prices']
+    securities = columns.get_level_values('SECURITY')
+    day_prices = prices.fillna(0) if priced else pd.Series(np.nan, index=prices.index)
+    exposures = positions * day_prices.reindex(securities).values
+
+    # Gains of the day per calculation type
+    types = security_types.reindex(securities)
+    calculation_types = types.map(gains_mapping).fillna("Change").values
+    currencies = types.map(gains_currency_value_mapping).values
+    gains = exposures - previous_exposures
+
+    exposure_columns = calculation_types == "Exposure"
+    gains[exposure_columns] = exposures[exposure_columns]
+
+    for currency in pd.unique(currencies[calculation_types == "Change_Currency"]):
+        currency_columns = (calculation_types == "Change_Currency") & (currencies == currency)
+        currency_today, currency_before = (prices[currency], state['Prices'][currency]) if isinstance(currency, str) else (1, 1)
+        gains[currency_columns] = exposures[currency_columns] * currency_today - previous_exposures[currency_columns] * currency_before
+
+    benchmark_level, benchmark_return = state['Benchmark'], state['Benchmark Return']
+    if state['Attribution Type'] == "Net":
+        benchmark_level = create_dataframe_from_mapping(benchmark, benchmark_mapping).set_index('DATE').loc[date, 'BENCHMARK']
+        if not np.isnan(benchmark_level / state['Benchmark'] - 1):
+            benchmark_return = benchmark_level / state['Benchmark'] - 1
+        gains -= exposures * benchmark_return
+
+    gains[~exposure_columns] += trades['TOTAL ORDER VALUE'].reindex(columns, fill_value=0)[~exposure_columns]
+
+    nav_today = nav.loc[date, 'NAV']
+    gains.loc[('Cash', '')] = (nav_today - state['NAV']) - gains.sum()
+
+    # Month and year accumulators restart when the day opens a new period, based on the NAV of the day before
+    new_month = (date.year, date.month) != (state['Date'].year, state['Date'].month)
+    new_year = date.year != state['Date'].year
+    base_nav = {
+        'Day': state['NAV'],
+        'Month': state['NAV'] if new_month else state['Base NAV']['Month'],
+        'Year': state['NAV'] if new_year else state['Base NAV']['Year']
+    }
+
+    accumulated = state['Gains'].reindex(state['Gains'].index.union(gains.index), fill_value=0)
+    day_gains = gains.reindex(accumulated.index).fillna(0)
+    accumulated = pd.DataFrame({
+        'Gain Day': day_gains,
+        'Gain Month': day_gains if new_month else accumulated['Gain Month'] + day_gains,
+        'Gain Year': day_gains if new_year else accumulated['Gain Year'] + day_gains
+    })
+    reported = state['Reported'].reindex(accumulated.index, fill_value=False) | gains.reindex(accumulated.index).notna()
+
+    return {
+        'Date': date,
+        'Calendar': state['Calendar'],
+        'Attribution Type': state['Attribution Type'],
+        'Security Types': security_types,
+        'Positions': positions,
+        'Exposures': exposures,
+        'Prices': prices,
+        'NAV': nav_today,
+        'Benchmark': benchmark_level,
+        'Benchmark Return': benchmark_return,
+        'Base NAV': base_nav,
+        'Gains': accumulated,
+        'Reported': reported
+    }
+
+
+def state_attribution(state):
+    # Attribution of the last date of the state, in the same layout as portfolio_attribution
+    return _consolidate_attribution(state['Gains'], state['Reported'], state['Base NAV'])
+
+
+def save_attribution_state(state, path):
+    pd.to_pickle(state, path)
+
+
+def load_attribution_state(path):
+    return pd.read_pickle(path)
+
+
+## Backfill:
+# Positions, exposures and gains are built once for the whole range, then the Day/Month/Year figures of every date come
+# from running (cumulative) sums that restart with each month and year.
+
+def iter_attribution_range(orders, nav, history, holidays, start, end, attribution_type="Gross", cash=None, benchmark=None, start_date=None):
+    # Yields (date, attribution) for every business day between start and end, each attribution equal to
+    # portfolio_attribution(..., end_date=date)
+    holidays = business_calendar(holidays)
+    orders, nav, benchmark, start_date, end_date, positions, exposures, gains_adjusted, classes = _attribution_gains(
+        orders, nav, history, holidays, attribution_type, cash, benchmark, start_date, end)
+
+    values = gains_adjusted.to_numpy()
+    gains = np.nan_to_num(values)
+    reported = np.zeros(values.shape[1], dtype=bool)
+    month_gains, year_gains = np.zeros(values.shape[1]), np.zeros(values.shape[1])
+    previous_date = None
+
+    for row, date in enumerate(gains_adjusted.index):
+        if previous_date is None or (date.year, date.month) != (previous_date.year, previous_date.month):
+            month_gains = np.zeros(values.shape[1])
+        if previous_date is None or date.year != previous_date.year:
+            year_gains = np.zeros(values.shape[1])
+        previous_date = date
+
+        # The year of the fund's first day starts on its second day, like get_first_day_of_year
+        month_gains = month_gains + gains[row]
+        if date >= nav.index[1]:
+            year_gains = year_gains + gains[row]
+        reported |= ~np.isnan(values[row])
+
+        if date >= pd.Timestamp(start):
+            period_gains = pd.DataFrame({'Gain Day': gains[row], 'Gain Month': month_gains, 'Gain Year': year_gains}, index=gains_adjusted.columns)
+            yield date, _consolidate_attribution(period_gains, reported, _base_nav(nav, holidays, date))
+
+
+def attribution_range(orders, nav, history, holidays, start, end, attribution_type="Gross", cash=None, benchmark=None, start_date=None):
+    # Long table of iter_attribution_range: the attribution of every date stacked under a DATE index level
+    attributions = dict(iter_attribution_range(orders, nav, history, holidays, start, end, attribution_type, cash, benchmark, start_date))
+    return pd.concat(attributions, names=['DATE'])
+
+
+## Batch attribution:
+# Market data shared by every fund (prices, currencies and business-day calendar), set once per pool worker by _set_market_data
+_market_data = {}
+
+
+def _set_market_data(history, holidays):
+    _market_data['history'] = history
+    _market_data['holidays'] = holidays
+
+
+def _fund_attribution(fund, inputs, attribution_type, start_date, end_date):
+    start = time.perf_counter()
+    with context(fund=fund):
+        attribution = portfolio_attribution(inputs['Orders'], inputs['NAV'], _market_data['history'], _market_data['holidays'], attribution_type,
+                                            inputs.get('Cash'), inputs.get('Benchmark'), start_date, end_date)
+    return fund, attribution, time.perf_counter() - start
+
+
+def _recorded_fund_attribution(memory, *args):
+    # Pool task while the parent records: the worker records the fund's stages and returns them with the result
+    with recording(memory) as recorder:
+        result = _fund_attribution(*args)
+    return result, recorder.records
+
+
+def batch_attribution(funds, history, holidays, attribution_type="Gross", start_date=None, end_date=None, workers=1):
+    # Attribution of many funds over the same history and calendar. funds maps each fund name to a dict with its
+    # 'Orders' and 'NAV' inputs (optionally 'Cash' and 'Benchmark'). Yields (fund, attribution, seconds) as each fund
+    # finishes: in order with workers=1, otherwise on a process pool that receives the market data once per worker.
+    holidays = business_calendar(holidays)
+    if workers == 1:
+        _set_market_data(history, holidays)
+        for fund, inputs in funds.items():
+            yield _fund_attribution(fund, inputs, attribution_type, start_date, end_date)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_market_data, initargs=(history, holidays)) as executor:
+        recorder = active()
+        if recorder is None:
+            futures = [executor.submit(_fund_attribution, fund, inputs, attribution_type, start_date, end_date) for fund, inputs in funds.items()]
+            for future in as_completed(futures):
+                yield future.result()
+            return
+
+        futures = [executor.submit(_recorded_fund_attribution, recorder.memory, fund, inputs, attribution_type, start_date, end_date)
+                   for fund, inputs in funds.items()]
+        for future in as_completed(futures):
+            result, records = future.result()
+            recorder.extend(records)
+            yield result
 
-    # Apply formatting using applymap
-    attribution[['Contribution Day', 'Contribution Month', 'Contribution Year']] = attribution[['Contribution Day', 'Contribution Month', 'Contribution Year']].applymap(format_percentage)
-    attribution[['Gain Day', 'Gain Month', 'Gain Year']] = attribution[['Gain Day', 'Gain Month', 'Gain Year']].applymap(format_currency)
-    attribution = attribution.applymap(replace_decimal)
 
-    return(attribution)
+def main():
+    import sys
+    from AttributionData import load_workbook
 
+    ## Importing Data: (the sheets are converted once into columnar copies, later runs read those)
+    ## The workbook path can be given on the command line: python PortfolioAttribution.py <workbook>
+    path = sys.argv[1] if len(sys.argv) > 1 else "C:/Users/joaop/OneDrive/Documentos/Estudos/Planilhas e Códigos/Códigos/Portfolio/Attribution/Attribution.xlsx"
+    orders, history, holidays, nav_data = load_workbook(path)
+
+    attribution = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+
+    print(render_attribution(attribution))
 
-attribution = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
 
-print(attribution)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,158 +1,542 @@
+from concurrent.futures import ProcessPoolExecutor
+import time
+
 import pandas as pd
 import numpy as np 
-from scipy.optimize import minimize
-
-returns = {'XLF': 0.0315,
-           'SPY': 0.0250,
-           'XLE': 0.045,
-           'XLK': 0.0132,
-           'XTN': 0.0023,
-           'XLY': 0.0056,
-           'EWG': 0.045,
-           'TLT': 0.003}
-
-initial_weights = {'XLF': 0.125,
-                   'SPY': 0.125,
-                   'XLE': 0.125,
-                   'XLK': 0.125,
-                   'XTN': 0.125,
-                   'XLY': 0.125,
-                   'EWG': 0.125,
-                   'TLT': 0.125}
-
-
-covariance = {'Tickers': ['XLF', 'SPY', 'XLE', 'XLK', 'XTN', 'XLY', 'EWG', 'TLT'],
-              'XLF': [0.0010, 0.0013, -0.0006, -0.0007,	0.0001,	0.0001,	-0.0004, -0.0004],
-              'SPY': [0.0013, 0.0073, -0.0013, -0.0006,	-0.0022, -0.0010, 0.0014, -0.0015],
-              'XLE': [-0.0006, -0.0013,	0.0599,	0.0276,	0.0635,	0.0230,	0.0330,	0.0480],
-              'XLK': [-0.0007, -0.0006,	0.0276,	0.0296,	0.0266,	0.0215,	0.0207,	0.0299],
-              'XTN': [0.0001, -0.0022, 0.0635, 0.0266, 0.1025, 0.0427, 0.0399, 0.0660],
-              'XLY': [0.0001, -0.0010, 0.0230, 0.0215, 0.0427, 0.0321, 0.0199, 0.0322],
-              'EWG': [-0.0004, 0.0014, 0.0330, 0.0207, 0.0399, 0.0199, 0.0284, 0.0351],
-              'TLT': [-0.0004, -0.0015,	0.0480,	0.0299,	0.0660,	0.0322,	0.0351,	0.0800]
-}
-
-covariance_df = pd.DataFrame(covariance)
-covariance_df = covariance_df.set_index('Tickers')
-
-def PortfolioSimpleOptimization(returns,initial_weights,covariance_df,optimization,target=None,weight_change=None):
+from scipy.optimize import OptimizeResult, brentq, minimize, minimize_scalar
+from Covariance import FactorCovariance
+from Frontier import max_return_weights
+from Instrumentation import record, stage
+from LongShort import SplitWeights
+from QuadraticProgramming import box_qp
+from SolveCache import covariance_digest
+
+def sample_problem():
+    # Example inputs in the format the wrappers expect, built on demand so importing the module does no work
+    returns = {'XLF': 0.0315,
+               'SPY': 0.0250,
+               'XLE': 0.045,
+               'XLK': 0.0132,
+               'XTN': 0.0023,
+               'XLY': 0.0056,
+               'EWG': 0.045,
+               'TLT': 0.003}
+
+    initial_weights = {'XLF': 0.125,
+                       'SPY': 0.125,
+                       'XLE': 0.125,
+                       'XLK': 0.125,
+                       'XTN': 0.125,
+                       'XLY': 0.125,
+                       'EWG': 0.125,
+                       'TLT': 0.125}
+
+
+    covariance = {'Tickers': ['XLF', 'SPY', 'XLE', 'XLK', 'XTN', 'XLY', 'EWG', 'TLT'],
+                  'XLF': [0.0010, 0.0013, -0.0006, -0.0007,	0.0001,	0.0001,	-0.0004, -0.0004],
+                  'SPY': [0.0013, 0.0073, -0.0013, -0.0006,	-0.0022, -0.0010, 0.0014, -0.0015],
+                  'XLE': [-0.0006, -0.0013,	0.0599,	0.0276,	0.0635,	0.0230,	0.0330,	0.0480],
+                  'XLK': [-0.0007, -0.0006,	0.0276,	0.0296,	0.0266,	0.0215,	0.0207,	0.0299],
+                  'XTN': [0.0001, -0.0022, 0.0635, 0.0266, 0.1025, 0.0427, 0.0399, 0.0660],
+                  'XLY': [0.0001, -0.0010, 0.0230, 0.0215, 0.0427, 0.0321, 0.0199, 0.0322],
+                  'EWG': [-0.0004, 0.0014, 0.0330, 0.0207, 0.0399, 0.0199, 0.0284, 0.0351],
+                  'TLT': [-0.0004, -0.0015,	0.0480,	0.0299,	0.0660,	0.0322,	0.0351,	0.0800]
+    }
+
+    covariance_df = pd.DataFrame(covariance)
+    covariance_df = covariance_df.set_index('Tickers')
+    return returns, initial_weights, covariance_df
+
+def covariance_product(covariance_df):
+    # Sigma @ w as a function: O(N*k) for a FactorCovariance (Covariance.py), O(N^2) for a dense matrix or DataFrame
+    if isinstance(covariance_df, FactorCovariance):
+        return covariance_df.dot
+    return np.asarray(covariance_df, dtype=float).dot
+
+def _weight_bounds(initial_weights, weight_change):
+    # (-1, 1) for every asset without weight_change, otherwise the initial weight +- weight_change rounded to 2 decimals
+    if weight_change is None or np.isnan(weight_change):
+        return np.tile([-1.0, 1.0], (len(initial_weights), 1))
+    return np.array([(round(wt - weight_change, 2), round(wt + weight_change, 2)) for wt in initial_weights])
+
+def _split_weights(bounds, optimization, limits, holdings):
+    # SplitWeights of the exposure limits (gross, min net, max net, turnover; NaN where not given), None without limits.
+    # A missing side of the net range is the bound of sum(w), and without a net range the portfolio stays fully
+    # invested except for RiskAdjusted, where the cash is free.
+    if limits is None or np.isnan(limits).all():
+        return None
+    gross, net_min, net_max, turnover = limits
+    lower, upper = np.asarray(bounds, dtype=float).T
+    if np.isnan(net_min) and np.isnan(net_max):
+        net = None if optimization == 'RiskAdjusted' else (1.0, 1.0)
+    else:
+        net = (lower.sum() if np.isnan(net_min) else net_min, upper.sum() if np.isnan(net_max) else net_max)
+    return SplitWeights(bounds, holdings, None if np.isnan(gross) else gross, net, None if np.isnan(turnover) else turnover)
+
+def _solve_slsqp(expected_returns, covariance_dot, initial_weights, bounds, optimization, target=None, tau=None, riskfree_return=0.0,
+                 limits=None, holdings=None):
+    # One SLSQP solve on arrays, returns scipy's OptimizeResult. With exposure limits the same objective and
+    # constraints are solved over the split variables of LongShort.SplitWeights (x is mapped back to the weights).
+    ones = np.ones(len(expected_returns))
+
+    def constraint_weights_sum(weights):
+        return 1 - np.sum(weights)
+
+    def constraint_weights_sum_jac(weights):
+        return -ones
+
     if optimization == 'MaxReturn':
         def objective(weights):
-            pfolio_return = -np.sum(np.array(list(returns.values())) * weights)
-            return pfolio_return
+            pfolio_return = -np.dot(expected_returns, weights)
+            return pfolio_return, -expected_returns
 
         def constraint(weights):
-            pfolio_vol = np.sqrt(np.dot(weights.T, np.dot(covariance_df.values, weights)))
-            return target - pfolio_vol  
-    
-        def constraint_weights_sum(weights):
-            return 1 - np.sum(weights)  
-    
-        constraints = [
-            {'type': 'eq', 'fun': constraint_weights_sum},
-            {'type': 'ineq', 'fun': constraint}
-            ]
+            pfolio_vol = np.sqrt(np.dot(weights, covariance_dot(weights)))
+            return target - pfolio_vol
+
+        def constraint_jac(weights):
+            cov_weights = covariance_dot(weights)
+            pfolio_vol = np.sqrt(np.dot(weights, cov_weights))
+            return -cov_weights / max(pfolio_vol, 1e-12)
+
+        constraints = [{'type': 'ineq', 'fun': constraint, 'jac': constraint_jac}]
 
     elif optimization == 'MinRisk':
         def objective(weights):
-            pfolio_vol = np.sqrt(np.dot(weights.T, np.dot(covariance_df.values, weights)))
-            return pfolio_vol
+            cov_weights = covariance_dot(weights)
+            pfolio_vol = np.sqrt(np.dot(weights, cov_weights))
+            return pfolio_vol, cov_weights / max(pfolio_vol, 1e-12)
 
         def constraint(weights):
-            pfolio_return = np.sum(np.array(list(returns.values())) * weights)
+            pfolio_return = np.dot(expected_returns, weights)
             return pfolio_return - target
-    
-        def constraint_weights_sum(weights):
-            return 1 - np.sum(weights)  
-    
-        constraints = [
-            {'type': 'eq', 'fun': constraint_weights_sum},
-            {'type': 'ineq', 'fun': constraint}
-            ]
-    
+
+        def constraint_jac(weights):
+            return expected_returns
+
+        constraints = [{'type': 'ineq', 'fun': constraint, 'jac': constraint_jac}]
+
     elif optimization == 'MaxSharpe':
+        # Return over the risk-free return, (mu - rf)'w with the cash (1 - sum(w)) at the risk-free return
+        excess_returns = expected_returns - riskfree_return
+
         def objective(weights):
-            pfolio_return = np.sum(np.array(list(returns.values())) * weights)
-            pfolio_vol = 100 * np.sqrt(np.dot(weights.T, np.dot(covariance_df.values, weights)))
+            cov_weights = covariance_dot(weights)
+            pfolio_return = np.dot(excess_returns, weights)
+            pfolio_vol = 100 * max(np.sqrt(np.dot(weights, cov_weights)), 1e-12)
             sharpe_ratio = pfolio_return / pfolio_vol
-            return -sharpe_ratio 
-    
-        def constraint_weights_sum(weights):
-            return 1 - np.sum(weights)  
-    
-        constraints = [{'type': 'eq', 'fun': constraint_weights_sum}]
+            # d(r / 100v) = (mu - rf) / 100v - r * Sigma w / (100 v^3)
+            gradient = excess_returns / pfolio_vol - pfolio_return * 1e4 * cov_weights / pfolio_vol**3
+            return -sharpe_ratio, -gradient
+
+        constraints = []
+
+    elif optimization == 'RiskAdjusted':
+        # Return of the weights plus the cash left (1 - sum(w)) at the risk-free return, minus tau * (100 * vol) ** 2
+        def objective(weights):
+            cov_weights = covariance_dot(weights)
+            pfolio_return = np.dot(expected_returns, weights) + (1 - weights.sum()) * riskfree_return
+            pfolio_variance = 1e4 * np.dot(weights, cov_weights) # (100 * vol) ** 2
+            pfolio_riskadjusted_return = pfolio_return - tau*pfolio_variance
+            gradient = expected_returns - riskfree_return - 2e4 * tau * cov_weights
+            return -pfolio_riskadjusted_return, -gradient
+
+        constraints = []
 
     else:
-        raise ValueError('Optimization must be MaxReturn, MinRisk or MaxSharpe')
- 
-    initial_weights = list(initial_weights.values())
+        raise ValueError('Optimization must be MaxReturn, MinRisk, MaxSharpe or RiskAdjusted')
+
+    # The objectives return (value, gradient) so scipy skips the finite differences
+    split = _split_weights(bounds, optimization, limits, holdings)
+    if split is None:
+        if optimization != 'RiskAdjusted':
+            constraints = [{'type': 'eq', 'fun': constraint_weights_sum, 'jac': constraint_weights_sum_jac}] + constraints
+        return minimize(objective, initial_weights, method='SLSQP', jac=True, bounds=bounds, constraints=constraints)
+
+    # Over the split variables: the functions of the weights composed with split.weights, plus the limit rows
+    def split_objective(z):
+        value, gradient = objective(split.weights(z))
+        return value, split.linear(gradient)
+
+    E, e = split.rows()
+    split_constraints = [{'type': constraint['type'], 'fun': lambda z, constraint=constraint: constraint['fun'](split.weights(z)),
+                          'jac': lambda z, constraint=constraint: split.linear(constraint['jac'](split.weights(z)))}
+                         for constraint in constraints]
+    split_constraints.append({'type': 'eq', 'fun': lambda z: E @ z - e, 'jac': lambda z: E})
+    result = minimize(split_objective, split.split(initial_weights), method='SLSQP', jac=True,
+                      bounds=list(zip(split.lower, split.upper)), constraints=split_constraints)
+    result.x = split.weights(result.x)
+    return result
+
+
+def _solve_qp(expected_returns, covariance, initial_weights, bounds, optimization, target=None, tau=None, riskfree_return=0.0,
+              limits=None, holdings=None):
+    # The same problems as convex quadratic programs solved exactly by QuadraticProgramming.box_qp (covariance: dense
+    # N x N array). Returns an OptimizeResult like _solve_slsqp, with success False when the problem is out of reach
+    # (infeasible target, active sets cycling on a degenerate vertex) so _solve_portfolio falls back to SLSQP, unless its
+    # fallback is False: a MaxSharpe whose ratio is unbounded (zero variance at a positive return), SLSQP would only
+    # chase the ratio up to its iteration limit.
+    # nit counts the bound-constrained solves of box_qp, nfev the box_qp calls.
+    # With exposure limits every QP is solved over the split variables of LongShort.SplitWeights, whose rows replace
+    # the budget (fully invested, or the net exposure range). The limited set of weights is still convex, so MaxReturn
+    # and MaxSharpe search its efficient branch the same way.
+    lower, upper = np.asarray(bounds, dtype=float).T
+    budget = np.ones(len(expected_returns))
+    solves = {'nit': 0, 'nfev': 0, 'weights': np.asarray(initial_weights, dtype=float), 'fallback': True}
+    if optimization == 'MaxSharpe':
+        # The Sharpe ratio of the excess returns mu - rf, (mu - rf)'w being the portfolio's return over the risk-free
+        # return at any net exposure (the cash earns rf). The problem stays homogeneous in w.
+        expected_returns = expected_returns - riskfree_return
+    split = _split_weights(bounds, optimization, limits, holdings)
+
+    def quadratic(H, c, E=None, e=None, x0=None):
+        if split is None:
+            return box_qp(H, c, lower, upper, E, e, x0)
+        H_split, c_split = split.quadratic(H, c)
+        E_split, e_split = split.rows(E, e)
+        # The opposite trades of an asset make the split problem degenerate, which the method of multipliers handles
+        z, converged, iterations = box_qp(H_split, c_split, split.lower, split.upper, E_split, e_split, None if x0 is None else split.split(x0),
+                                          multipliers=True)
+        return split.weights(z), converged, iterations
+
+    def max_return_portfolio():
+        return max_return_weights(expected_returns, bounds) if split is None else split.max_return(expected_returns)
+
+    def min_variance(return_target=None):
+        # Fully invested (or limited) minimum variance portfolio, at the return target if given (warm-started from the last solve)
+        if split is None:
+            E, e = (budget, 1.0) if return_target is None else (np.vstack([budget, expected_returns]), [1.0, return_target])
+        else:
+            E, e = (None, None) if return_target is None else (expected_returns, [return_target])
+        weights, converged, iterations = quadratic(2 * covariance, np.zeros(len(budget)), E, e, solves['weights'])
+        solves['nit'] += iterations
+        solves['nfev'] += 1
+        if not converged:
+            raise ValueError('QP did not converge')
+        solves['weights'] = weights
+        return weights
 
-    if weight_change is None:
-        bounds = [(-1, 1)] * len(returns)
+    def volatility(weights):
+        return np.sqrt(max(weights @ covariance @ weights, 0.0))
+
+    try:
+        if optimization == 'RiskAdjusted':
+            # max mu'w + (1 - sum(w)) rf - tau * 1e4 * w'Sigma w, only the bounds constrain the weights
+            weights, converged, solves['nit'] = quadratic(2e4 * tau * covariance, expected_returns - riskfree_return, x0=initial_weights)
+            solves['nfev'] = 1
+            if not converged:
+                raise ValueError('QP did not converge')
+
+        elif optimization == 'MinRisk':
+            # Minimum variance (not volatility), the return constraint only enters when the minimum variance portfolio misses it
+            weights = min_variance()
+            if expected_returns @ weights < target:
+                if target > expected_returns @ max_return_portfolio():
+                    raise ValueError('Target return above the maximum return')
+                weights = min_variance(target)
+
+        elif optimization in ('MaxReturn', 'MaxSharpe'):
+            # Both solutions lie on the efficient branch, between the minimum variance and the maximum return portfolios
+            min_weights, max_weights = min_variance(), max_return_portfolio()
+            min_return, max_return = expected_returns @ min_weights, expected_returns @ max_weights
+
+            if optimization == 'MaxReturn':
+                # Highest return whose minimum volatility meets the target: volatility is increasing along the branch
+                if volatility(min_weights) > target:
+                    raise ValueError('Target volatility below the minimum volatility')
+                if volatility(max_weights) <= target:
+                    weights = max_weights
+                else:
+                    ends = {min_return: volatility(min_weights) - target, max_return: volatility(max_weights) - target}
+                    root = brentq(lambda r: ends[r] if r in ends else volatility(min_variance(r)) - target, min_return, max_return, xtol=1e-15)
+                    weights = min_variance(root)
+            else:
+                if max_return <= 0:
+                    raise ValueError('No portfolio with a return above the risk-free return')
+                # Volatilities below riskless are the rounding of a zero variance (portfolios of zero variance exist with
+                # a singular covariance, e.g. more assets than dates, or the zero portfolio within a net exposure range)
+                riskless = 1e-6 * volatility(max_weights)
+                small_return = 1e-3 * max_return
+                small_volatility = volatility(min_variance(small_return)) if volatility(min_weights) <= riskless else np.inf
+                if small_volatility <= riskless:
+                    # Zero variance at a positive return: the Sharpe ratio is unbounded, the highest such return is taken
+                    solves['fallback'] = False
+                    ends = {max_return: volatility(max_weights) - riskless}
+                    riskless_volatility = lambda r: ends[r] if r in ends else volatility(min_variance(r)) - riskless
+                    weights = min_variance(brentq(riskless_volatility, small_return, max_return, xtol=1e-15))
+                elif np.isfinite(small_volatility) and abs(min_return) <= 1e-9 * max_return:
+                    # The zero portfolio is feasible (a net exposure range around 0): the minimum volatility is convex in
+                    # the return and 0 at 0, so the Sharpe ratio only falls with the return, and stays at its best from 0
+                    # up to where a limit binds. The largest return with that ratio (measured at 0.1% of the maximum
+                    # return) is taken, the maximum return end from its own portfolio like for MaxReturn.
+                    sharpe = (1 - 1e-6) * small_return / small_volatility
+                    ends = {max_return: max_return / volatility(max_weights) - sharpe}
+                    if ends[max_return] >= 0:
+                        weights = max_weights
+                    else:
+                        flat = lambda r: ends[r] if r in ends else r / volatility(min_variance(r)) - sharpe
+                        weights = min_variance(brentq(flat, small_return, max_return, xtol=1e-15))
+                else:
+                    # Convex reformulation with y = k * w: g(k) = min y'Sigma y s.t. mu'y = 1, sum(y) = k, k * lower <= y <= k * upper
+                    # is convex in k, and for a given k it is k^2 times the minimum variance at return 1 / k. The search runs
+                    # on log k (a monotone change keeps g unimodal) between the maximum return and the minimum variance return.
+                    lowest_return = min_return if min_return > 0 else 1e-6 * max_return
+                    g = lambda log_k: np.exp(2 * log_k) * volatility(min_variance(np.exp(-log_k))) ** 2
+                    search = minimize_scalar(g, bounds=(-np.log(max_return), -np.log(lowest_return)), method='bounded', options={'xatol': 1e-10})
+                    weights = min_variance(np.exp(-search.x))
+
+        else:
+            raise ValueError('Optimization must be MaxReturn, MinRisk, MaxSharpe or RiskAdjusted')
+
+    except (ValueError, np.linalg.LinAlgError) as error:
+        return OptimizeResult(x=solves['weights'], success=False, nit=solves['nit'], nfev=solves['nfev'], message=str(error),
+                              fallback=solves['fallback'])
+    return OptimizeResult(x=weights, success=True, nit=solves['nit'], nfev=solves['nfev'], message='Optimal solution found')
+
+
+# MaxSharpe problems with fewer SLSQP variables (the assets, twice as many with exposure limits) go to SLSQP under
+# solver 'qp': the QP searches the efficient branch with a dozen QP solves, several times slower than SLSQP at that size
+# (see benchmarks/qp_backend.py), and only catches up from about 100 variables
+MAX_SHARPE_QP_VARIABLES = 100
+
+def _max_sharpe_on_qp(covariance, n_assets, limits):
+    # The QP for a MaxSharpe from MAX_SHARPE_QP_VARIABLES variables, or with a singular covariance (more assets than
+    # dates), whose zero variance portfolios SLSQP cannot handle
+    n_variables = n_assets if limits is None or np.isnan(limits).all() else 2 * n_assets
+    if n_variables >= MAX_SHARPE_QP_VARIABLES:
+        return True
+    try:
+        np.linalg.cholesky(covariance)
+    except np.linalg.LinAlgError:
+        return True
+    return False
+
+
+def _solve_portfolio(expected_returns, covariance, initial_weights, bounds, optimization, target=None, tau=None, riskfree_return=0.0, solver='qp',
+                     limits=None, holdings=None):
+    # Solver backend: 'qp' (exact convex QP, SLSQP when it fails) or 'slsqp'. covariance: matrix, DataFrame or FactorCovariance
+    # A FactorCovariance always goes to SLSQP on its O(N*k) product, the QP would need the dense N x N matrix
+    # The result's backend is the solver that returned it ('qp+slsqp' after a fallback, nit and nfev then count both)
+    # A small MaxSharpe goes to SLSQP even with solver 'qp' (see MAX_SHARPE_QP_VARIABLES)
+    # limits: (gross exposure, min net exposure, max net exposure, turnover from holdings), NaN where not given
+    if solver not in ('qp', 'slsqp'):
+        raise ValueError('solver must be qp or slsqp')
+    qp_result = None
+    if solver == 'qp' and optimization == 'MaxSharpe' and not isinstance(covariance, FactorCovariance):
+        solver = 'qp' if _max_sharpe_on_qp(np.asarray(covariance, dtype=float), len(expected_returns), limits) else 'slsqp'
+    if solver == 'qp' and not isinstance(covariance, FactorCovariance):
+        qp_result = _solve_qp(expected_returns, np.asarray(covariance, dtype=float), initial_weights, bounds, optimization, target, tau, riskfree_return,
+                              limits, holdings)
+        if qp_result.success or not qp_result.fallback:
+            qp_result.backend = 'qp'
+            return qp_result
+    result = _solve_slsqp(expected_returns, covariance_product(covariance), initial_weights, bounds, optimization, target, tau, riskfree_return,
+                          limits, holdings)
+    result.backend = 'slsqp'
+    if qp_result is not None:
+        result.backend, result.nit, result.nfev = 'qp+slsqp', result.nit + qp_result.nit, result.nfev + qp_result.nfev
+    return result
+
+
+# Covariance shared by every problem of a batch, set once per pool worker by _set_batch_covariance
+_batch_data = {}
+
+def _set_batch_covariance(covariance, solver):
+    # The QP backend works on the dense matrix, SLSQP on the product function (a FactorCovariance is never densified)
+    dense = solver == 'qp' and not isinstance(covariance, FactorCovariance)
+    _batch_data['covariance'] = np.asarray(covariance, dtype=float) if dense else covariance
+
+def _solve_batch_problem(problem):
+    expected_returns, initial_weights, bounds, optimization, target, tau, riskfree_return, solver, limits, holdings = problem
+    start = time.perf_counter()
+    result = _solve_portfolio(expected_returns, _batch_data['covariance'], initial_weights, bounds, optimization, target, tau, riskfree_return, solver,
+                              limits, holdings)
+    return result.x, result.success, result.nit, result.nfev, result.backend, time.perf_counter() - start
+
+def optimize_portfolios(expected_returns, covariance, problems, initial_weights=None, bounds=None, workers=1, cache=None, solver='qp'):
+    # Solves many portfolios that share one covariance matrix (parameter sweeps, sub-portfolios of a universe).
+    # expected_returns: N, or P x N with one row per problem; initial_weights: same shapes (default: equal weights)
+    # covariance: N x N matrix/DataFrame or FactorCovariance, converted once and reused by every problem
+    # problems: table with one row per problem (DataFrame, dict of columns or list of dicts) and the columns
+    #   Optimization: 'MaxReturn', 'MinRisk', 'MaxSharpe' or 'RiskAdjusted'
+    #   Target: volatility for MaxReturn, return for MinRisk
+    #   Tau: RiskAdjusted. Riskfree Return (default 0): return of the cash for RiskAdjusted, and the return the Sharpe
+    #     Ratio is measured over, which MaxSharpe maximizes
+    #   Weight Change: bounds of initial weight +- weight change (missing or NaN for (-1, 1))
+    #   Gross Exposure: limit of sum |w| (leverage, e.g. 1.6 for 130/30), Turnover: limit of sum |w - initial weights|
+    #   Min Net Exposure and Max Net Exposure: range of sum(w) (default: fully invested, free for RiskAdjusted; a missing
+    #     side is left to the bounds), e.g. both 0 for a market neutral portfolio. Shorts need bounds below 0.
+    #   The limits are solved over split long/short trades (see LongShort), missing or NaN for none
+    # bounds: N x 2 or P x N x 2 (lower, upper) instead of Weight Change, e.g. (0, 0) leaves an asset out of a sub-portfolio
+    # With workers > 1 the problems run on a process pool that receives the covariance once per worker.
+    # cache: SolveCache that returns the problems solved before and warm-starts the others (Cached marks the hits)
+    # solver: 'qp' solves the problems as exact convex QPs and falls back to SLSQP when that fails, 'slsqp' only uses SLSQP
+    #   (as does a FactorCovariance, whose products avoid the N x N matrix, and a MaxSharpe of fewer than
+    #   MAX_SHARPE_QP_VARIABLES variables with a positive definite covariance, which SLSQP solves faster)
+    # Returns a dict of full precision arrays: Weights (P x N) and one value per problem for the rest (Iterations and
+    # Function Evaluations add up every solver tried, Function Evaluations is 0 for the cached problems; Turnover is
+    # measured from the initial weights).
+    # With Instrumentation active every solved (not cached) problem adds a 'solve' record, the pool's included.
+    if solver not in ('qp', 'slsqp'):
+        raise ValueError('solver must be qp or slsqp')
+    problems = pd.DataFrame(problems).reset_index(drop=True)
+    with stage('optimize_portfolios', problems=len(problems), workers=workers, solver=solver):
+        return _optimize_portfolios(expected_returns, covariance, problems, initial_weights, bounds, workers, cache, solver)
+
+def _optimize_portfolios(expected_returns, covariance, problems, initial_weights, bounds, workers, cache, solver):
+    n_problems = len(problems)
+    expected_returns = np.asarray(expected_returns, dtype=float)
+    n_assets = expected_returns.shape[-1]
+    expected_returns = np.broadcast_to(expected_returns, (n_problems, n_assets))
+    if initial_weights is None:
+        initial_weights = np.full(n_assets, 1 / n_assets)
+    initial_weights = np.broadcast_to(np.asarray(initial_weights, dtype=float), (n_problems, n_assets))
+
+    def column(name, default):
+        return problems[name].to_numpy(dtype=float) if name in problems else np.full(n_problems, default)
+
+    optimization = problems['Optimization'].to_numpy()
+    if not np.isin(optimization, ['MaxReturn', 'MinRisk', 'MaxSharpe', 'RiskAdjusted']).all():
+        raise ValueError('Optimization must be MaxReturn, MinRisk, MaxSharpe or RiskAdjusted')
+    target, tau = column('Target', np.nan), column('Tau', np.nan)
+    riskfree_return, weight_change = np.nan_to_num(column('Riskfree Return', 0.0)), column('Weight Change', np.nan)
+    if np.isnan(target[np.isin(optimization, ['MaxReturn', 'MinRisk'])]).any():
+        raise ValueError('Target must be given for MaxReturn and MinRisk')
+    if np.isnan(tau[optimization == 'RiskAdjusted']).any():
+        raise ValueError('Tau must be given for RiskAdjusted')
+    limits = np.column_stack([column('Gross Exposure', np.nan), column('Min Net Exposure', np.nan),
+                              column('Max Net Exposure', np.nan), column('Turnover', np.nan)])
+    if (limits[:, [0, 3]] < 0).any():
+        raise ValueError('Gross Exposure and Turnover must be positive')
+    holdings = initial_weights # Turnover is measured from the initial weights, not from a warm start
+
+    if bounds is None:
+        problem_bounds = [_weight_bounds(x0, change) for x0, change in zip(initial_weights, weight_change)]
     else:
-        bounds = []
-        for wt in initial_weights:
-            bounds.append((round(wt-weight_change,2), round(wt + weight_change,2)))
-        bounds = tuple(bounds)
-        
-    result = minimize(objective, initial_weights, method='SLSQP', bounds=bounds,  constraints=constraints)
-    optimal_weights = result.x
-    optimal_portfolio_return = np.sum(np.array(list(returns.values())) * optimal_weights)
-    optimal_portfolio_volatility = np.sqrt(np.dot(optimal_weights.T, np.dot(covariance_df.values, optimal_weights)))
-    optimal_sharpe_ratio = optimal_portfolio_return / optimal_portfolio_volatility
+        problem_bounds = np.broadcast_to(np.asarray(bounds, dtype=float), (n_problems, n_assets, 2))
+
+    weights = np.empty((n_problems, n_assets))
+    success = np.empty(n_problems, dtype=bool)
+    iterations = np.empty(n_problems, dtype=int)
+    evaluations = np.zeros(n_problems, dtype=int)
+    cached = np.zeros(n_problems, dtype=bool)
+    pending = np.arange(n_problems)
+    if cache is not None:
+        # Cached problems are filled in, the others start from the nearest cached solution (within their bounds)
+        covariance_hash = covariance_digest(covariance)
+        keys = [cache.key(covariance_hash, *problem, solver, limits[i], holdings[i])
+                for i, problem in enumerate(zip(expected_returns, optimization, target, tau, riskfree_return, problem_bounds))]
+        initial_weights = initial_weights.copy()
+        for i, key in enumerate(keys):
+            solution = cache.get(key)
+            if solution is not None:
+                (weights[i], success[i], iterations[i]), cached[i] = solution, True
+                continue
+            nearest = cache.nearest(optimization[i], cache.signature(expected_returns[i], target[i], tau[i], riskfree_return[i], problem_bounds[i]))
+            if nearest is not None:
+                initial_weights[i] = np.clip(nearest, problem_bounds[i][:, 0], problem_bounds[i][:, 1])
+        pending = np.flatnonzero(~cached)
+
+    tasks = ((expected_returns[i], initial_weights[i], problem_bounds[i], optimization[i], target[i], tau[i], riskfree_return[i], solver,
+              limits[i], holdings[i]) for i in pending)
+    if workers == 1:
+        _set_batch_covariance(covariance, solver)
+        results = list(map(_solve_batch_problem, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_set_batch_covariance, initargs=(covariance, solver)) as executor:
+            results = list(executor.map(_solve_batch_problem, tasks, chunksize=max(1, len(pending) // (4 * workers))))
+
+    for i, (x, converged, nit, nfev, backend, seconds) in zip(pending, results):
+        weights[i], success[i], iterations[i], evaluations[i] = x, converged, nit, nfev
+        record('solve', problem=int(i), optimization=optimization[i], backend=backend, iterations=int(nit),
+               function_evaluations=int(nfev), success=bool(converged), seconds=seconds)
+        if cache is not None:
+            cache.put(keys[i], x, converged, nit, optimization[i], cache.signature(expected_returns[i], target[i], tau[i], riskfree_return[i], problem_bounds[i]))
+
+    # Statistics of every solution in one pass, the cash left (1 - sum(w)) earns the risk-free return
+    cov_weights = covariance_product(covariance)(weights.T).T
+    portfolio_return = (weights * expected_returns).sum(axis=1) + (1 - weights.sum(axis=1)) * riskfree_return
+    portfolio_volatility = np.sqrt(np.maximum((weights * cov_weights).sum(axis=1), 0)) # A zero variance may round below 0
 
     return {
-        "Optimal Weights": list(np.round(optimal_weights, decimals=3)),
-        "Optimal Portfolio Return": optimal_portfolio_return,
-        "Optimal Portfolio Volatility": optimal_portfolio_volatility,
-        "Optimal Sharpe Ratio": optimal_sharpe_ratio
-     }
+        "Weights": weights,
+        "Portfolio Return": portfolio_return,
+        "Portfolio Volatility": portfolio_volatility,
+        "Sharpe Ratio": (portfolio_return - riskfree_return) / portfolio_volatility,
+        "RiskAdjusted Return": portfolio_return - tau * portfolio_volatility**2,
+        "Gross Exposure": np.abs(weights).sum(axis=1),
+        "Net Exposure": weights.sum(axis=1),
+        "Turnover": np.abs(weights - holdings).sum(axis=1),
+        "Success": success,
+        "Iterations": iterations,
+        "Function Evaluations": evaluations,
+        "Cached": cached
+    }
 
-#print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MinRisk',0.05,20))
-#print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MaxReturn',0.2,20))
-#print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MaxSharpe',weight_change=20))
+def _exposure_limits(gross_exposure, net_exposure, turnover):
+    # Problem columns of the wrappers' exposure limits, net_exposure a number or (min, max)
+    limits = {}
+    if gross_exposure is not None:
+        limits['Gross Exposure'] = gross_exposure
+    if net_exposure is not None:
+        limits['Min Net Exposure'], limits['Max Net Exposure'] = np.broadcast_to(np.asarray(net_exposure, dtype=float), 2)
+    if turnover is not None:
+        limits['Turnover'] = turnover
+    return limits
 
-def SharpeOptimalPortfolio(returns,initial_weights,covariance_df,tau,riskfree_return,optimization,weight_change=None): 
+def PortfolioSimpleOptimization(returns,initial_weights,covariance_df,optimization,target=None,weight_change=None,cache=None,solver='qp',
+                                gross_exposure=None,net_exposure=None,turnover=None):
+    # gross_exposure, net_exposure (number or (min, max)) and turnover: exposure limits of optimize_portfolios
+    if optimization not in ('MaxReturn', 'MinRisk', 'MaxSharpe'):
+        raise ValueError('Optimization must be MaxReturn, MinRisk or MaxSharpe')
+    problem = {'Optimization': optimization, 'Target': np.nan if target is None else target,
+               'Weight Change': np.nan if weight_change is None else weight_change,
+               **_exposure_limits(gross_exposure, net_exposure, turnover)}
+    result = optimize_portfolios(np.array(list(returns.values()), dtype=float), covariance_df, [problem],
+                                 np.array(list(initial_weights.values()), dtype=float), cache=cache, solver=solver)
 
-    def objective(weights):
-        pfolio_return = np.sum(np.array(list(returns.values())) * weights) + (1 - weights.sum()) * riskfree_return
-        pfolio_vol = 100 * np.sqrt(np.dot(weights.T, np.dot(covariance_df.values, weights)))
-        pfolio_riskadjusted_return = pfolio_return - tau*(pfolio_vol**2)
-        return -pfolio_riskadjusted_return 
-     
-    initial_weights = list(initial_weights.values())
+    return {
+        "Optimal Weights": list(np.round(result['Weights'][0], decimals=3)),
+        "Optimal Portfolio Return": result['Portfolio Return'][0],
+        "Optimal Portfolio Volatility": result['Portfolio Volatility'][0],
+        "Optimal Sharpe Ratio": result['Sharpe Ratio'][0]
+     }
 
-    if weight_change is None:
-        bounds = [(-1, 1)] * len(returns)
-    else:
-        bounds = []
-    for wt in initial_weights:
-        bounds.append((round(wt-weight_change,2), round(wt + weight_change,2)))
-    bounds = tuple(bounds)
-    
-    result = minimize(objective, initial_weights, method='SLSQP', bounds=bounds)
-    optimal_weights = result.x
-    optimal_portfolio_return = np.sum(np.array(list(returns.values())) * optimal_weights) + (1 - optimal_weights.sum()) * riskfree_return
-    optimal_portfolio_volatility = np.sqrt(np.dot(optimal_weights.T, np.dot(covariance_df.values, optimal_weights)))
-    optimal_riskadjusted_return = optimal_portfolio_return - tau*(optimal_portfolio_volatility**2)
+def SharpeOptimalPortfolio(returns,initial_weights,covariance_df,tau,riskfree_return,optimization,weight_change=None,cache=None,solver='qp',
+                           gross_exposure=None,net_exposure=None,turnover=None): 
+    if optimization not in ('Risk-Adjusted Maximization', 'Sharpe Portfolio Calculation'):
+        raise ValueError('Optimization must be Risk-Adjusted Maximization or Sharpe Portfolio Calculation')
+    problem = {'Optimization': 'RiskAdjusted', 'Tau': tau, 'Riskfree Return': riskfree_return,
+               'Weight Change': np.nan if weight_change is None else weight_change,
+               **_exposure_limits(gross_exposure, net_exposure, turnover)}
+    result = optimize_portfolios(np.array(list(returns.values()), dtype=float), covariance_df, [problem],
+                                 np.array(list(initial_weights.values()), dtype=float), cache=cache, solver=solver)
+    optimal_weights = result['Weights'][0]
 
     if optimization == 'Risk-Adjusted Maximization':
         return ({
             "Optimal Weights": list(np.round(optimal_weights, decimals=3)),
-            "Optimal Portfolio Return": optimal_portfolio_return,
-            "Optimal Portfolio Volatility": optimal_portfolio_volatility,
-            "Optimal RiskAdjusted Ratio": optimal_riskadjusted_return
+            "Optimal Portfolio Return": result['Portfolio Return'][0],
+            "Optimal Portfolio Volatility": result['Portfolio Volatility'][0],
+            "Optimal RiskAdjusted Ratio": result['RiskAdjusted Return'][0]
         })
-    elif optimization == 'Sharpe Portfolio Calculation':
+    else:
         sharpe_optimal_weights = optimal_weights / optimal_weights.sum()
-        optimal_sharpe_ratio = ((np.sum(np.array(list(returns.values())) * optimal_weights) + (1 - optimal_weights.sum()) * riskfree_return) - riskfree_return) / optimal_portfolio_volatility
     
         return ({
             "Sharpe Optimal Weights": list(np.round(sharpe_optimal_weights, decimals=3)),
-            "Optimal Sharpe Ratio": optimal_sharpe_ratio
-        }) 
-    else:
-        raise ValueError('Optimization must be Risk-Adjusted Maximization or Sharpe Portfolio Calculation')
+            "Optimal Sharpe Ratio": result['Sharpe Ratio'][0]
+        })
+
+
+def main():
+    returns, initial_weights, covariance_df = sample_problem()
+    print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MinRisk',0.05,20))
+    print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MaxReturn',0.2,20))
+    print(PortfolioSimpleOptimization(returns,initial_weights,covariance_df,'MaxSharpe',weight_change=20))
+    print(SharpeOptimalPortfolio(returns,initial_weights,covariance_df,0.01,0.015,'Risk-Adjusted Maximization',20))
+    print(SharpeOptimalPortfolio(returns,initial_weights,covariance_df,0.01,0.015,'Sharpe Portfolio Calculation',20))
+
 
-#print(SharpeOptimalPortfolio(returns,initial_weights,covariance_df,0.01,0.015,'Risk-Adjusted Maximization',20))
-#print(SharpeOptimalPortfolio(returns,initial_weights,covariance_df,0.01,0.015,'Sharpe Portfolio Calculation',20))
\ No newline at end of file
+if __name__ == '__main__':
+    main()
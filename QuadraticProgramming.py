@@ -0,0 +1,256 @@
+### Active-set solver for the convex quadratic programs of the mean-variance optimizers
+###   min 1/2 x'Hx - c'x  s.t.  Ex = e (a few rows), lower <= x <= upper,  H positive semidefinite
+### The bounds are handled by a primal-dual active set method: the variables fixed at a bound are taken out, the system
+### of the free ones is solved exactly (one Cholesky of the free block), then the free variables that crossed a bound are
+### fixed and the fixed ones whose bound multiplier has the wrong sign are released, until the sets repeat. The equality
+### rows are moved into the objective with their multipliers, which are found by a Newton ascent on the (concave,
+### piecewise quadratic) dual function, so every step is a bound-constrained solve warm-started from the previous sets.
+### The method of multipliers takes over on the rare degenerate vertices where the Newton ascent stalls, and solves
+### from the start the problems that are degenerate by construction (multipliers=True, e.g. the split long/short
+### variables of LongShort, where H is singular up to a tiny ridge along every pair of opposite trades).
+### A singular H (more assets than observations) is solved through a ridge continuation, finished by a primal active
+### set method that follows the directions of zero curvature where the solutions are not unique.
+
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve, solve_triangular
+from scipy.linalg.lapack import dpstrf
+
+
+def _bounded_qp(H, c, lower, upper, at_lower, at_upper, fixed, tol_x, tol_g, max_iter):
+    # min 1/2 x'Hx - c'x s.t. lower <= x <= upper from the given bounded sets. Raises LinAlgError when the free block
+    # is singular. Returns (x, converged, iterations, at_lower, at_upper, Cholesky factor of the free block or None)
+    seen = set()
+    for iteration in range(1, max_iter + 1):
+        free = ~(at_lower | at_upper)
+        x = np.where(at_upper, upper, lower)
+        factor = None
+        if free.any():
+            block = H[np.ix_(free, free)]
+            factor = cho_factor(block)
+            if np.diag(factor[0]).min() ** 2 <= 1e-10 * np.diag(block).max():
+                raise np.linalg.LinAlgError('Singular free block') # Factored only through rounding
+            x[free] = cho_solve(factor, c[free] - H[np.ix_(free, ~free)] @ x[~free])
+
+        # A variable at its lower bound needs gradient >= 0, at its upper bound gradient <= 0
+        gradient = H @ x - c
+        new_lower = fixed | (free & (x < lower - tol_x)) | (at_lower & (gradient > -tol_g))
+        new_upper = ~new_lower & ((free & (x > upper + tol_x)) | (at_upper & (gradient < tol_g)))
+        if np.array_equal(new_lower, at_lower) and np.array_equal(new_upper, at_upper):
+            return x, True, iteration, at_lower, at_upper, factor
+        sets = (new_lower.tobytes(), new_upper.tobytes())
+        if sets in seen:
+            break
+        seen.add(sets)
+        at_lower, at_upper = new_lower, new_upper
+    return np.clip(x, lower, upper), False, iteration, at_lower, at_upper, None
+
+
+def _dual_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter):
+    # Newton ascent on the multipliers of the equality rows, from the given bounded sets. Returns (x, converged, iterations)
+    def solve(nu, at_lower, at_upper):
+        x, converged, iterations, at_lower, at_upper, factor = _bounded_qp(H, c - E.T @ nu, lower, upper, at_lower, at_upper, fixed, tol_x, tol_g, max_iter)
+        dual = 0.5 * x @ H @ x - c @ x + nu @ (E @ x - e)
+        return x, converged, iterations, at_lower, at_upper, factor, dual
+
+    nu = np.zeros(len(e))
+    x, converged, total, at_lower, at_upper, factor, dual = solve(nu, at_lower, at_upper)
+    for _ in range(max_iter):
+        residual = E @ x - e # Gradient of the dual function
+        if not converged or np.abs(residual).max(initial=0) <= tol_e:
+            return x, converged, total
+
+        # Newton step of the dual: its curvature is -E_F H_FF^-1 E_F' on the current free set
+        free = ~(at_lower | at_upper)
+        curvature = E[:, free] @ cho_solve(factor, E[:, free].T) if factor is not None else np.zeros((len(e), len(e)))
+        step = np.linalg.lstsq(curvature, residual, rcond=None)[0]
+        unreached = residual - curvature @ step
+        degenerate = np.abs(unreached).max() > tol_e
+        if degenerate:
+            # Part of the residual the free variables cannot move (too few of them): stepped as if every variable
+            # were free, which releases some from their bounds
+            step = step + np.linalg.lstsq((E / np.diag(H)) @ E.T, unreached, rcond=None)[0]
+        if residual @ step <= 0:
+            # Residual outside the reach of the free variables: plain ascent, scaled like the diagonal of H
+            step = residual / np.abs(np.diag(H)).max()
+
+        # Backtracking until the dual increases enough (Armijo) or, where the dual values are down to rounding, the
+        # residual halves, every trial warm-started from the current sets
+        t = 1.0
+        for _ in range(40):
+            trial = solve(nu + t * step, at_lower, at_upper)
+            if trial[1] and (trial[6] >= dual + 1e-4 * t * (residual @ step) or np.abs(E @ trial[0] - e).max() <= 0.5 * np.abs(residual).max()):
+                break
+            t /= 2
+        else:
+            return x, False, total
+        if degenerate and t == 1.0:
+            # Where the dual is linear along the step (the bounded sets do not change) the step doubles until they do
+            while np.array_equal(trial[3], at_lower) and np.array_equal(trial[4], at_upper) and t < 2.0 ** 40:
+                longer = solve(nu + 2 * t * step, at_lower, at_upper)
+                if not longer[1] or longer[6] < trial[6]:
+                    break
+                t, trial = 2 * t, longer
+        nu = nu + t * step
+        x, converged, iterations, at_lower, at_upper, factor, dual = trial
+        total += iterations
+
+    return x, False, total
+
+
+def _augmented_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter):
+    # Method of multipliers for the equality rows, slower than the Newton ascent but not thrown off by degenerate
+    # vertices: min 1/2 x'Hx - c'x + nu'(Ex - e) + rho/2 |Ex - e|^2 within the bounds, then nu += rho (Ex - e), with rho
+    # raised tenfold whenever the residual does not fall tenfold. Returns (x, converged, iterations)
+    scale = np.abs(E).max(axis=1)
+    E, e, tol_e = E / scale[:, None], e / scale, tol_e / scale.max()
+    rho = np.abs(np.diag(H)).mean()
+    nu, total, last = np.zeros(len(e)), 0, np.inf
+    for _ in range(max_iter):
+        x, converged, iterations, at_lower, at_upper, _ = _bounded_qp(H + rho * E.T @ E, c - E.T @ (nu - rho * e), lower, upper, at_lower, at_upper, fixed, tol_x, tol_g, max_iter)
+        total += iterations
+        residual = np.abs(E @ x - e).max()
+        if not converged or residual <= tol_e:
+            return x, converged, total
+        nu = nu + rho * (E @ x - e)
+        if residual > 0.1 * last:
+            rho *= 10
+        last = residual
+    return x, False, total
+
+
+def _primal_qp(H, c, lower, upper, E, e, x, fixed, tol_x, tol_g, max_iter):
+    # Primal active set method from a feasible x, for any positive semidefinite H: every step minimizes over the free
+    # variables within the null space of their equality rows, along a direction of zero curvature to the nearest bound
+    # where the reduced H is singular and the gradient has a component in its null space. One variable changes set per
+    # iteration and the objective never increases. Returns (x, converged, iterations)
+    scale = np.abs(np.diag(H)).max()
+    x = x.copy()
+    at_lower = fixed | (x <= lower + tol_x)
+    at_upper = ~at_lower & (x >= upper - tol_x)
+    x[at_lower], x[at_upper] = lower[at_lower], upper[at_upper]
+    minimum = False # x minimizes over the current sets (after a full step), so only the multipliers are checked
+    for iteration in range(1, max_iter + 1):
+        free = np.flatnonzero(~(at_lower | at_upper))
+        gradient = H @ x - c
+        step, full = np.zeros(len(free)), 1.0
+        if len(free) and not minimum:
+            # H and the gradient reduced to the null space of the equality rows of the free variables (orthonormal basis)
+            block, reduced_gradient, basis = H[np.ix_(free, free)], gradient[free], None
+            if len(e):
+                _, singular_values, vt = np.linalg.svd(E[:, free])
+                basis = vt[(singular_values > 1e-12 * max(1.0, singular_values.max(initial=0))).sum():].T
+                block, reduced_gradient = basis.T @ block @ basis, basis.T @ reduced_gradient
+            # Pivoted Cholesky P'HP = U'U stopped at the first pivot below rounding: the rank leading rows give a basis
+            # [-K; I] (K = U11^-1 U12) of the null space of H in the pivoted order, and a Newton step that only uses
+            # the leading variables where the gradient has no component in that null space
+            factor, order, rank, _ = dpstrf(block, tol=1e-10 * scale)
+            order = order - 1
+            leading, trailing = order[:rank], order[rank:]
+            head = factor[:rank, :rank]
+            K = solve_triangular(head, factor[:rank, rank:])
+            flat = reduced_gradient[trailing] - K.T @ reduced_gradient[leading]
+            step = np.zeros(len(block))
+            if np.abs(flat).max(initial=0) > tol_g:
+                # Direction of zero curvature along which the objective falls linearly, followed up to a bound
+                step[leading], step[trailing], full = K @ flat, -flat, np.inf
+            else:
+                step[leading] = -cho_solve((head, False), reduced_gradient[leading])
+            step = step if basis is None else basis @ step
+
+        if np.abs(step).max(initial=0) <= tol_x:
+            # Minimum on the current sets: release the fixed variable whose bound multiplier has the most wrong sign
+            nu = np.linalg.lstsq(E[:, free].T, gradient[free], rcond=None)[0] if len(e) else np.zeros(0)
+            multipliers = gradient - E.T @ nu
+            wrong = np.where(at_lower & ~fixed, -multipliers, 0) + np.where(at_upper, multipliers, 0)
+            if wrong.max() <= tol_g:
+                return x, True, iteration
+            released = np.argmax(wrong)
+            at_lower[released] = at_upper[released] = False
+            minimum = False
+            continue
+
+        # Longest step within the bounds, the first variable to reach one is fixed there
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(step < 0, (lower[free] - x[free]) / step, np.where(step > 0, (upper[free] - x[free]) / step, np.inf))
+        blocking = np.argmin(ratios)
+        length = min(full, max(ratios[blocking], 0.0))
+        if not np.isfinite(length):
+            break
+        x[free] += length * step
+        minimum = length == full
+        if length < full:
+            variable = free[blocking]
+            at_lower[variable], at_upper[variable] = step[blocking] < 0, step[blocking] > 0
+            x[variable] = lower[variable] if step[blocking] < 0 else upper[variable]
+    return np.clip(x, lower, upper), False, max_iter
+
+
+def _equality_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter, multipliers=False):
+    if multipliers and len(e):
+        return _augmented_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter)
+    x, converged, total = _dual_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter)
+    if converged or not len(e):
+        return x, converged, total
+    x, converged, iterations = _augmented_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter)
+    return x, converged, total + iterations
+
+
+def box_qp(H, c, lower, upper, E=None, e=None, x0=None, max_iter=50, multipliers=False):
+    # Returns (x, converged, iterations), iterations counting the bound-constrained solves of every Newton step.
+    # multipliers=True meets the equality rows by the method of multipliers only, without trying the Newton ascent.
+    # x0 only seeds the bounded sets (its variables sitting on a bound start fixed). converged is False when the sets
+    # cycle, the equality rows cannot be met inside the bounds or max_iter is reached.
+    # A singular H (sample covariance of more assets than observations) is handled by a ridge continuation: H + rho I is
+    # solved for rho at 1% then 0.1% of the largest diagonal (where the active sets settle quickly), each solve warm-
+    # started from the last and followed by an exact solve from its sets, which succeeds once they are those of a
+    # solution with a nonsingular free block. Where none is (the solutions are not unique, e.g. portfolios of zero
+    # variance), the primal active set method finishes from the last ridge solution, within 2 n + max_iter iterations
+    # (about n at most on the solvable problems) so that an unsolvable one fails fast.
+    H = np.asarray(H, dtype=float)
+    c = np.asarray(c, dtype=float)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    n = len(c)
+    E = np.zeros((0, n)) if E is None else np.atleast_2d(np.asarray(E, dtype=float))
+    e = np.zeros(0) if e is None else np.atleast_1d(np.asarray(e, dtype=float))
+
+    # Set changes and residuals below the rounding of the solves are ignored
+    tol_x = 1e-12 * max(1.0, np.abs(lower).max(), np.abs(upper).max())
+    tol_g = 1e-12 * (np.abs(H).max() + np.abs(c).max())
+    tol_e = 1e-12 * max(1.0, np.abs(e).max() if len(e) else 0) * max(1.0, np.abs(E).max() if len(E) else 0)
+    fixed = upper - lower <= tol_x # Variables with lower == upper never become free
+    at_lower, at_upper = fixed.copy(), np.zeros(n, dtype=bool)
+    if x0 is not None:
+        x0 = np.asarray(x0, dtype=float)
+        at_lower |= x0 <= lower + tol_x
+        at_upper = ~at_lower & (x0 >= upper - tol_x)
+
+    try:
+        return _equality_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter, multipliers)
+    except np.linalg.LinAlgError:
+        pass
+
+    scale = np.abs(np.diag(H)).max()
+    x = np.clip(np.zeros(n) if x0 is None else x0, lower, upper)
+    total, feasible = 0, False
+    for rho in scale * np.array([1e-2, 1e-3]):
+        at_lower, at_upper = fixed | (x <= lower + tol_x), ~fixed & (x >= upper - tol_x)
+        try:
+            ridge, converged, iterations = _equality_qp(H + rho * np.eye(n), c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, max_iter, multipliers)
+        except np.linalg.LinAlgError:
+            break
+        total += iterations
+        if not converged:
+            break
+        x, feasible = ridge, True
+        at_lower, at_upper = fixed | (x <= lower + tol_x), ~fixed & (x >= upper - tol_x)
+        try:
+            exact, converged, iterations = _equality_qp(H, c, lower, upper, E, e, at_lower, at_upper, fixed, tol_x, tol_g, tol_e, 3, multipliers)
+            total += iterations
+            if converged:
+                return exact, True, total
+        except np.linalg.LinAlgError:
+            pass
+    if not feasible:
+        return x, False, total
+    x, converged, iterations = _primal_qp(H, c, lower, upper, E, e, x, fixed, tol_x, tol_g, 2 * n + max_iter)
+    return x, converged, total + iterations
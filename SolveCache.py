@@ -0,0 +1,146 @@
+### Memoization of the optimizer solutions (PortfolioOptimization.optimize_portfolios and its wrappers)
+### A solution is keyed on a hash of everything that defines the problem: expected returns, covariance bytes,
+### optimization, target, tau, risk-free return, bounds and solver. The most recently used solutions stay in memory up to
+### max_size, and with a path every solution is also written to disk so later runs (e.g. intraday reruns) find it, the
+### most recently used max_disk files kept. Only converged solves are cached: a failed one is solved again next time.
+### A problem that is not cached starts from the nearest cached solution of the same optimization and size instead of
+### the initial weights, which cuts the iterations when the inputs only moved slightly.
+
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from Covariance import FactorCovariance
+
+
+def array_digest(*arrays):
+    # Hash of the shapes and bytes of the arrays
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array, dtype=float)
+        digest.update(str(array.shape).encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def covariance_digest(covariance):
+    # Computed once per batch, hashing a large dense matrix costs about as much as one product with it
+    if isinstance(covariance, FactorCovariance):
+        return array_digest(covariance.loadings, covariance.factor_covariance, covariance.specific_variance)
+    return array_digest(np.asarray(covariance, dtype=float))
+
+
+class SolveCache:
+    def __init__(self, max_size=1024, path=None, max_disk=None):
+        # max_disk: most solution files kept in path (default max_size), the least recently used are deleted
+        self.max_size = max_size
+        self.path = path
+        self.max_disk = max_size if max_disk is None else max_disk
+        self.entries = OrderedDict() # key: (weights, success, iterations, optimization, signature), oldest first
+        self.files = OrderedDict() # keys of the files in path, least recently used first (by modification time)
+        self.file_time = 0 # Last modification time given to a file, the file times strictly increase with use
+        self.hits = self.misses = self.warm_starts = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            files = [(entry.stat().st_mtime_ns, entry.name[:-len('.npz')]) for entry in os.scandir(path)
+                     if entry.name.endswith('.npz') and not entry.name.endswith('.tmp.npz')]
+            for modified, key in sorted(files):
+                self.files[key] = None
+                self.file_time = modified
+            self._trim_files()
+
+    @staticmethod
+    def key(covariance_hash, expected_returns, optimization, target, tau, riskfree_return, bounds, solver='qp', limits=None, holdings=None):
+        # limits: exposure limits of the problem (NaN where not given), holdings only count with a turnover limit.
+        # Problems without limits keep the keys they had before limits existed.
+        parameters = np.array([target, tau, riskfree_return], dtype=float)
+        arrays = [expected_returns, parameters, bounds]
+        if limits is not None and not np.isnan(limits).all():
+            arrays.append(limits)
+            if not np.isnan(limits[-1]):
+                arrays.append(holdings)
+        return f'{optimization}-{solver}-' + array_digest(*arrays) + covariance_hash
+
+    @staticmethod
+    def signature(expected_returns, target, tau, riskfree_return, bounds):
+        # Point compared by nearest, the unused parameters (NaN) count as 0
+        return np.nan_to_num(np.concatenate([expected_returns, [target, tau, riskfree_return], np.ravel(bounds)]))
+
+    def _file(self, key):
+        return os.path.join(self.path, key + '.npz')
+
+    def _remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def _touch_file(self, key):
+        # Marks the file as the most recently used, also for the next SolveCache on path: its modification time is set
+        # after every earlier one (the clock can give two uses in a row the same time)
+        self.files[key] = None
+        self.files.move_to_end(key)
+        self.file_time = max(time.time_ns(), self.file_time + 1)
+        try:
+            os.utime(self._file(key), ns=(self.file_time, self.file_time))
+        except OSError:
+            pass
+
+    def _trim_files(self):
+        while len(self.files) > self.max_disk:
+            key, _ = self.files.popitem(last=False)
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        # (weights, success, iterations) of the cached solution, or None. Files of failed solves (written before they
+        # stopped being cached) count as misses.
+        entry, on_disk = self.entries.get(key), key in self.files
+        if entry is None and self.path is not None and os.path.exists(self._file(key)):
+            with np.load(self._file(key)) as data:
+                entry = (data['weights'], bool(data['success']), int(data['iterations']), str(data['optimization']), data['signature'])
+            entry, on_disk = (entry, True) if entry[1] else (None, False)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, entry)
+        if on_disk:
+            self._touch_file(key)
+        return entry[:3]
+
+    def put(self, key, weights, success, iterations, optimization, signature):
+        # Failed solves are left out, so a transient failure is not replayed as a hit
+        if not success:
+            return
+        entry = (np.array(weights, dtype=float), bool(success), int(iterations), optimization, np.asarray(signature, dtype=float))
+        self._remember(key, entry)
+        if self.path is not None:
+            # Written under a temporary name and renamed, so a reader never sees a partial file
+            temporary = self._file(key) + '.tmp.npz'
+            np.savez(temporary, weights=entry[0], success=entry[1], iterations=entry[2], optimization=optimization, signature=entry[4])
+            os.replace(temporary, self._file(key))
+            self._touch_file(key)
+            self._trim_files()
+
+    def nearest(self, optimization, signature):
+        # Weights of the cached solution of the same optimization and size closest to signature, or None
+        candidates = [entry for entry in self.entries.values() if entry[3] == optimization and len(entry[4]) == len(signature)]
+        if not candidates:
+            return None
+        distances = [np.sum((entry[4] - signature) ** 2) for entry in candidates]
+        self.warm_starts += 1
+        return candidates[int(np.argmin(distances))][0]
+
+    def stats(self):
+        return {'Hits': self.hits, 'Misses': self.misses, 'Warm Starts': self.warm_starts, 'Size': len(self.entries), 'Files': len(self.files)}
+
+    def clear(self):
+        # Empties the memory (the files on disk stay) and resets the counters
+        self.entries.clear()
+        self.hits = self.misses = self.warm_starts = 0
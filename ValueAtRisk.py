@@ -1,46 +1,205 @@
-import yfinance as yf
+from bisect import bisect_left, bisect_right, insort
+
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
-
-
-portfolio =  {'XLF': 0.25,
-              'SPY': 0.25,
-              'XLE': 0.25,
-              'XLK': 0.25}
 
-portfolio = pd.DataFrame.from_dict(portfolio, orient='index', columns=['Weight'])
+from MonteCarlo import scenario_model, simulate_var_cvar
 
-start_date = '2018-01-01'
-end_date = '2023-09-23'
 
-prices = pd.DataFrame()
+def _normal_quantile(p):
+    from scipy.stats import norm # Only needed by the parametric figures, scipy.stats alone takes longer to import than the rest
+    return norm.ppf(p)
 
-for stock in list(portfolio.index):
-    prices[stock] = yf.download(stock).loc[start_date:end_date]['Adj Close']
 
-returns = prices.pct_change().dropna()
-pfolio_returns = (returns * np.array(portfolio['Weight'])).sum(axis=1)
-
-def calculate_var(returns_df,alpha=0.05,type='normal'):
+def calculate_var(returns_df,alpha=0.05,type='normal',**simulation):
+    # type 'montecarlo' simulates the returns, simulation holds its options (see _montecarlo_var_cvar). Its memory stays
+    # within tail_size returns (default 2 ** 22) plus the chunks in flight: a simulation whose tail (about
+    # alpha x n_scenarios x K returns) is larger draws its scenarios two or more times instead, for the same figures
     if type == 'normal':
         var_values = returns_df.quantile(alpha)
     elif type == 'parametric':
         mean_returns = returns_df.mean()
         std_dev_returns = returns_df.std()
-        z_score = norm.ppf(1 - alpha)
+        z_score = _normal_quantile(1 - alpha)
         var_values = mean_returns - z_score * std_dev_returns
+    elif type == 'montecarlo':
+        var_values = _montecarlo_var_cvar(returns_df, alpha, simulation)[0]
     else:
-        raise ValueError('type must be normal or parametric')
+        raise ValueError('type must be normal, parametric or montecarlo')
     
     return var_values
 
-def calculate_cvar(returns_df, alpha=0.05,type='normal'):
+def calculate_cvar(returns_df, alpha=0.05,type='normal',**simulation):
+    if type == 'montecarlo':
+        return _montecarlo_var_cvar(returns_df, alpha, simulation)[1]
     var_values = calculate_var(returns_df, alpha, type)
     cvar_values = returns_df[returns_df <= var_values].mean()
     return cvar_values
 
-print(calculate_var(pfolio_returns,type='normal'))
-print(calculate_cvar(pfolio_returns,type='normal'))
-print(calculate_var(pfolio_returns,type='parametric'))
-print(calculate_cvar(pfolio_returns,type='parametric'))
\ No newline at end of file
+def _montecarlo_var_cvar(returns_df, alpha, simulation):
+    # VaR and CVaR simulated from a normal or t model calibrated from returns_df. Options: distribution ('normal' or 't'),
+    # dof, covariance (model calibration, see MonteCarlo.scenario_model), weights (N or N x K portfolios of the columns,
+    # None for every column), n_scenarios, chunk_size, seed, workers, executor and tail_size (see
+    # MonteCarlo.simulate_var_cvar)
+    model_options = {key: simulation.pop(key) for key in ('distribution', 'dof', 'covariance') if key in simulation}
+    model = scenario_model(returns_df, **model_options)
+    weights = simulation.get('weights')
+    var_values, cvar_values = simulate_var_cvar(model, alphas=alpha, **simulation)
+
+    # Same shapes as the other types: a value per column (a scalar for a Series), or per portfolio with weights
+    if weights is None:
+        if isinstance(returns_df, pd.Series):
+            return var_values[0, 0], cvar_values[0, 0]
+        return pd.Series(var_values[0], index=returns_df.columns), pd.Series(cvar_values[0], index=returns_df.columns)
+    if np.ndim(weights) == 1:
+        return var_values[0, 0], cvar_values[0, 0]
+    if isinstance(weights, pd.DataFrame):
+        return pd.Series(var_values[0], index=weights.columns), pd.Series(cvar_values[0], index=weights.columns)
+    return var_values[0], cvar_values[0]
+
+def calculate_var_cvar_batch(scenarios, weights, alphas=(0.05,), type='normal', chunk_size=2 ** 22):
+    # VaR and CVaR of K portfolios at several alphas in one pass, same figures as calculate_var/calculate_cvar
+    # scenarios: T x N asset returns, weights: N x K (one column per portfolio)
+    # Returns two arrays (len(alphas) x K): VaR and CVaR
+    scenarios = np.asarray(scenarios, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if weights.ndim == 1:
+        weights = weights[:, None]
+    alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+    n_scenarios, n_portfolios = scenarios.shape[0], weights.shape[1]
+
+    var_values = np.empty((len(alphas), n_portfolios))
+    cvar_values = np.empty((len(alphas), n_portfolios))
+
+    if type == 'normal':
+        # Linear interpolation between the order statistics around (T - 1) * alpha, as pandas quantile does
+        positions = (n_scenarios - 1) * alphas
+        lower = np.floor(positions).astype(int)
+        upper = np.minimum(lower + 1, n_scenarios - 1)
+        fraction = (positions - lower)[:, None]
+        kth = np.unique(np.concatenate([lower, upper]))
+    elif type == 'parametric':
+        z_scores = _normal_quantile(1 - alphas)[:, None]
+    else:
+        raise ValueError('type must be normal or parametric')
+
+    # Portfolios are processed in column blocks so the T x K portfolio returns stay bounded in memory
+    block = max(1, chunk_size // n_scenarios)
+    for start in range(0, n_portfolios, block):
+        columns = slice(start, start + block)
+        pfolio_returns = scenarios @ weights[:, columns]
+
+        if type == 'normal':
+            # Partial sort: only the order statistics needed by the alphas end up in their sorted position
+            ordered = np.partition(pfolio_returns, kth, axis=0)
+            var_block = ordered[lower] + fraction * (ordered[upper] - ordered[lower])
+        else:
+            var_block = pfolio_returns.mean(axis=0) - z_scores * pfolio_returns.std(axis=0, ddof=1)
+
+        for i, var in enumerate(var_block):
+            in_tail = pfolio_returns <= var
+            cvar_values[i, columns] = np.where(in_tail, pfolio_returns, 0).sum(axis=0) / in_tail.sum(axis=0)
+        var_values[:, columns] = var_block
+
+    return var_values, cvar_values
+
+
+def stream_var_cvar(returns_iter, window, alpha=0.05, type='normal'):
+    # Rolling VaR and CVaR over the last `window` days, updated incrementally as every day of returns arrives.
+    # returns_iter yields one day at a time, either a scalar or an array with one return per portfolio,
+    # and this generator yields (var, cvar) for that day right away (NaN until the first full window).
+    # 'normal' keeps every portfolio's window as a sorted list (O(log W) search per update), 'parametric' keeps
+    # running moments. Both give the same figures as calculate_var/calculate_cvar on the window.
+    if type not in ('normal', 'parametric'):
+        raise ValueError('type must be normal or parametric')
+    position = (window - 1) * alpha
+    lower = int(np.floor(position))
+    upper = min(lower + 1, window - 1)
+    fraction = position - lower
+    z_score = _normal_quantile(1 - alpha) if type == 'parametric' else None
+
+    history = None
+    for day, row in enumerate(returns_iter):
+        scalar = np.ndim(row) == 0
+        row = np.atleast_1d(np.asarray(row, dtype=float))
+        if history is None:
+            n_portfolios = len(row)
+            history = np.empty((window, n_portfolios)) # Ring buffer with the raw window
+            sorted_windows = [[] for _ in range(n_portfolios)]
+            mean, m2 = np.zeros(n_portfolios), np.zeros(n_portfolios)
+
+        slot = day % window
+        if day >= window:
+            # Drop the day leaving the window and slide the mean and sum of squared deviations (Welford)
+            old = history[slot]
+            for sorted_window, value in zip(sorted_windows, old):
+                del sorted_window[bisect_left(sorted_window, value)]
+            new_mean = mean + (row - old) / window
+            m2 += (row - old) * (row - new_mean + old - mean)
+            mean = new_mean
+        else:
+            delta = row - mean
+            mean = mean + delta / (day + 1)
+            m2 += delta * (row - mean)
+        history[slot] = row
+        for sorted_window, value in zip(sorted_windows, row):
+            insort(sorted_window, value)
+
+        if day < window - 1:
+            var_values = cvar_values = np.full(n_portfolios, np.nan)
+        else:
+            if type == 'normal':
+                var_values = np.array([w[lower] + fraction * (w[upper] - w[lower]) for w in sorted_windows])
+            else:
+                var_values = mean - z_score * np.sqrt(np.maximum(m2, 0) / (window - 1))
+            # The tail is the head of the sorted window, only ~alpha * W values are summed
+            cvar_values = np.empty(n_portfolios)
+            for k, (sorted_window, var) in enumerate(zip(sorted_windows, var_values)):
+                tail = bisect_right(sorted_window, var)
+                cvar_values[k] = sum(sorted_window[:tail]) / tail if tail else np.nan
+
+        yield (var_values[0], cvar_values[0]) if scalar else (var_values, cvar_values)
+
+def rolling_var_cvar(returns_df, window, alpha=0.05, type='normal'):
+    # Rolling VaR and CVaR of every column (portfolio) of returns_df, returned as two frames aligned with returns_df
+    frame = returns_df.to_frame() if isinstance(returns_df, pd.Series) else returns_df
+    var_values = np.empty(frame.shape)
+    cvar_values = np.empty(frame.shape)
+    for day, (var, cvar) in enumerate(stream_var_cvar(frame.to_numpy(dtype=float), window, alpha, type)):
+        var_values[day], cvar_values[day] = var, cvar
+
+    var_df = pd.DataFrame(var_values, index=frame.index, columns=frame.columns)
+    cvar_df = pd.DataFrame(cvar_values, index=frame.index, columns=frame.columns)
+    if isinstance(returns_df, pd.Series):
+        return var_df.iloc[:, 0], cvar_df.iloc[:, 0]
+    return var_df, cvar_df
+
+
+def main():
+    from MarketData import load_prices
+
+    portfolio =  {'XLF': 0.25,
+                  'SPY': 0.25,
+                  'XLE': 0.25,
+                  'XLK': 0.25}
+
+    portfolio = pd.DataFrame.from_dict(portfolio, orient='index', columns=['Weight'])
+
+    start_date = '2018-01-01'
+    end_date = '2023-09-23'
+
+    prices = load_prices(list(portfolio.index), start_date, end_date)
+
+    returns = prices.pct_change().dropna()
+    pfolio_returns = (returns * np.array(portfolio['Weight'])).sum(axis=1)
+
+    print(calculate_var(pfolio_returns,type='normal'))
+    print(calculate_cvar(pfolio_returns,type='normal'))
+    print(calculate_var(pfolio_returns,type='parametric'))
+    print(calculate_cvar(pfolio_returns,type='parametric'))
+    print(calculate_var(returns,type='montecarlo',weights=portfolio['Weight'].values,distribution='t',seed=0))
+    print(calculate_cvar(returns,type='montecarlo',weights=portfolio['Weight'].values,distribution='t',seed=0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,2 @@
+### Benchmarks for the portfolio tools. Every benchmark runs offline on synthetic data, run them from the repository root with:
+### python -m benchmarks.<name>
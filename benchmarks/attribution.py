@@ -0,0 +1,24 @@
+### portfolio_attribution runtime on synthetic books as the number of securities and the history grow
+
+import time
+import warnings
+
+from PortfolioAttribution import portfolio_attribution
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+problem_sizes = [(50, 3, 500), (200, 5, 500), (500, 5, 750), (1000, 10, 750)] # (securities, books, days)
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    print(f"{'securities':>10} {'books':>5} {'days':>5} {'columns':>7} {'time (s)':>9}")
+    for n_securities, n_books, n_days in problem_sizes:
+        orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities, n_books, n_days, orders_per_day=n_securities // 2)
+        start = time.perf_counter()
+        attribution = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+        elapsed = time.perf_counter() - start
+        print(f'{n_securities:>10} {n_books:>5} {n_days:>5} {len(attribution):>7} {elapsed:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
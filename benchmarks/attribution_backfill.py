@@ -0,0 +1,34 @@
+### Backfilling daily attribution reports: attribution_range over the whole range against one portfolio_attribution
+### call per date
+
+import time
+import warnings
+
+import pandas as pd
+
+from PortfolioAttribution import attribution_range, portfolio_attribution
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+problem_sizes = [(50, 3, 500, 60), (200, 5, 500, 60), (500, 5, 750, 20)] # (securities, books, days, backfilled dates)
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    print(f"{'securities':>10} {'days':>5} {'dates':>5} {'repeated (s)':>12} {'range (s)':>9} {'speedup':>8}")
+    for n_securities, n_books, n_days, n_dates in problem_sizes:
+        orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities, n_books, n_days, orders_per_day=n_securities // 2)
+        dates = pd.to_datetime(nav_data['Data']).iloc[-n_dates:]
+
+        start = time.perf_counter()
+        for date in dates:
+            portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data, end_date=date.strftime('%Y-%m-%d'))
+        repeated_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        attribution_range(orders, nav_data, history, holidays, dates.iloc[0], dates.iloc[-1])
+        range_time = time.perf_counter() - start
+        print(f'{n_securities:>10} {n_days:>5} {n_dates:>5} {repeated_time:>12.2f} {range_time:>9.2f} {repeated_time / range_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
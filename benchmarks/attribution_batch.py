@@ -0,0 +1,27 @@
+### batch_attribution over many synthetic funds sharing the same history and holidays, serial against a process pool
+
+import os
+import time
+import warnings
+
+from PortfolioAttribution import batch_attribution
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+n_funds, n_securities, n_books, n_days = 8, 200, 5, 500
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    # Every fund trades a different subset of the same synthetic blotter, over the same history and holidays
+    orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities, n_books, n_days, orders_per_day=n_securities // 2)
+    funds = {f'Fund {i}': {'Orders': orders.sample(frac=0.8, random_state=i).sort_index(), 'NAV': nav_data} for i in range(n_funds)}
+
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        fund_times = [elapsed for _, _, elapsed in batch_attribution(funds, history, holidays, workers=workers)]
+        total = time.perf_counter() - start
+        print(f'workers={workers:<3} total {total:6.2f} s   per fund {min(fund_times):.2f}-{max(fund_times):.2f} s')
+
+
+if __name__ == '__main__':
+    main()
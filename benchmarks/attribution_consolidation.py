@@ -0,0 +1,61 @@
+### Runtime and peak memory of the attribution consolidation stage at large security counts: the former stack/pivot
+### consolidation against the direct period sums over the wide gains matrix used by portfolio_attribution
+
+import time
+import tracemalloc
+import warnings
+
+import pandas as pd
+
+from PortfolioAttribution import (_attribution_gains, _consolidate_attribution, _period_gains, get_first_business_day_in_month, get_first_day_of_year,
+                                  get_last_business_day_in_previous_month, get_last_business_day_of_previous_year)
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+problem_sizes = [(500, 5, 750), (1000, 10, 750), (2000, 10, 1000)] # (securities, books, days)
+
+
+def stacked_consolidation(gains_adjusted, nav, holidays, end_date):
+    # The previous implementation: long frame, six period columns filled with .loc slices, pivoted back with a sum
+    start_month = get_first_business_day_in_month(end_date, holidays)
+    end_month = get_last_business_day_in_previous_month(end_date, holidays)
+    start_year = get_first_day_of_year(end_date, nav.index, holidays)
+    end_year = get_last_business_day_of_previous_year(end_date, nav.index, holidays)
+    base_nav = {'Day': nav['NAV'].iloc[-2], 'Month': nav.loc[end_month, 'NAV'], 'Year': nav.loc[end_year, 'NAV']}
+
+    stacked = gains_adjusted.stack(level=0).stack().reset_index().rename(columns={'level_0': 'DATE', 0: 'GAIN'}).set_index('DATE')
+    for period, start in [('Day', end_date), ('Month', start_month), ('Year', start_year)]:
+        stacked.loc[start:, f'Contribution {period}'] = stacked.loc[start:, 'GAIN'] / base_nav[period]
+        stacked.loc[start:, f'Gain {period}'] = stacked.loc[start:, 'GAIN']
+    stacked = stacked.fillna(0)
+    return pd.pivot_table(stacked, values=['Contribution Day', 'Gain Day', 'Contribution Month', 'Gain Month', 'Contribution Year', 'Gain Year'], columns=['BOOK', 'SECURITY'], aggfunc='sum').T
+
+
+def direct_consolidation(gains_adjusted, nav, holidays, end_date):
+    gains, base_nav = _period_gains(gains_adjusted, nav, holidays, end_date)
+    return _consolidate_attribution(gains, gains_adjusted.notna().any(), base_nav)
+
+
+def measure(function, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    print(f"{'securities':>10} {'days':>5} {'columns':>7} {'stacked (s)':>11} {'stacked (MB)':>12} {'direct (s)':>10} {'direct (MB)':>11}")
+    for n_securities, n_books, n_days in problem_sizes:
+        orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities, n_books, n_days, orders_per_day=n_securities // 2)
+        _, nav, _, _, end_date, _, _, gains_adjusted, _ = _attribution_gains(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+
+        stacked_time, stacked_memory = measure(stacked_consolidation, gains_adjusted, nav, holidays, end_date)
+        direct_time, direct_memory = measure(direct_consolidation, gains_adjusted, nav, holidays, end_date)
+        print(f'{n_securities:>10} {n_days:>5} {gains_adjusted.shape[1]:>7} {stacked_time:>11.2f} {stacked_memory:>12.1f} {direct_time:>10.2f} {direct_memory:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
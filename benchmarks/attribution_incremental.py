@@ -0,0 +1,60 @@
+### Daily attribution cost as the fund's history grows: full portfolio_attribution run against one update_attribution_state step
+### Then the check that daily updates over a range with a business day missing from the price history give the same
+### attribution as the full recompute of every day.
+
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from PortfolioAttribution import attribution_state, portfolio_attribution, state_attribution, update_attribution_state
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+history_lengths = [250, 500, 1000, 1500] # business days
+n_securities, n_books = 200, 5
+check_days, missing_day = 15, 4 # Updated days, and the one among them without a history row
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    print(f"{'days':>5} {'full (s)':>9} {'update (s)':>11} {'speedup':>8}")
+    for n_days in history_lengths:
+        orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities, n_books, n_days, orders_per_day=n_securities // 2)
+        dates = pd.to_datetime(nav_data['Data'])
+        order_dates = pd.to_datetime(orders['Data'])
+        last_date, day_before = dates.iloc[-1], dates.iloc[-2].strftime('%Y-%m-%d')
+
+        start = time.perf_counter()
+        portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+        full_time = time.perf_counter() - start
+
+        state = attribution_state(orders[order_dates < last_date], nav_data[dates < last_date], history, holidays, "Gross", nav_data, nav_data, end_date=day_before)
+        start = time.perf_counter()
+        state = update_attribution_state(state, orders[order_dates == last_date], nav_data[dates == last_date], history.loc[[last_date]])
+        state_attribution(state)
+        update_time = time.perf_counter() - start
+
+        print(f'{n_days:>5} {full_time:>9.3f} {update_time:>11.3f} {full_time / update_time:>7.1f}x')
+
+    orders, history, holidays, nav_data = synthetic_attribution_inputs(n_securities // 4, n_books, history_lengths[0], orders_per_day=n_securities // 8)
+    dates = pd.to_datetime(nav_data['Data'])
+    order_dates = pd.to_datetime(orders['Data'])
+    days = dates.iloc[-check_days:]
+    history = history.drop(days.iloc[missing_day])
+    before = dates[dates < days.iloc[0]]
+    state = attribution_state(orders[order_dates < days.iloc[0]], nav_data[dates < days.iloc[0]], history, holidays, "Gross", nav_data, nav_data,
+                              end_date=before.iloc[-1].strftime('%Y-%m-%d'))
+    difference = 0.0
+    for day in days:
+        state = update_attribution_state(state, orders[order_dates == day], nav_data[dates == day], history.loc[history.index == day])
+        full = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data, end_date=day.strftime('%Y-%m-%d'))
+        updated = state_attribution(state).reindex(full.index).to_numpy()
+        gap = np.where(np.isnan(updated) == np.isnan(full.to_numpy()), np.abs(updated - full.to_numpy()), np.inf) # NaN on one side only counts as inf
+        difference = max(difference, np.nanmax(gap))
+    print(f'\nupdates against full recomputes over {check_days} days, {days.iloc[missing_day]:%Y-%m-%d} missing from the history: '
+          f'largest difference {difference:.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+### Reading a large order blotter: whole file plus create_dataframe_from_mapping against the columnar loader, which
+### reads only the mapped columns and maps them while reading (Parquet/Arrow only when pyarrow is installed)
+
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from AttributionData import load_orders, read_table
+from PortfolioAttribution import create_dataframe_from_mapping, orders_mapping, orders_value_mapping, replace_values_in_columns
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+n_rows, n_extra_columns = 200_000, 20 # Blotters usually carry many columns the attribution does not use
+
+
+def main():
+    orders = synthetic_attribution_inputs(500, 10, 1000, orders_per_day=n_rows // 1000)[0]
+    rng = np.random.default_rng(0)
+    for i in range(n_extra_columns):
+        orders[f'Extra {i}'] = rng.normal(size=len(orders))
+
+    try:
+        import pyarrow # noqa: F401
+        formats = ['csv', 'parquet', 'feather']
+    except ImportError:
+        formats = ['csv']
+
+    print(f'{len(orders)} orders, {orders.shape[1]} columns')
+    print(f"{'format':>8} {'full read + mapping (s)':>24} {'load_orders (s)':>16}")
+    with tempfile.TemporaryDirectory() as directory:
+        for file_format in formats:
+            path = os.path.join(directory, f'orders.{file_format}')
+            getattr(orders, 'to_' + file_format)(path, **({} if file_format == 'feather' else {'index': False}))
+
+            start = time.perf_counter()
+            replace_values_in_columns(create_dataframe_from_mapping(read_table(path), orders_mapping), orders_value_mapping)
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            load_orders(path)
+            loader_time = time.perf_counter() - start
+            print(f'{file_format:>8} {full_time:>24.2f} {loader_time:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+### Date logic of a multi-year daily backfill: period boundaries and business-day ranges for every date, with the
+### former day-by-day walks and pd.bdate_range rebuilds against the precomputed BusinessCalendar
+
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from BusinessCalendar import BusinessCalendar
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+
+def walk_boundaries(date, holidays):
+    # The previous helpers: first business day of the month and last one of the previous month, one day at a time
+    start = datetime(date.year, date.month, 1)
+    while start.weekday() >= 5 or start in holidays:
+        start += timedelta(days=1)
+    end = datetime(date.year, date.month, 1) - timedelta(days=1)
+    while end.weekday() >= 5 or end in holidays:
+        end -= timedelta(days=1)
+    return start, end
+
+
+def main():
+    _, _, holidays, nav_data = synthetic_attribution_inputs(10, 1, 750, orders_per_day=1)
+    dates = pd.to_datetime(nav_data['Data'])
+    holiday_list = holidays.to_list()
+
+    start = time.perf_counter()
+    for date in dates:
+        walk_boundaries(date, holidays)
+        pd.bdate_range(dates.iloc[0], date, freq='C', holidays=holiday_list)
+    walk_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    calendar = BusinessCalendar(holidays)
+    for date in dates:
+        calendar.month_start(date), calendar.previous_month_end(date)
+        calendar.range(dates.iloc[0], date)
+    calendar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    calendar.month_start(dates), calendar.previous_month_end(dates)
+    vectorized_time = time.perf_counter() - start
+
+    print(f'{len(dates)} dates: walks + bdate_range {walk_time:.2f} s, calendar {calendar_time:.3f} s, calendar on the whole array {vectorized_time:.4f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+### Covariance estimators on large synthetic universes with short histories: estimation time, conditioning,
+### out-of-sample risk of the minimum variance portfolio, and the cost of one risk evaluation (Sigma @ w) dense vs factor
+
+import time
+
+import numpy as np
+
+from Covariance import estimate_covariance
+from benchmarks.synthetic import synthetic_returns
+
+universes = [(500, 250), (1000, 500), (2000, 500)] # (assets, days)
+evaluations = 200
+
+
+def min_variance_weights(covariance):
+    weights = np.linalg.solve(covariance, np.ones(len(covariance)))
+    return weights / weights.sum()
+
+
+def main():
+    print(f"{'assets':>6} {'days':>5} {'estimator':>11} {'fit (s)':>8} {'condition':>10} {'oos vol':>8} {'Sigma@w (ms)':>12}")
+    for n_assets, n_days in universes:
+        returns = synthetic_returns(n_assets, 2 * n_days)
+        in_sample, out_of_sample = returns.iloc[:n_days], returns.iloc[n_days:]
+        test_covariance = out_of_sample.cov().to_numpy()
+        weights = np.full(n_assets, 1 / n_assets)
+
+        for method, options in [('sample', {}), ('ledoit-wolf', {}), ('ewma', {'decay': 0.99}), ('factor', {'n_factors': 5})]:
+            start = time.perf_counter()
+            covariance = estimate_covariance(in_sample, method, **options)
+            fit_time = time.perf_counter() - start
+
+            dense = np.asarray(covariance)
+            product = covariance.dot if method == 'factor' else dense.dot
+            start = time.perf_counter()
+            for _ in range(evaluations):
+                product(weights)
+            product_time = (time.perf_counter() - start) / evaluations * 1e3
+
+            # Realized (out-of-sample) daily volatility of the minimum variance portfolio built on the estimate
+            w = min_variance_weights(dense)
+            oos_vol = np.sqrt(w @ test_covariance @ w)
+            print(f'{n_assets:>6} {n_days:>5} {method:>11} {fit_time:>8.3f} {np.linalg.cond(dense):>10.2e} {oos_vol:>8.5f} {product_time:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+### Minimum CVaR frontier points: SLSQP on the historical CVaR against the Rockafellar-Uryasev linear program (HiGHS),
+### for accuracy (CVaR reached, target return error) and runtime as scenarios and assets grow
+
+import time
+
+import numpy as np
+
+from Frontier import compute_frontier, return_range
+from benchmarks.synthetic import synthetic_returns
+
+problem_sizes = [(5, 500), (5, 2500), (20, 1250), (20, 5000), (50, 2500), (50, 5000)] # (assets, scenarios)
+frontier_points = 5
+alpha = 0.05
+
+
+def main():
+    print(f"{'assets':>6} {'scenarios':>9} {'SLSQP s/pt':>11} {'LP s/pt':>8} {'SLSQP CVaR':>11} {'LP CVaR':>9} {'SLSQP target err':>17}")
+    for n_assets, n_scenarios in problem_sizes:
+        returns = synthetic_returns(n_assets, n_scenarios, seed=4)
+        expected_returns = returns.mean().values
+        bounds = [(-0.75, 1)] * n_assets
+        # Interior points of the frontier, the end points are single feasible portfolios
+        target_returns = np.linspace(*return_range(expected_returns, bounds), frontier_points + 2)[1:-1]
+
+        results = {}
+        for method in ['slsqp', 'lp']:
+            start = time.perf_counter()
+            frontier = compute_frontier(expected_returns, target_returns, bounds, scenarios=returns.values, risk='cvar', alpha=alpha, method=method)
+            results[method] = ((time.perf_counter() - start) / frontier_points, frontier)
+
+        slsqp_time, slsqp = results['slsqp']
+        lp_time, lp = results['lp']
+        target_error = np.abs(slsqp['Expected Return'] - target_returns).max()
+        print(f"{n_assets:>6} {n_scenarios:>9} {slsqp_time:>11.3f} {lp_time:>8.3f} {slsqp['Risk'].mean():>11.5f} {lp['Risk'].mean():>9.5f} {target_error:>17.2e}")
+
+
+if __name__ == '__main__':
+    main()
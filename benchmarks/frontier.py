@@ -0,0 +1,52 @@
+### Efficient frontier runtime: the former per-point PortfolioSimpleOptimization loop against the warm-started
+### SLSQP sweep and the critical line path in Frontier.py
+
+import time
+
+import numpy as np
+
+import Frontier
+from PortfolioOptimization import PortfolioSimpleOptimization
+from benchmarks.synthetic import synthetic_returns
+
+asset_counts = [4, 20, 50, 100]
+frontier_points = 10 ** 4
+sampled_points = 50 # The per-point loops are timed on a sample and extrapolated to the full frontier
+
+
+def per_point_loop(expected_returns, covariance, initial_weights, target_returns):
+    returns_dict = dict(enumerate(expected_returns))
+    weights_dict = dict(enumerate(initial_weights))
+    for target in target_returns:
+        PortfolioSimpleOptimization(returns_dict, weights_dict, covariance, 'MinRisk', target, solver='slsqp')
+
+
+def main():
+    print(f"{'assets':>6} {'per-point loop (s)':>19} {'warm SLSQP (s)':>15} {'critical line (s)':>18} {'max vol gap':>12}")
+    for n_assets in asset_counts:
+        returns = synthetic_returns(n_assets, seed=n_assets)
+        expected_returns, covariance = returns.mean().values, returns.cov().values
+        initial_weights = np.full(n_assets, 1 / n_assets)
+        bounds = [(-1, 1)] * n_assets
+        target_returns = np.linspace(*Frontier.return_range(expected_returns, bounds), frontier_points)
+        sample = target_returns[::frontier_points // sampled_points]
+        scale = frontier_points / len(sample)
+
+        start = time.perf_counter()
+        per_point_loop(expected_returns, covariance, initial_weights, sample)
+        loop_time = (time.perf_counter() - start) * scale
+
+        start = time.perf_counter()
+        warm = Frontier.efficient_frontier(expected_returns, covariance, sample, bounds, initial_weights, method='slsqp')
+        warm_time = (time.perf_counter() - start) * scale
+
+        start = time.perf_counter()
+        exact = Frontier.efficient_frontier(expected_returns, covariance, target_returns, bounds)
+        exact_time = time.perf_counter() - start
+
+        gap = np.abs(exact['Expected Volatility'][::frontier_points // sampled_points] - warm['Expected Volatility']).max()
+        print(f'{n_assets:>6} {loop_time:>19.2f} {warm_time:>15.2f} {exact_time:>18.3f} {gap:>12.2e}')
+
+
+if __name__ == '__main__':
+    main()
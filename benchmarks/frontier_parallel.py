@@ -0,0 +1,41 @@
+### Scaling of Frontier.compute_frontier with the number of pool workers, every run is checked against the serial result
+
+import os
+import time
+
+import numpy as np
+
+from Frontier import compute_frontier, return_range
+from benchmarks.synthetic import synthetic_returns
+
+worker_counts = [1, 2, 4, 8]
+problems = {
+    # risk: (assets, days, frontier points)
+    'variance': (100, 1500, 400),
+    'cvar': (20, 1500, 200),
+}
+
+
+def main():
+    print(f'{os.cpu_count()} CPUs available')
+    print(f"{'risk':>8} {'workers':>7} {'time (s)':>9} {'speedup':>8} {'matches serial':>15}")
+    for risk, (n_assets, n_days, n_points) in problems.items():
+        returns = synthetic_returns(n_assets, n_days, seed=3)
+        expected_returns = returns.mean().values
+        bounds = [(-0.5, 1)] * n_assets
+        target_returns = np.linspace(*return_range(expected_returns, bounds), n_points)
+        inputs = {'covariance': returns.cov().values} if risk == 'variance' else {'scenarios': returns.values}
+
+        serial_time, serial = None, None
+        for workers in worker_counts:
+            start = time.perf_counter()
+            frontier = compute_frontier(expected_returns, target_returns, bounds, risk=risk, workers=workers, chunk_size=25, **inputs)
+            elapsed = time.perf_counter() - start
+            if serial is None:
+                serial_time, serial = elapsed, frontier
+            matches = np.array_equal(frontier['Weights'], serial['Weights'])
+            print(f'{risk:>8} {workers:>7} {elapsed:>9.2f} {serial_time / elapsed:>7.2f}x {str(matches):>15}')
+
+
+if __name__ == '__main__':
+    main()
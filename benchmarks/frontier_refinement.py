@@ -0,0 +1,66 @@
+### Adaptive frontier refinement against evenly spaced targets: points solved, time and the largest error of the
+### piecewise linear curve through the points against a dense reference frontier (as a fraction of the risk span),
+### for the variance frontier (reference: critical line) and the CVaR frontier (reference: dense LP sweep).
+### The historical CVaR of the LP weights is jagged at about 1% of its span (many scenarios tie at the VaR of an LP
+### optimum and np.quantile splits them unevenly), so tighter CVaR tolerances only chase that jitter.
+### Then the FrontierStore footprint of a dense frontier of a large universe in float64 and float32.
+
+import tempfile
+import time
+
+import numpy as np
+
+from Frontier import compute_frontier, efficient_frontier, return_range
+from FrontierStore import FrontierStore, refine_frontier
+from benchmarks.synthetic import synthetic_returns
+
+tolerances = {'variance': [1e-2, 1e-3, 1e-4], 'cvar': [3e-2, 1e-2]}
+reference_points = {'variance': 5000, 'cvar': 1000}
+store_points, store_assets = 10 ** 4, 1000
+
+
+def curve_error(frontier, reference):
+    risk = np.interp(reference['Expected Return'], frontier['Expected Return'], frontier['Risk'])
+    return np.abs(risk - reference['Risk']).max() / np.ptp(reference['Risk'])
+
+
+def main():
+    print(f"{'risk':>8} {'tolerance':>9} {'points':>6} {'refined (s)':>11} {'refined error':>13} {'even (s)':>9} {'even error':>10}")
+    for risk, n_assets, n_days in [('variance', 50, 750), ('cvar', 20, 500)]:
+        returns = synthetic_returns(n_assets, n_days, seed=11)
+        expected_returns, bounds = returns.mean().to_numpy(), [(0, 1)] * n_assets
+        data = {'covariance': returns.cov().to_numpy()} if risk == 'variance' else {'scenarios': returns.to_numpy()}
+        min_return, max_return = return_range(expected_returns, bounds)
+        dense_targets = np.linspace(min_return, max_return, reference_points[risk])
+        if risk == 'variance':
+            reference = efficient_frontier(expected_returns, data['covariance'], dense_targets, bounds)
+            reference['Risk'] = reference['Expected Volatility']
+        else:
+            reference = compute_frontier(expected_returns, dense_targets, bounds, risk='cvar', **data)
+
+        for tolerance in tolerances[risk]:
+            start = time.perf_counter()
+            store = refine_frontier(expected_returns, bounds, risk=risk, max_points=2000, tolerance=tolerance, **data)
+            refined_time = time.perf_counter() - start
+            start = time.perf_counter()
+            even = compute_frontier(expected_returns, np.linspace(min_return, max_return, len(store)), bounds, risk=risk, **data)
+            even_time = time.perf_counter() - start
+            print(f'{risk:>8} {tolerance:>9.0e} {len(store):>6} {refined_time:>11.2f} {curve_error(store.frontier(), reference):>13.1e} '
+                  f'{even_time:>9.2f} {curve_error(even, reference):>10.1e}')
+
+    print(f'\nFrontierStore of {store_points} points x {store_assets} assets')
+    with tempfile.TemporaryDirectory() as path:
+        for dtype, store_path in [(np.float64, None), (np.float32, None), (np.float32, path)]:
+            start = time.perf_counter()
+            store = FrontierStore(store_points, store_assets, dtype, store_path)
+            weights = np.random.default_rng(0).dirichlet(np.ones(store_assets), 1000)
+            for _ in range(store_points // 1000):
+                store.append({'Target Return': np.zeros(1000), 'Expected Return': np.zeros(1000), 'Risk': np.zeros(1000), 'Weights': weights})
+            seconds = time.perf_counter() - start
+            where = 'memory-mapped' if store_path else 'in memory'
+            print(f'{np.dtype(dtype).name:>8} {where:>13} {store.nbytes / 2 ** 20:>8.1f} MB {seconds:>6.2f} s')
+            del store
+
+
+if __name__ == '__main__':
+    main()
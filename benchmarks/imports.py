@@ -0,0 +1,48 @@
+### Cold import of every module in a fresh interpreter: time, peak memory above a bare interpreter, the heavy
+### dependencies it pulled in, and whether the import itself failed (a script doing I/O at import fails offline)
+
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+entry_points = ['BusinessCalendar', 'Covariance', 'QuadraticProgramming', 'MarketData', 'MonteCarlo', 'ValueAtRisk',
+                'SolveCache', 'Frontier', 'PortfolioOptimization', 'PortfolioAttribution', 'AttributionData',
+                'EfficientFrontier', 'MeanCVaR_Optimization']
+heavy_modules = ['pandas', 'scipy.optimize', 'scipy.stats', 'matplotlib', 'yfinance', 'pyarrow']
+repeat = 5
+
+child = '''
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+try:
+    importlib.import_module(sys.argv[1])
+    error = None
+except Exception as exception:
+    error = type(exception).__name__
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'error': error,
+                  'loaded': [name for name in sys.argv[2:] if name in sys.modules]}))
+'''
+
+
+def cold_import(module):
+    # One import in a new interpreter, with the network shut off so nothing can be downloaded
+    run = subprocess.run([sys.executable, '-c', child, module, *heavy_modules], capture_output=True, text=True,
+                         env={'PATH': '', 'PYTHONPATH': '.', 'http_proxy': 'http://0.0.0.0:1', 'https_proxy': 'http://0.0.0.0:1'})
+    return json.loads(run.stdout.strip().splitlines()[-1])
+
+
+def main():
+    bare_kb = min(cold_import('sys')['peak_kb'] for _ in range(repeat))
+    print(f"{'module':>22} {'import (s)':>11} {'memory (MB)':>12} {'error':>18}  heavy dependencies loaded")
+    for module in entry_points:
+        runs = [cold_import(module) for _ in range(repeat)]
+        seconds = np.median([run['seconds'] for run in runs])
+        memory = (np.median([run['peak_kb'] for run in runs]) - bare_kb) / 1024
+        print(f"{module:>22} {seconds:>11.3f} {memory:>12.1f} {runs[0]['error'] or '':>18}  {', '.join(runs[0]['loaded'])}")
+
+
+if __name__ == '__main__':
+    main()
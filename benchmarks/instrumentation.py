@@ -0,0 +1,66 @@
+### Cost of the Instrumentation hooks: an attribution run (with rendering) and an optimizer batch with instrumentation
+### off, recording timings and recording timings with peak memory, the cost of a disabled stage() and record() call,
+### and the stage summary of the recorded attribution run
+
+import time
+import warnings
+
+import numpy as np
+
+import Instrumentation
+from PortfolioAttribution import portfolio_attribution, render_attribution
+from PortfolioOptimization import optimize_portfolios
+from benchmarks.optimization_batch import problem_table
+from benchmarks.synthetic import synthetic_attribution_inputs, synthetic_problem
+
+repeats = 5
+hook_calls = 10 ** 6
+
+
+def best_time(function, memory=None):
+    # Best of repeats, with memory=None instrumentation stays off
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        if memory is None:
+            function()
+        else:
+            with Instrumentation.recording(memory):
+                function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    warnings.simplefilter('ignore', FutureWarning)
+    orders, history, holidays, nav_data = synthetic_attribution_inputs(200, 5, 500, orders_per_day=100)
+    attribution = lambda: render_attribution(portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data))
+
+    returns, initial_weights, covariance_df = synthetic_problem(100)
+    expected_returns = np.array(list(returns.values()))
+    problems = problem_table(expected_returns)
+    optimization = lambda: optimize_portfolios(expected_returns, covariance_df, problems, np.array(list(initial_weights.values())))
+
+    print(f"{'run':>28} {'off (s)':>8} {'timings (s)':>12} {'overhead':>9} {'+ memory (s)':>13}")
+    for name, function in [('attribution 200 securities', attribution), (f'optimizer {len(problems)} problems', optimization)]:
+        off, timings, memory = best_time(function), best_time(function, False), best_time(function, True)
+        print(f'{name:>28} {off:>8.3f} {timings:>12.3f} {timings / off - 1:>9.1%} {memory:>13.3f}')
+
+    start = time.perf_counter()
+    for _ in range(hook_calls):
+        with Instrumentation.stage('off'):
+            pass
+    stage_ns = (time.perf_counter() - start) / hook_calls * 1e9
+    start = time.perf_counter()
+    for _ in range(hook_calls):
+        Instrumentation.record('solve', iterations=1)
+    record_ns = (time.perf_counter() - start) / hook_calls * 1e9
+    print(f'disabled stage(): {stage_ns:.0f} ns, disabled record(): {record_ns:.0f} ns per call')
+
+    with Instrumentation.recording(memory=True) as recorder:
+        attribution()
+    print(recorder.summary().to_string(float_format='{:.3f}'.format))
+
+
+if __name__ == '__main__':
+    main()
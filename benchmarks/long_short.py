@@ -0,0 +1,63 @@
+### Long-short portfolios with exposure limits: QP against SLSQP on the split long/short variables (see LongShort) for
+### a 130/30 portfolio (gross exposure 1.6, fully invested), a market neutral one (net exposure 0, gross 2) and a
+### turnover limit from the equal weight holdings, all within +- 5% of equal weights. The Sharpe ratio is that of the
+### solution, the violation the largest excess over a limit (SLSQP only meets its constraints to its tolerance).
+### SLSQP is left out of the largest universe, where one solve takes minutes.
+
+import time
+
+import numpy as np
+
+from PortfolioOptimization import optimize_portfolios
+from benchmarks.synthetic import synthetic_problem
+
+asset_counts = [50, 300, 1000]
+slsqp_assets = 300
+weight_change = 0.05
+limit_sets = {
+    '130/30': {'Gross Exposure': 1.6},
+    'market neutral': {'Gross Exposure': 2.0, 'Min Net Exposure': 0.0, 'Max Net Exposure': 0.0},
+    'turnover 0.2': {'Turnover': 0.2},
+}
+
+
+def violation(result, limits):
+    excess = [0.0]
+    if 'Gross Exposure' in limits:
+        excess.append(result['Gross Exposure'][0] - limits['Gross Exposure'])
+    if 'Turnover' in limits:
+        excess.append(result['Turnover'][0] - limits['Turnover'])
+    net_min, net_max = limits.get('Min Net Exposure', 1.0), limits.get('Max Net Exposure', 1.0)
+    excess += [net_min - result['Net Exposure'][0], result['Net Exposure'][0] - net_max]
+    return max(excess)
+
+
+def solve(expected_returns, covariance, problem, solver):
+    start = time.perf_counter()
+    result = optimize_portfolios(expected_returns, covariance, [problem], solver=solver)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'assets':>6} {'limits':>15} {'problem':>10} {'QP (s)':>8} {'SLSQP (s)':>10} {'QP Sharpe':>10} {'SLSQP Sharpe':>13} "
+          f"{'QP violation':>13} {'SLSQP violation':>16}")
+    for n_assets in asset_counts:
+        returns, _, covariance_df = synthetic_problem(n_assets, n_days=max(1500, 2 * n_assets))
+        expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+        x0 = np.full(n_assets, 1 / n_assets)
+        targets = {'MaxSharpe': np.nan, 'MaxReturn': np.sqrt(x0 @ covariance @ x0)}
+        for name, limits in limit_sets.items():
+            for optimization, target in targets.items():
+                problem = {'Optimization': optimization, 'Target': target, 'Weight Change': weight_change, **limits}
+                qp, qp_time = solve(expected_returns, covariance, problem, 'qp')
+                line = f'{n_assets:>6} {name:>15} {optimization:>10} {qp_time:>8.3f} '
+                if n_assets <= slsqp_assets:
+                    slsqp, slsqp_time = solve(expected_returns, covariance, problem, 'slsqp')
+                    print(line + f"{slsqp_time:>10.3f} {qp['Sharpe Ratio'][0]:>10.4f} {slsqp['Sharpe Ratio'][0]:>13.4f} "
+                          f"{violation(qp, limits):>13.1e} {violation(slsqp, limits):>16.1e}")
+                else:
+                    print(line + f"{'':>10} {qp['Sharpe Ratio'][0]:>10.4f} {'':>13} {violation(qp, limits):>13.1e}")
+
+
+if __name__ == '__main__':
+    main()
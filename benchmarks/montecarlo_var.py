@@ -0,0 +1,57 @@
+### Monte Carlo VaR/CVaR of a portfolio of hundreds of assets with 10^6 scenarios: drawing every asset scenario at once
+### and taking the portfolio returns, against simulate_var_cvar (projected model, chunked, running tail), with peak memory.
+### The last row bounds the tail at 2^12 returns, so simulate_var_cvar draws the chunks again to select the VaR.
+
+import time
+import tracemalloc
+
+import numpy as np
+import scipy.stats # Imported up front, the bounded tail row would otherwise time (and trace) its import
+
+from MonteCarlo import scenario_model, simulate_var_cvar
+from ValueAtRisk import calculate_var_cvar_batch
+from benchmarks.synthetic import synthetic_returns
+
+n_assets = 500
+n_scenarios = 10 ** 6
+alphas = [0.01, 0.05]
+full_draw_scenarios = 10 ** 5 # The all-at-once draw is timed on this many scenarios and extrapolated
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    returns = synthetic_returns(n_assets, 1500, seed=7)
+    weights = np.random.default_rng(7).dirichlet(np.ones(n_assets))
+
+    print(f"{'model':>6} {'method':>22} {'time (s)':>9} {'peak (MB)':>10} {'VaR 1%':>9} {'CVaR 1%':>9} {'VaR 5%':>9} {'CVaR 5%':>9}")
+    for distribution in ['normal', 't']:
+        model = scenario_model(returns, distribution, dof=5 if distribution == 't' else None)
+
+        def full_draw():
+            scenarios = model.sample(full_draw_scenarios, 0)
+            return calculate_var_cvar_batch(scenarios, weights, alphas)
+        (var_values, cvar_values), seconds, peak = measure(full_draw)
+        scale = n_scenarios / full_draw_scenarios
+        print(f'{distribution:>6} {"all scenarios at once*":>22} {seconds * scale:>9.2f} {peak * scale:>10.0f} '
+              f'{var_values[0, 0]:>9.5f} {cvar_values[0, 0]:>9.5f} {var_values[1, 0]:>9.5f} {cvar_values[1, 0]:>9.5f}')
+
+        for workers, tail_size in [(1, 2 ** 22), (4, 2 ** 22), (1, 2 ** 12)]:
+            (var_values, cvar_values), seconds, peak = measure(lambda: simulate_var_cvar(model, weights, alphas, n_scenarios, seed=0, workers=workers,
+                                                                                         tail_size=tail_size))
+            method = f'chunked, {workers} workers' if tail_size == 2 ** 22 else 'chunked, bounded tail'
+            print(f'{distribution:>6} {method:>22} {seconds:>9.2f} {peak:>10.1f} '
+                  f'{var_values[0, 0]:>9.5f} {cvar_values[0, 0]:>9.5f} {var_values[1, 0]:>9.5f} {cvar_values[1, 0]:>9.5f}')
+    print(f'* measured on {full_draw_scenarios} scenarios and extrapolated to {n_scenarios}')
+
+
+if __name__ == '__main__':
+    main()
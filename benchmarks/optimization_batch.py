@@ -0,0 +1,65 @@
+### Parameter sweep over one universe: a PortfolioSimpleOptimization/SharpeOptimalPortfolio call per problem against one
+### optimize_portfolios call on the whole problem table (serial and on a process pool)
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from PortfolioOptimization import PortfolioSimpleOptimization, SharpeOptimalPortfolio, optimize_portfolios
+from benchmarks.synthetic import synthetic_problem
+
+asset_counts = [50, 150]
+problems_per_mode = 40
+workers = max(2, os.cpu_count() or 1)
+
+
+def problem_table(expected_returns):
+    # MinRisk targets across the return range, MaxReturn volatility targets and RiskAdjusted taus, each with two weight changes
+    weight_changes = [0.05, 0.1]
+    n = problems_per_mode // len(weight_changes)
+    rows = []
+    for change in weight_changes:
+        rows += [{'Optimization': 'MinRisk', 'Target': target, 'Weight Change': change}
+                 for target in np.linspace(expected_returns.min(), expected_returns.max(), n + 2)[1:-1]]
+        rows += [{'Optimization': 'MaxReturn', 'Target': target, 'Weight Change': change} for target in np.linspace(0.004, 0.012, n)]
+        rows += [{'Optimization': 'RiskAdjusted', 'Tau': tau, 'Riskfree Return': 0.0001, 'Weight Change': change} for tau in np.geomspace(1e-3, 1e-1, n)]
+    return pd.DataFrame(rows)
+
+
+def main():
+    print(f"{'assets':>6} {'problems':>8} {'per-call loop (s)':>18} {'batch (s)':>10} {f'batch {workers} workers (s)':>21} {'max weight diff':>16}")
+    for n_assets in asset_counts:
+        returns, initial_weights, covariance_df = synthetic_problem(n_assets)
+        expected_returns = np.array(list(returns.values()))
+        problems = problem_table(expected_returns)
+
+        start = time.perf_counter()
+        loop_weights = []
+        for problem in problems.to_dict('records'):
+            if problem['Optimization'] == 'RiskAdjusted':
+                result = SharpeOptimalPortfolio(returns, initial_weights, covariance_df, problem['Tau'], problem['Riskfree Return'],
+                                                'Risk-Adjusted Maximization', problem['Weight Change'])
+            else:
+                result = PortfolioSimpleOptimization(returns, initial_weights, covariance_df, problem['Optimization'],
+                                                     problem['Target'], problem['Weight Change'])
+            loop_weights.append(result['Optimal Weights'])
+        loop_time = time.perf_counter() - start
+
+        x0 = np.array(list(initial_weights.values()))
+        start = time.perf_counter()
+        batch = optimize_portfolios(expected_returns, covariance_df, problems, x0)
+        batch_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parallel = optimize_portfolios(expected_returns, covariance_df, problems, x0, workers=workers)
+        parallel_time = time.perf_counter() - start
+
+        # The wrappers round the weights to 3 decimals
+        diff = max(np.abs(np.round(batch['Weights'], 3) - np.array(loop_weights)).max(), np.abs(batch['Weights'] - parallel['Weights']).max())
+        print(f'{n_assets:>6} {len(problems):>8} {loop_time:>18.3f} {batch_time:>10.3f} {parallel_time:>21.3f} {diff:>16.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+### Compares the optimizers with analytic gradients against the same problems solved with scipy's finite differences
+
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import PortfolioOptimization
+from PortfolioOptimization import PortfolioSimpleOptimization, SharpeOptimalPortfolio
+from benchmarks.synthetic import synthetic_problem
+
+asset_counts = [10, 50, 100, 250, 500]
+
+
+@contextmanager
+def finite_differences():
+    # Strip the analytic derivatives before they reach SLSQP so it falls back to finite differences
+    original_minimize = PortfolioOptimization.minimize
+
+    def minimize(fun, x0, jac=None, constraints=(), **kwargs):
+        constraints = [{'type': c['type'], 'fun': c['fun']} for c in constraints]
+        return original_minimize(lambda x: fun(x)[0], x0, constraints=constraints, **kwargs)
+
+    PortfolioOptimization.minimize = minimize
+    try:
+        yield
+    finally:
+        PortfolioOptimization.minimize = original_minimize
+
+
+def time_call(function, repeat=3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'assets':>6} {'problem':>14} {'analytic (s)':>13} {'finite diff (s)':>16} {'speedup':>8} {'objective gap':>14}")
+    for n_assets in asset_counts:
+        returns, initial_weights, covariance_df = synthetic_problem(n_assets)
+        target_return = np.mean(list(returns.values()))
+        target_vol = 0.01
+        problems = {
+            'MinRisk': (lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MinRisk', target_return, 0.05, solver='slsqp'), 'Optimal Portfolio Volatility'),
+            'MaxReturn': (lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxReturn', target_vol, 0.05, solver='slsqp'), 'Optimal Portfolio Return'),
+            'MaxSharpe': (lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxSharpe', weight_change=0.05, solver='slsqp'), 'Optimal Sharpe Ratio'),
+            'RiskAdjusted': (lambda: SharpeOptimalPortfolio(returns, initial_weights, covariance_df, 0.01, 0.0001, 'Risk-Adjusted Maximization', 0.05, solver='slsqp'), 'Optimal RiskAdjusted Ratio'),
+        }
+        repeat = 3 if n_assets <= 100 else 1
+        for name, (solve, statistic) in problems.items():
+            analytic_time, analytic_result = time_call(solve, repeat)
+            with finite_differences():
+                fd_time, fd_result = time_call(solve, repeat)
+            gap = abs(analytic_result[statistic] - fd_result[statistic])
+            print(f'{n_assets:>6} {name:>14} {analytic_time:>13.4f} {fd_time:>16.4f} {fd_time / analytic_time:>7.1f}x {gap:>14.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+### Speed and solution quality of the QP backend of optimize_portfolios against SLSQP on the same problems: MinRisk at
+### the mean asset return, MaxReturn at the volatility of the initial weights, MaxSharpe and RiskAdjusted, all within
+### +- 5% of equal weights. The objective gap is relative, positive where the QP solution is better. The histories are
+### longer than the number of assets so the covariance is positive definite (box_qp also handles a singular one).
+### Under solver 'qp' a MaxSharpe below PortfolioOptimization.MAX_SHARPE_QP_VARIABLES runs on SLSQP, so its 50 assets row
+### times SLSQP twice.
+
+import time
+
+import numpy as np
+
+from PortfolioOptimization import optimize_portfolios
+from benchmarks.synthetic import synthetic_problem
+
+asset_counts = [50, 500, 2000]
+weight_change = 0.05
+
+
+def problem_rows(expected_returns, covariance):
+    x0 = np.full(len(expected_returns), 1 / len(expected_returns))
+    return {
+        'MinRisk': {'Optimization': 'MinRisk', 'Target': expected_returns.mean(), 'Weight Change': weight_change},
+        'MaxReturn': {'Optimization': 'MaxReturn', 'Target': np.sqrt(x0 @ covariance @ x0), 'Weight Change': weight_change},
+        'MaxSharpe': {'Optimization': 'MaxSharpe', 'Weight Change': weight_change},
+        'RiskAdjusted': {'Optimization': 'RiskAdjusted', 'Tau': 0.01, 'Riskfree Return': 0.0001, 'Weight Change': weight_change},
+    }
+
+
+def objective(name, result, problem, covariance):
+    # Value each problem maximizes, with the constraints SLSQP may leave slightly violated counted against it
+    weights = result['Weights'][0]
+    violation = abs(weights.sum() - 1)
+    if name == 'MinRisk':
+        return -result['Portfolio Volatility'][0], max(violation, problem['Target'] - result['Portfolio Return'][0])
+    if name == 'MaxReturn':
+        return result['Portfolio Return'][0], max(violation, result['Portfolio Volatility'][0] - problem['Target'])
+    if name == 'MaxSharpe':
+        return result['Sharpe Ratio'][0], violation
+    return result['RiskAdjusted Return'][0], 0.0
+
+
+def solve(expected_returns, covariance, problem, solver):
+    start = time.perf_counter()
+    result = optimize_portfolios(expected_returns, covariance, [problem], solver=solver)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'assets':>6} {'problem':>13} {'QP (s)':>9} {'SLSQP (s)':>10} {'speedup':>8} {'QP nit':>7} {'SLSQP nit':>10} "
+          f"{'objective gap':>14} {'QP violation':>13} {'SLSQP violation':>16}")
+    for n_assets in asset_counts:
+        returns, _, covariance_df = synthetic_problem(n_assets, n_days=max(1500, 2 * n_assets))
+        expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+        for name, problem in problem_rows(expected_returns, covariance).items():
+            qp, qp_time = solve(expected_returns, covariance, problem, 'qp')
+            slsqp, slsqp_time = solve(expected_returns, covariance, problem, 'slsqp')
+            (qp_value, qp_violation), (slsqp_value, slsqp_violation) = objective(name, qp, problem, covariance), objective(name, slsqp, problem, covariance)
+            gap = (qp_value - slsqp_value) / abs(slsqp_value)
+            print(f'{n_assets:>6} {name:>13} {qp_time:>9.3f} {slsqp_time:>10.3f} {slsqp_time / qp_time:>7.1f}x {qp["Iterations"][0]:>7} '
+                  f'{slsqp["Iterations"][0]:>10} {gap:>14.1e} {max(qp_violation, 0):>13.1e} {max(slsqp_violation, 0):>16.1e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+### Rolling VaR/CVaR over a long history: recomputing every window from scratch against the incremental
+### stream_var_cvar/rolling_var_cvar updates
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from ValueAtRisk import calculate_var_cvar_batch, rolling_var_cvar
+from benchmarks.synthetic import synthetic_returns
+
+n_days = 5000 # ~20 years of daily data
+problem_sizes = [(250, 100), (250, 300), (1000, 300), (2500, 300)] # (window, portfolios)
+sampled_windows = 200 # The from-scratch recompute is timed on a sample of windows and extrapolated
+
+
+def main():
+    scenarios = synthetic_returns(50, n_days, seed=6).values
+    print(f"{'window':>6} {'portfolios':>10} {'type':>10} {'from scratch (s)':>17} {'incremental (s)':>16} {'max diff':>9}")
+    for window, n_portfolios in problem_sizes:
+        weights = np.random.default_rng(6).dirichlet(np.ones(scenarios.shape[1]), n_portfolios).T
+        pfolio_returns = pd.DataFrame(scenarios @ weights)
+        identity = np.eye(n_portfolios)
+        days = np.linspace(window - 1, n_days - 1, sampled_windows).astype(int)
+        for type in ['normal', 'parametric']:
+            start = time.perf_counter()
+            var_df, cvar_df = rolling_var_cvar(pfolio_returns, window, type=type)
+            incremental_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            diff = 0
+            for day in days:
+                var, cvar = calculate_var_cvar_batch(pfolio_returns.values[day - window + 1:day + 1], identity, [0.05], type)
+                diff = max(diff, np.abs(var[0] - var_df.values[day]).max(), np.abs(cvar[0] - cvar_df.values[day]).max())
+            scratch_time = (time.perf_counter() - start) * (n_days - window + 1) / sampled_windows
+
+            print(f'{window:>6} {n_portfolios:>10} {type:>10} {scratch_time:>17.2f} {incremental_time:>16.2f} {diff:>9.1e}')
+
+
+if __name__ == '__main__':
+    main()
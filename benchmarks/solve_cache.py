@@ -0,0 +1,60 @@
+### Reruns of the same problem table with a SolveCache: cold run, identical rerun (every problem cached), rerun after a
+### small move of the expected returns (warm starts from the nearest cached solutions, against a cold solve of the moved
+### inputs) and a fresh cache reading the solutions from disk
+
+import tempfile
+import time
+
+import numpy as np
+
+from PortfolioOptimization import optimize_portfolios
+from SolveCache import SolveCache
+from benchmarks.optimization_batch import problem_table
+from benchmarks.synthetic import synthetic_problem
+
+asset_counts = [50, 150]
+
+
+def objective(problems, result):
+    # Value every problem maximizes
+    return np.select([problems['Optimization'] == 'MinRisk', problems['Optimization'] == 'MaxReturn'],
+                     [-result['Portfolio Volatility'], result['Portfolio Return']], result['RiskAdjusted Return'])
+
+
+def main():
+    print(f"{'assets':>6} {'run':>20} {'time (s)':>9} {'hits':>5} {'misses':>7} {'warm':>5} {'mean nit':>9} {'median shortfall':>17} {'worst shortfall':>16}")
+    for n_assets in asset_counts:
+        returns, initial_weights, covariance_df = synthetic_problem(n_assets)
+        expected_returns = np.array(list(returns.values()))
+        x0 = np.array(list(initial_weights.values()))
+        problems = problem_table(expected_returns)
+        moved_returns = expected_returns * (1 + np.random.default_rng(1).normal(0, 1e-3, n_assets))
+
+        with tempfile.TemporaryDirectory() as path:
+            cache = SolveCache(path=path)
+            runs = [('cold', expected_returns, cache), ('identical rerun', expected_returns, cache),
+                    ('moved, warm start', moved_returns, cache), ('moved, no cache', moved_returns, None),
+                    ('from disk', moved_returns, SolveCache(path=path))]
+            results, rows = {}, []
+            for name, mu, run_cache in runs:
+                before = run_cache.stats() if run_cache else {}
+                start = time.perf_counter()
+                results[name] = optimize_portfolios(mu, covariance_df, problems, x0, cache=run_cache)
+                seconds = time.perf_counter() - start
+                after = run_cache.stats() if run_cache else {}
+                counts = [after.get(key, 0) - before.get(key, 0) for key in ['Hits', 'Misses', 'Warm Starts']]
+                solved = ~results[name]['Cached']
+                rows.append((name, seconds, counts, results[name]['Iterations'][solved].mean() if solved.any() else 0))
+
+            # Objective of the moved problems against the better of the two solves (SLSQP stops within its tolerance)
+            warm, cold = objective(problems, results['moved, warm start']), objective(problems, results['moved, no cache'])
+            best = np.maximum(warm, cold)
+            shortfalls = {'moved, warm start': (best - warm) / np.abs(best), 'moved, no cache': (best - cold) / np.abs(best)}
+
+            for name, seconds, counts, nit in rows:
+                shortfall = f'{np.median(shortfalls[name]):>17.1e} {shortfalls[name].max():>16.1e}' if name in shortfalls else ''
+                print(f'{n_assets:>6} {name:>20} {seconds:>9.3f} {counts[0]:>5} {counts[1]:>7} {counts[2]:>5} {nit:>9.1f} {shortfall}'.rstrip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+### Reproducible benchmark suite: times every subsystem (optimizers, efficient and CVaR frontiers, VaR/CVaR, attribution)
+### on synthetic data with fixed seeds, saves the timings as JSON and checks them against a baseline run:
+###   python -m benchmarks.suite --size small --output baseline.json
+###   python -m benchmarks.suite --size small --baseline baseline.json --output current.json
+###   python -m benchmarks.suite --compare baseline.json current.json
+### --set assets=500 (repeatable) overrides a size of the preset, --only optimization (repeatable) runs the cases whose
+### name starts with it.
+### A case regresses when its best time is more than --tolerance (default 25%) above the baseline's; the exit status is
+### 1 when a case regressed. On a shared or virtual machine the millisecond cases need a looser tolerance. Cases are
+### only compared when both runs used the same sizes, and the machine section of the JSON tells whether the two runs
+### are comparable at all (the commit is recorded apart from it, runs of different commits are what the suite compares).
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from Frontier import compute_frontier, efficient_frontier, return_range
+from PortfolioAttribution import portfolio_attribution, render_attribution
+from PortfolioOptimization import PortfolioSimpleOptimization, SharpeOptimalPortfolio
+from ValueAtRisk import calculate_cvar, calculate_var, calculate_var_cvar_batch
+from benchmarks.synthetic import synthetic_attribution_inputs, synthetic_problem, synthetic_returns
+
+sizes = {
+    'small': {'assets': 50, 'days': 750, 'frontier_points': 1000, 'sweep_points': 50, 'cvar_assets': 20,
+              'cvar_scenarios': 500, 'cvar_points': 20, 'var_assets': 100, 'var_portfolios': 100,
+              'securities': 50, 'books': 3, 'attribution_days': 250},
+    'medium': {'assets': 200, 'days': 1500, 'frontier_points': 5000, 'sweep_points': 100, 'cvar_assets': 50,
+               'cvar_scenarios': 1500, 'cvar_points': 50, 'var_assets': 500, 'var_portfolios': 1000,
+               'securities': 200, 'books': 5, 'attribution_days': 500},
+    'large': {'assets': 1000, 'days': 2500, 'frontier_points': 10000, 'sweep_points': 200, 'cvar_assets': 100,
+              'cvar_scenarios': 2500, 'cvar_points': 100, 'var_assets': 2000, 'var_portfolios': 5000,
+              'securities': 1000, 'books': 10, 'attribution_days': 750},
+}
+weight_change = 0.05
+alphas = [0.01, 0.05]
+
+
+## Cases: every group builds its synthetic inputs once and yields (name, function) pairs, the functions are timed
+
+def optimization_cases(size):
+    returns, initial_weights, covariance_df = synthetic_problem(size['assets'], size['days'])
+    expected_returns = np.array(list(returns.values()))
+    x0 = np.array(list(initial_weights.values()))
+    volatility = np.sqrt(x0 @ covariance_df.to_numpy() @ x0)
+    yield 'optimization/MinRisk', lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MinRisk', expected_returns.mean(), weight_change)
+    yield 'optimization/MaxReturn', lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxReturn', volatility, weight_change)
+    yield 'optimization/MaxSharpe', lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxSharpe', None, weight_change)
+    yield 'optimization/RiskAdjusted', lambda: SharpeOptimalPortfolio(returns, initial_weights, covariance_df, 0.01, 0.0001, 'Risk-Adjusted Maximization', weight_change)
+    yield 'optimization/MaxSharpe slsqp', lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxSharpe', None, weight_change, solver='slsqp')
+    yield 'optimization/MaxSharpe 130/30', lambda: PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxSharpe', None, weight_change, gross_exposure=1.6)
+
+
+def _frontier_inputs(returns):
+    # Long-only frontier between the lowest and highest reachable returns, like EfficientFrontier.py
+    expected_returns = returns.mean().to_numpy()
+    bounds = [(0, 1)] * len(expected_returns)
+    return expected_returns, bounds, return_range(expected_returns, bounds)
+
+
+def frontier_cases(size):
+    returns = synthetic_returns(size['assets'], size['days'], seed=1)
+    expected_returns, bounds, (min_return, max_return) = _frontier_inputs(returns)
+    covariance = returns.cov().to_numpy()
+    targets = np.linspace(min_return, max_return, size['frontier_points'])
+    sweep_targets = np.linspace(min_return, max_return, size['sweep_points'])
+    yield 'frontier/critical-line', lambda: efficient_frontier(expected_returns, covariance, targets, bounds)
+    yield 'frontier/slsqp sweep', lambda: compute_frontier(expected_returns, sweep_targets, bounds, covariance=covariance)
+
+
+def cvar_frontier_cases(size):
+    returns = synthetic_returns(size['cvar_assets'], size['cvar_scenarios'], seed=2)
+    expected_returns, bounds, (min_return, max_return) = _frontier_inputs(returns)
+    targets = np.linspace(min_return, max_return, size['cvar_points'] + 2)[1:-1]
+    scenarios = returns.to_numpy()
+    yield 'cvar frontier/lp', lambda: compute_frontier(expected_returns, targets, bounds, scenarios=scenarios, risk='cvar')
+
+
+def var_cases(size):
+    returns = synthetic_returns(size['var_assets'], size['days'], seed=3)
+    weights = np.random.default_rng(3).dirichlet(np.ones(size['var_assets']), size['var_portfolios']).T
+    scenarios = returns.to_numpy()
+    for type in ['normal', 'parametric']:
+        yield f'var/calculate_var {type}', lambda type=type: [calculate_var(returns, alpha, type) for alpha in alphas]
+        yield f'var/calculate_cvar {type}', lambda type=type: [calculate_cvar(returns, alpha, type) for alpha in alphas]
+        yield f'var/batch {type}', lambda type=type: calculate_var_cvar_batch(scenarios, weights, alphas, type)
+
+
+def attribution_cases(size):
+    orders, history, holidays, nav_data = synthetic_attribution_inputs(size['securities'], size['books'], size['attribution_days'],
+                                                                       orders_per_day=size['securities'] // 2)
+    attribution = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+    yield 'attribution/portfolio_attribution', lambda: portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data)
+    yield 'attribution/render_attribution', lambda: render_attribution(attribution)
+
+
+case_groups = [optimization_cases, frontier_cases, cvar_frontier_cases, var_cases, attribution_cases]
+
+
+## Timing and comparison
+
+def time_case(function, repeat, budget, min_sample=0.05):
+    # Seconds per call over up to repeat samples after a warm-up call, fewer once the samples have taken budget
+    # seconds. A sample makes enough calls to last min_sample seconds, so the millisecond cases are not timer noise.
+    start = time.perf_counter()
+    function()
+    calls = max(1, int(np.ceil(min_sample / max(time.perf_counter() - start, 1e-9))))
+    seconds = []
+    while len(seconds) < repeat and (not seconds or sum(seconds) * calls < budget):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        seconds.append((time.perf_counter() - start) / calls)
+    return {'best': min(seconds), 'median': float(np.median(seconds)), 'calls': calls, 'runs': seconds}
+
+
+def machine():
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor(),
+            'cpus': os.cpu_count(), 'numpy': np.__version__, 'scipy': scipy.__version__, 'pandas': pd.__version__}
+
+
+def commit():
+    # The git commit the suite ran on, kept apart from the machine: comparing two commits is what the suite is for
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(size, only=None, repeat=5, budget=10.0):
+    warnings.simplefilter('ignore', FutureWarning)
+    cases = {}
+    for group in case_groups:
+        # The inputs of a group are only built when one of its cases is selected
+        for name, function in group(size):
+            if only and not any(name.startswith(pattern) for pattern in only):
+                continue
+            cases[name] = time_case(function, repeat, budget)
+            print(f"{name:>40} {cases[name]['best']:>10.4f} {cases[name]['median']:>10.4f} {len(cases[name]['runs']):>5}", flush=True)
+    return {'created': dt.datetime.now().isoformat(timespec='seconds'), 'commit': commit(), 'machine': machine(), 'sizes': size,
+            'cases': cases}
+
+
+def compare(baseline, current, tolerance=0.25):
+    # Prints the ratio of every case in both runs and returns the names of the ones that regressed
+    if baseline['sizes'] != current['sizes']:
+        print('The runs used different sizes, nothing compared')
+        return []
+    # Earlier runs kept the commit in the machine section, it never makes the machines differ
+    machines = [{key: value for key, value in run['machine'].items() if key != 'commit'} for run in (baseline, current)]
+    if machines[0] != machines[1]:
+        print('Warning: the runs come from different machines or library versions')
+    regressions = []
+    print(f"{'case':>40} {'baseline (s)':>13} {'current (s)':>12} {'ratio':>7}")
+    for name, result in current['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        ratio = result['best'] / baseline['cases'][name]['best']
+        status = ''
+        if ratio > 1 + tolerance:
+            status = 'REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            status = 'faster'
+        print(f"{name:>40} {baseline['cases'][name]['best']:>13.4f} {result['best']:>12.4f} {ratio:>7.2f} {status}".rstrip())
+    return regressions
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite on synthetic data')
+    parser.add_argument('--size', choices=list(sizes), default='small')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help='override a size of the preset')
+    parser.add_argument('--only', action='append', help='run the cases whose name starts with this text')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=10.0, help='seconds after which a case stops repeating')
+    parser.add_argument('--output', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare against')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='only compare two saved runs')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.compare:
+        return 1 if compare(load(args.compare[0]), load(args.compare[1]), args.tolerance) else 0
+
+    size = dict(sizes[args.size])
+    for setting in args.set:
+        name, value = setting.split('=')
+        if name not in size:
+            parser.error(f'unknown size {name}, expected one of {", ".join(size)}')
+        size[name] = int(value)
+
+    print(f"{'case':>40} {'best (s)':>10} {'median (s)':>10} {'runs':>5}")
+    results = run_suite(size, args.only, args.repeat, args.budget)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=1)
+    if args.baseline:
+        print()
+        return 1 if compare(load(args.baseline), results, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+### Synthetic market data used by the benchmarks, so performance can be measured without yfinance or the attribution workbook
+### Every generator takes its size and a seed (an int, or the np.random.Generator of a caller drawing several pieces)
+
+import numpy as np
+import pandas as pd
+
+
+def synthetic_returns(n_assets, n_days=1500, n_factors=5, seed=0):
+    # Daily returns driven by a few common factors plus idiosyncratic noise, so the covariance looks like a real universe
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 1, (n_assets, n_factors))
+    factors = rng.normal(0, 0.006, (n_days, n_factors))
+    noise = rng.normal(0, 0.012, (n_days, n_assets))
+    drift = rng.normal(0.0004, 0.0003, n_assets)
+    data = drift + factors @ loadings.T + noise
+    tickers = [f'A{i:04d}' for i in range(n_assets)]
+    dates = pd.bdate_range('2010-01-01', periods=n_days)
+    return pd.DataFrame(data, index=dates, columns=tickers)
+
+
+def synthetic_problem(n_assets, n_days=1500, seed=0):
+    # Inputs in the format PortfolioSimpleOptimization/SharpeOptimalPortfolio expect
+    returns = synthetic_returns(n_assets, n_days, seed=seed)
+    expected_returns = returns.mean().to_dict()
+    initial_weights = {ticker: 1 / n_assets for ticker in returns.columns}
+    covariance_df = returns.cov()
+    return expected_returns, initial_weights, covariance_df
+
+
+def synthetic_covariance(n_assets, n_days=1500, seed=0):
+    # Sample covariance of synthetic_returns (singular when n_assets > n_days, like a short real history)
+    return synthetic_returns(n_assets, n_days, seed=seed).cov()
+
+
+def synthetic_calendar(n_days, seed=0):
+    # Holidays (New Year, Christmas and a few random weekdays) and the first n_days business days from 2019-01-01
+    rng = np.random.default_rng(seed)
+    calendar = pd.date_range('2019-01-01', periods=int(n_days * 1.5), freq='D')
+    holidays = pd.Series(sorted(set(calendar[(calendar.month == 1) & (calendar.day == 1)])
+                                | set(calendar[(calendar.month == 12) & (calendar.day == 25)])
+                                | set(rng.choice(calendar[calendar.dayofweek < 5], n_days // 50, replace=False))))
+    business_days = pd.bdate_range(calendar[0], calendar[-1], freq='C', holidays=holidays.to_list())[:n_days]
+    return holidays, business_days
+
+
+def synthetic_nav(business_days, seed=0):
+    # Daily NAV around 100 million with a fixed number of shares, in the column layout of the attribution workbook
+    rng = np.random.default_rng(seed)
+    nav = 1e8 + np.cumsum(rng.normal(0, 2e5, len(business_days)))
+    return pd.DataFrame({
+        'Data': business_days,
+        'PL - Sirius': nav,
+        'Quantidade de Cotas': np.full(len(business_days), 1e6),
+        'Cota': nav / 1e6,
+    })
+
+
+attribution_security_types = ['Ações Listadas na B3', 'Ações Americanas', 'Ações Europeias', 'Futuros', 'Moedas']
+
+
+def synthetic_attribution_inputs(n_securities=50, n_books=3, n_days=500, orders_per_day=20, seed=0):
+    # Orders, price history, holidays and NAV in the column layout of the attribution workbook
+    # (the default orders_mapping/nav_mapping of PortfolioAttribution.py)
+    rng = np.random.default_rng(seed)
+    holidays, business_days = synthetic_calendar(n_days, rng)
+
+    securities = [f'SEC{i:04d}' for i in range(n_securities)]
+    security_types = np.array(attribution_security_types)[np.arange(n_securities) % len(attribution_security_types)]
+    prices = 50 * np.exp(np.cumsum(rng.normal(0, 0.015, (n_days, n_securities)), axis=0))
+    prices[:, security_types == 'Futuros'] = rng.normal(0, 1, (n_days, (security_types == 'Futuros').sum())) # Daily adjustment per contract
+    history = pd.DataFrame(prices, index=business_days, columns=securities)
+    history['PTAX'] = 5 * np.exp(np.cumsum(rng.normal(0, 0.008, n_days)))
+    history['EUR/BRL'] = 5.5 * np.exp(np.cumsum(rng.normal(0, 0.008, n_days)))
+
+    n_orders = orders_per_day * (n_days - 1)
+    order_days = np.sort(rng.integers(1, n_days, n_orders))
+    order_days[0] = 1
+    order_securities = rng.integers(0, n_securities, n_orders)
+    quantity = rng.integers(1, 100, n_orders) * 100
+    side = rng.choice(['C', 'V'], n_orders, p=[0.6, 0.4])
+    price = prices[order_days, order_securities]
+    orders = pd.DataFrame({
+        'Data': business_days[order_days],
+        'Classe': security_types[order_securities],
+        'Book': np.array([f'Book {i}' for i in range(n_books)])[rng.integers(0, n_books, n_orders)],
+        'Ativo': np.array(securities)[order_securities],
+        'Direção': side,
+        'Tamanho': quantity,
+        'Preço': price,
+        'Total da Ordem': np.where(side == 'C', -1, 1) * quantity * price,
+        'Dólar/Euro': history['PTAX'].values[order_days],
+    })
+    return orders, history, holidays, synthetic_nav(business_days, rng)
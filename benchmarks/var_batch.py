@@ -0,0 +1,41 @@
+### Scoring many candidate portfolios at several confidence levels: one calculate_var/calculate_cvar call per
+### portfolio and alpha against calculate_var_cvar_batch
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from ValueAtRisk import calculate_cvar, calculate_var, calculate_var_cvar_batch
+from benchmarks.synthetic import synthetic_returns
+
+problem_sizes = [(1500, 100), (1500, 1000), (5000, 1000), (5000, 5000)] # (scenarios, portfolios)
+n_assets = 50
+alphas = [0.01, 0.025, 0.05]
+sampled_portfolios = 50 # The per-portfolio loop is timed on a sample and extrapolated
+
+
+def main():
+    print(f"{'scenarios':>9} {'portfolios':>10} {'type':>10} {'per-call loop (s)':>18} {'batch (s)':>10} {'speedup':>8} {'max diff':>9}")
+    for n_scenarios, n_portfolios in problem_sizes:
+        scenarios = synthetic_returns(n_assets, n_scenarios, seed=5).values
+        weights = np.random.default_rng(5).dirichlet(np.ones(n_assets), n_portfolios).T
+        for type in ['normal', 'parametric']:
+            start = time.perf_counter()
+            var_values, cvar_values = calculate_var_cvar_batch(scenarios, weights, alphas, type)
+            batch_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            diff = 0
+            for k in range(sampled_portfolios):
+                pfolio_returns = pd.Series(scenarios @ weights[:, k])
+                for i, alpha in enumerate(alphas):
+                    diff = max(diff, abs(calculate_var(pfolio_returns, alpha, type) - var_values[i, k]),
+                               abs(calculate_cvar(pfolio_returns, alpha, type) - cvar_values[i, k]))
+            loop_time = (time.perf_counter() - start) * n_portfolios / sampled_portfolios
+
+            print(f'{n_scenarios:>9} {n_portfolios:>10} {type:>10} {loop_time:>18.3f} {batch_time:>10.3f} {loop_time / batch_time:>7.1f}x {diff:>9.1e}')
+
+
+if __name__ == '__main__':
+    main()
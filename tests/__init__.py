@@ -0,0 +1,3 @@
+### Tests of the portfolio tools. Every test runs offline on the synthetic data of benchmarks.synthetic, run them from the
+### repository root with:
+### python -m pytest tests
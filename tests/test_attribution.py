@@ -0,0 +1,74 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from PortfolioAttribution import attribution_range, attribution_state, portfolio_attribution, state_attribution, update_attribution_state
+from benchmarks.synthetic import synthetic_attribution_inputs
+
+checked_days = 30 # The last days of the history, across the turn of 2019 to 2020
+
+
+@pytest.fixture(autouse=True)
+def ignore_future_warnings():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        yield
+
+
+@pytest.fixture
+def inputs():
+    # Orders, history, holidays and NAV of 280 business days from 2019-01-02
+    return synthetic_attribution_inputs(20, 3, 280, orders_per_day=10, seed=2)
+
+
+def assert_same_attribution(actual, expected):
+    # Same rows and values, with NaN in the same places
+    actual = actual.reindex(expected.index)
+    np.testing.assert_array_equal(actual.isna().to_numpy(), expected.isna().to_numpy())
+    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=1e-9, atol=1e-6)
+
+
+def test_daily_updates_match_full_recompute(inputs):
+    orders, history, holidays, nav_data = inputs
+    dates, order_dates = pd.to_datetime(nav_data['Data']), pd.to_datetime(orders['Data'])
+    days = dates.iloc[-checked_days:]
+    assert days.iloc[0].year < days.iloc[-1].year
+    history = history.drop(days.iloc[5]) # A business day without prices, whose exposures are NaN
+    before = dates[dates < days.iloc[0]]
+    state = attribution_state(orders[order_dates < days.iloc[0]], nav_data[dates < days.iloc[0]], history, holidays, "Gross", nav_data, nav_data,
+                              end_date=before.iloc[-1].strftime('%Y-%m-%d'))
+    for day in days:
+        state = update_attribution_state(state, orders[order_dates == day], nav_data[dates == day], history.loc[history.index == day])
+        full = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data, end_date=day.strftime('%Y-%m-%d'))
+        assert_same_attribution(state_attribution(state), full)
+
+
+def test_update_with_a_skipped_day_raises(inputs):
+    orders, history, holidays, nav_data = inputs
+    dates, order_dates = pd.to_datetime(nav_data['Data']), pd.to_datetime(orders['Data'])
+    last, following, skipped = dates.iloc[-4], dates.iloc[-3], dates.iloc[-2]
+    state = attribution_state(orders[order_dates <= last], nav_data[dates <= last], history, holidays, "Gross", nav_data, nav_data,
+                              end_date=last.strftime('%Y-%m-%d'))
+
+    def update(day):
+        return update_attribution_state(state, orders[order_dates == day], nav_data[dates == day], history.loc[history.index == day], date=day)
+
+    with pytest.raises(ValueError, match=f'{following:%Y-%m-%d}'):
+        update(skipped)
+    weekend = last + pd.Timedelta(days=(5 - last.dayofweek) % 7 or 7)
+    with pytest.raises(ValueError):
+        update(weekend)
+    full = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data, end_date=following.strftime('%Y-%m-%d'))
+    assert_same_attribution(state_attribution(update(following)), full)
+
+
+def test_range_matches_full_recompute(inputs):
+    orders, history, holidays, nav_data = inputs
+    days = pd.to_datetime(nav_data['Data']).iloc[-checked_days:]
+    backfill = attribution_range(orders, nav_data, history, holidays, days.iloc[0], days.iloc[-1])
+    assert list(backfill.index.get_level_values('DATE').unique()) == list(days)
+    for day in days:
+        full = portfolio_attribution(orders, nav_data, history, holidays, "Gross", nav_data, nav_data, end_date=day.strftime('%Y-%m-%d'))
+        assert_same_attribution(backfill.loc[day], full)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+
+import Frontier
+from Frontier import compute_frontier, efficient_frontier, return_range
+from Instrumentation import recording
+from benchmarks.synthetic import synthetic_returns
+
+
+@pytest.fixture
+def tight_slsqp(monkeypatch):
+    # SLSQP run to a tight tolerance, so its frontier is comparable with the exact critical line one
+    original_minimize = Frontier.minimize
+
+    def minimize(*args, **kwargs):
+        return original_minimize(*args, options={'ftol': 1e-15, 'maxiter': 1000}, **kwargs)
+
+    monkeypatch.setattr(Frontier, 'minimize', minimize)
+
+
+@pytest.mark.parametrize('n_assets, ties', [(4, False), (15, False), (15, True)])
+def test_critical_line_matches_slsqp(tight_slsqp, n_assets, ties):
+    returns = synthetic_returns(n_assets, seed=n_assets)
+    expected_returns, covariance = returns.mean().values, returns.cov().values
+    if ties:
+        expected_returns[1::3] = expected_returns[0] # Equal expected returns, which the critical line has to break
+    bounds = [(-1, 1)] * n_assets
+    target_returns = np.linspace(*return_range(expected_returns, bounds), 30)[1:-1]
+
+    with recording() as recorder:
+        exact = efficient_frontier(expected_returns, covariance, target_returns, bounds)
+    # Without ties the frontier is the critical line itself, not the SLSQP sweep it falls back to
+    assert ties or not [entry for entry in recorder.records if entry['kind'] == 'fallback']
+    sweep = efficient_frontier(expected_returns, covariance, target_returns, bounds, method='slsqp')
+    np.testing.assert_allclose(exact['Expected Return'], target_returns, rtol=0, atol=1e-12)
+    assert (exact['Expected Volatility'] <= sweep['Expected Volatility'] * (1 + 1e-9)).all()
+    np.testing.assert_allclose(exact['Expected Volatility'], sweep['Expected Volatility'], rtol=1e-6)
+
+
+def cvar_objective(portfolio_returns, alpha):
+    # Rockafellar-Uryasev objective min over zeta of zeta + mean(max(-r - zeta, 0)) / alpha, reached at one of the losses
+    losses = -np.asarray(portfolio_returns)
+    zeta = losses[:, None]
+    return (zeta[:, 0] + np.maximum(losses[None, :] - zeta, 0).mean(axis=1) / alpha).min()
+
+
+def primal_cvar_lp(expected_returns, scenarios, target, bounds, alpha):
+    # The Rockafellar-Uryasev linear program itself, over (w, zeta, u)
+    n_scenarios, n_assets = scenarios.shape
+    cost = np.concatenate([np.zeros(n_assets), [1], np.full(n_scenarios, 1 / (alpha * n_scenarios))])
+    A_ub = np.hstack([-scenarios, -np.ones((n_scenarios, 1)), -np.eye(n_scenarios)]) # -r_t'w - zeta - u_t <= 0
+    A_eq = np.vstack([np.concatenate([np.ones(n_assets), [0], np.zeros(n_scenarios)]),
+                      np.concatenate([expected_returns, [0], np.zeros(n_scenarios)])])
+    lp_bounds = list(bounds) + [(None, None)] + [(0, None)] * n_scenarios
+    result = linprog(cost, A_ub=A_ub, b_ub=np.zeros(n_scenarios), A_eq=A_eq, b_eq=[1, target], bounds=lp_bounds, method='highs')
+    assert result.status == 0
+    return result.fun
+
+
+@pytest.mark.parametrize('alpha', [0.05, 0.1])
+def test_cvar_lp_matches_primal_lp(alpha):
+    # compute_frontier solves the dual of the linear program, its weights must reach the primal optimum
+    returns = synthetic_returns(8, 400, seed=4)
+    expected_returns, scenarios = returns.mean().values, returns.values
+    bounds = [(-0.75, 1)] * 8
+    target_returns = np.linspace(*return_range(expected_returns, bounds), 7)[1:-1]
+
+    frontier = compute_frontier(expected_returns, target_returns, bounds, scenarios=scenarios, risk='cvar', alpha=alpha, method='lp')
+    weights = frontier['Weights']
+    lower, upper = np.array(bounds).T
+    assert (weights >= lower - 1e-9).all() and (weights <= upper + 1e-9).all()
+    np.testing.assert_allclose(weights.sum(axis=1), 1, atol=1e-9)
+    np.testing.assert_allclose(weights @ expected_returns, target_returns, rtol=1e-7)
+    for target, w in zip(target_returns, weights):
+        np.testing.assert_allclose(cvar_objective(scenarios @ w, alpha), primal_cvar_lp(expected_returns, scenarios, target, bounds, alpha), rtol=1e-7)
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from MarketData import FileProvider, load_prices
+
+
+class CountingProvider(FileProvider):
+    # A FileProvider that records every range it is asked for
+    def __init__(self, path):
+        super().__init__(path)
+        self.calls = []
+
+    def fetch(self, tickers, start_date, end_date):
+        self.calls.append((sorted(tickers), start_date, end_date))
+        return super().fetch(tickers, start_date, end_date)
+
+
+def write_prices(directory, ticker, dates):
+    pd.Series(np.linspace(100, 110, len(dates)), index=dates, name='Close').to_csv(directory / f'{ticker}.csv')
+
+
+def test_ranges_without_prices_are_covered(tmp_path):
+    prices_dir = tmp_path / 'prices'
+    prices_dir.mkdir()
+    write_prices(prices_dir, 'AAA', pd.bdate_range('2020-01-01', '2020-12-31'))
+    write_prices(prices_dir, 'NEW', pd.bdate_range('2020-07-01', '2020-12-31')) # Listed in July
+    provider = CountingProvider(str(prices_dir))
+    cache_dir = str(tmp_path / 'cache')
+
+    # A weekend: the provider answers without prices, the range is covered and never asked for again
+    weekend = load_prices(['AAA'], '2020-03-07', '2020-03-08', provider=provider, cache_dir=cache_dir)
+    assert weekend.empty and len(provider.calls) == 1
+    load_prices(['AAA'], '2020-03-07', '2020-03-08', provider=provider, cache_dir=cache_dir)
+    assert len(provider.calls) == 1
+
+    # Before the listing: only NaN for the new ticker, and the whole year is covered after the first call
+    first = load_prices(['AAA', 'NEW'], '2020-01-01', '2020-12-31', provider=provider, cache_dir=cache_dir)
+    assert first['NEW'][:'2020-06-30'].isna().all() and first['NEW']['2020-07-01':].notna().all()
+    calls = len(provider.calls)
+    again = load_prices(['AAA', 'NEW'], '2020-01-01', '2020-12-31', provider=provider, cache_dir=cache_dir)
+    assert len(provider.calls) == calls
+    pd.testing.assert_frame_equal(again, first)
+
+
+def test_failed_ranges_are_asked_again(tmp_path):
+    prices_dir = tmp_path / 'prices'
+    prices_dir.mkdir()
+    provider = CountingProvider(str(prices_dir))
+    cache_dir = str(tmp_path / 'cache')
+
+    # No file for the ticker: a failure, so the range stays uncovered
+    missing = load_prices(['LATE'], '2020-03-02', '2020-03-06', provider=provider, cache_dir=cache_dir)
+    assert missing['LATE'].isna().all()
+    load_prices(['LATE'], '2020-03-02', '2020-03-06', provider=provider, cache_dir=cache_dir)
+    assert len(provider.calls) == 2
+
+    # Once the provider has the prices they come through and are cached
+    dates = pd.bdate_range('2020-03-02', '2020-03-06')
+    write_prices(prices_dir, 'LATE', dates)
+    found = load_prices(['LATE'], '2020-03-02', '2020-03-06', provider=provider, cache_dir=cache_dir)
+    assert list(found.index) == list(dates) and found['LATE'].notna().all() and len(provider.calls) == 3
+    load_prices(['LATE'], '2020-03-02', '2020-03-06', provider=provider, cache_dir=cache_dir)
+    assert len(provider.calls) == 3
@@ -0,0 +1,184 @@
+import numpy as np
+import pytest
+
+import PortfolioOptimization
+from Instrumentation import recording
+from PortfolioOptimization import PortfolioSimpleOptimization, SharpeOptimalPortfolio, optimize_portfolios
+from benchmarks.synthetic import synthetic_problem
+
+
+def central_differences(function, x, step=1e-6):
+    columns = []
+    for i in range(len(x)):
+        shift = np.zeros(len(x))
+        shift[i] = step
+        columns.append((np.asarray(function(x + shift)) - np.asarray(function(x - shift))) / (2 * step))
+    return np.array(columns).T
+
+
+@pytest.fixture
+def slsqp_calls(monkeypatch):
+    # The objectives and constraints every SLSQP solve receives, recorded before the solve runs
+    calls = []
+    original_minimize = PortfolioOptimization.minimize
+
+    def minimize(fun, x0, constraints=(), **kwargs):
+        calls.append((fun, np.array(x0, dtype=float), list(constraints)))
+        return original_minimize(fun, x0, constraints=constraints, **kwargs)
+
+    monkeypatch.setattr(PortfolioOptimization, 'minimize', minimize)
+    return calls
+
+
+@pytest.mark.parametrize('limits', [{}, {'gross_exposure': 1.4}])
+def test_analytic_gradients_match_finite_differences(slsqp_calls, limits):
+    returns, initial_weights, covariance_df = synthetic_problem(12, seed=1)
+    target_return = np.mean(list(returns.values()))
+    PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MinRisk', target_return, 0.2, solver='slsqp', **limits)
+    PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxReturn', 0.01, 0.2, solver='slsqp', **limits)
+    PortfolioSimpleOptimization(returns, initial_weights, covariance_df, 'MaxSharpe', weight_change=0.2, solver='slsqp', **limits)
+    SharpeOptimalPortfolio(returns, initial_weights, covariance_df, 0.01, 0.0001, 'Risk-Adjusted Maximization', 0.2, solver='slsqp', **limits)
+    assert len(slsqp_calls) == 4
+
+    rng = np.random.default_rng(0)
+    for fun, x0, constraints in slsqp_calls:
+        x = x0 + rng.uniform(-0.01, 0.01, len(x0)) # Away from the starting point, where every weight is equal
+        value, gradient = fun(x)
+        numeric = central_differences(lambda z: fun(z)[0], x)
+        np.testing.assert_allclose(gradient, numeric, rtol=1e-5, atol=1e-7 * np.abs(gradient).max())
+        for constraint in constraints:
+            jacobian = np.asarray(constraint['jac'](x), dtype=float)
+            numeric = central_differences(constraint['fun'], x).reshape(jacobian.shape)
+            np.testing.assert_allclose(jacobian, numeric, rtol=1e-5, atol=1e-7 * max(np.abs(jacobian).max(), 1e-12))
+
+
+def objectives(result, problems):
+    # The figure every problem optimizes, larger is better
+    values = []
+    for i, problem in enumerate(problems):
+        if problem['Optimization'] == 'MinRisk':
+            values.append(-result['Portfolio Volatility'][i])
+        elif problem['Optimization'] == 'MaxReturn':
+            values.append(result['Portfolio Return'][i])
+        elif problem['Optimization'] == 'MaxSharpe':
+            values.append(result['Sharpe Ratio'][i])
+        else:
+            values.append(result['RiskAdjusted Return'][i])
+    return np.array(values)
+
+
+def constraint_violation(result, problems, bounds):
+    excess = np.maximum(bounds[..., 0] - result['Weights'], result['Weights'] - bounds[..., 1]).max(axis=1)
+    for i, problem in enumerate(problems):
+        if problem['Optimization'] == 'MinRisk':
+            excess[i] = max(excess[i], problem['Target'] - result['Portfolio Return'][i])
+        elif problem['Optimization'] == 'MaxReturn':
+            excess[i] = max(excess[i], result['Portfolio Volatility'][i] - problem['Target'])
+        if problem['Optimization'] != 'RiskAdjusted':
+            excess[i] = max(excess[i], abs(result['Net Exposure'][i] - 1))
+    return excess
+
+
+@pytest.fixture
+def tight_slsqp(monkeypatch):
+    # SLSQP run to a tight tolerance, so its optimum is comparable with the exact QP one
+    original_minimize = PortfolioOptimization.minimize
+
+    def minimize(*args, **kwargs):
+        return original_minimize(*args, options={'ftol': 1e-15, 'maxiter': 1000}, **kwargs)
+
+    monkeypatch.setattr(PortfolioOptimization, 'minimize', minimize)
+
+
+@pytest.fixture
+def qp_max_sharpe(monkeypatch):
+    # MaxSharpe on the QP at any size, the small ones otherwise go to SLSQP
+    monkeypatch.setattr(PortfolioOptimization, 'MAX_SHARPE_QP_VARIABLES', 0)
+
+
+@pytest.mark.parametrize('n_assets, n_days', [(20, 750), (60, 1500)])
+def test_qp_matches_slsqp(tight_slsqp, qp_max_sharpe, n_assets, n_days):
+    returns, _, covariance_df = synthetic_problem(n_assets, n_days, seed=n_assets)
+    expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+    x0 = np.full(n_assets, 1 / n_assets)
+    problems = [{'Optimization': 'MinRisk', 'Target': expected_returns.mean()},
+                {'Optimization': 'MaxReturn', 'Target': np.sqrt(x0 @ covariance @ x0)},
+                {'Optimization': 'MaxSharpe'},
+                {'Optimization': 'RiskAdjusted', 'Tau': 0.01}]
+    problems = [dict(problem, **{'Weight Change': 0.05}) for problem in problems]
+    bounds = np.array([PortfolioOptimization._weight_bounds(x0, 0.05)] * len(problems))
+
+    qp = optimize_portfolios(expected_returns, covariance, problems, solver='qp')
+    slsqp = optimize_portfolios(expected_returns, covariance, problems, solver='slsqp')
+    assert qp['Success'].all()
+    assert (constraint_violation(qp, problems, bounds) <= 1e-9).all()
+    # The QP is exact: never worse than SLSQP, and the same optimum (the covariance is positive definite)
+    qp_values, slsqp_values = objectives(qp, problems), objectives(slsqp, problems)
+    assert (qp_values >= slsqp_values - 1e-6 * np.abs(slsqp_values)).all()
+    np.testing.assert_allclose(qp_values, slsqp_values, rtol=1e-6)
+    np.testing.assert_allclose(qp['Weights'], slsqp['Weights'], atol=1e-4)
+
+
+@pytest.mark.parametrize('limits', [{}, {'Gross Exposure': 1.5, 'Min Net Exposure': 0.5, 'Max Net Exposure': 1.0}])
+def test_max_sharpe_over_the_riskfree_return(tight_slsqp, qp_max_sharpe, limits):
+    returns, _, covariance_df = synthetic_problem(20, 750, seed=3)
+    expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+    riskfree_return = 0.5 * expected_returns.mean()
+    problems = [{'Optimization': 'MaxSharpe', 'Weight Change': 0.1, 'Riskfree Return': rf, **limits} for rf in (riskfree_return, 0.0)]
+    qp = optimize_portfolios(expected_returns, covariance, problems, solver='qp')
+    slsqp = optimize_portfolios(expected_returns, covariance, problems, solver='slsqp')
+    assert qp['Success'].all()
+    np.testing.assert_allclose(qp['Sharpe Ratio'], slsqp['Sharpe Ratio'], rtol=1e-6)
+    if not limits: # With a net exposure range every scaling of the portfolio within the limits has the same ratio
+        np.testing.assert_allclose(qp['Weights'], slsqp['Weights'], atol=1e-4)
+
+    # The portfolio of the risk-free problem has the best Sharpe ratio over rf, better than the one found without rf
+    excess = (qp['Weights'] @ expected_returns - riskfree_return * qp['Net Exposure']) / qp['Portfolio Volatility']
+    np.testing.assert_allclose(excess[0], qp['Sharpe Ratio'][0], rtol=1e-12)
+    assert excess[0] > excess[1] * (1 + 1e-6)
+
+
+def test_qp_singular_covariance():
+    # More assets than dates: the sample covariance is singular, the QP still solves every problem
+    returns, _, covariance_df = synthetic_problem(60, 40, seed=0)
+    expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+    problems = [{'Optimization': 'MinRisk', 'Target': expected_returns.mean(), 'Weight Change': 0.05},
+                {'Optimization': 'RiskAdjusted', 'Tau': 0.5},
+                {'Optimization': 'RiskAdjusted', 'Tau': 5.0, 'Weight Change': 0.05}]
+    qp = optimize_portfolios(expected_returns, covariance, problems, solver='qp')
+    slsqp = optimize_portfolios(expected_returns, covariance, problems, solver='slsqp')
+    assert qp['Success'].all()
+    qp_values, slsqp_values = objectives(qp, problems), objectives(slsqp, problems)
+    assert (qp_values >= slsqp_values - 1e-6 * np.abs(slsqp_values)).all()
+
+
+def solve_backends(expected_returns, covariance, problems):
+    with recording() as recorder:
+        result = optimize_portfolios(expected_returns, covariance, problems, solver='qp')
+    return result, [entry['backend'] for entry in recorder.records if entry['kind'] == 'solve']
+
+
+def test_max_sharpe_backend():
+    # SLSQP for a small MaxSharpe, the QP from MAX_SHARPE_QP_VARIABLES variables (twice the assets with limits) or
+    # with a singular covariance, and the QP for the other problems whatever their size
+    returns, _, covariance_df = synthetic_problem(50, 750, seed=0)
+    expected_returns, covariance = np.array(list(returns.values())), covariance_df.values
+    problems = [{'Optimization': 'MaxSharpe', 'Weight Change': 0.05},
+                {'Optimization': 'MaxSharpe', 'Weight Change': 0.05, 'Gross Exposure': 1.6},
+                {'Optimization': 'MinRisk', 'Target': expected_returns.mean(), 'Weight Change': 0.05}]
+    result, backends = solve_backends(expected_returns, covariance, problems)
+    assert result['Success'].all() and backends == ['slsqp', 'qp', 'qp']
+
+    returns, _, covariance_df = synthetic_problem(60, 40, seed=0)
+    result, backends = solve_backends(np.array(list(returns.values())), covariance_df.values, [{'Optimization': 'MaxSharpe'}])
+    assert result['Success'].all() and backends == ['qp']
+
+
+def test_unbounded_max_sharpe_does_not_fall_back():
+    # Portfolios of zero variance and positive return within the gross exposure limit: the Sharpe ratio is unbounded,
+    # a failed QP is returned as it is rather than handed to SLSQP, which would run to its iteration limit
+    returns, _, covariance_df = synthetic_problem(100, 50, seed=0)
+    problems = [{'Optimization': 'MaxSharpe', 'Gross Exposure': 1.6}]
+    result, backends = solve_backends(np.array(list(returns.values())), covariance_df.values, problems)
+    assert backends == ['qp']
+    assert not np.isnan(result['Portfolio Volatility']).any()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from PortfolioOptimization import optimize_portfolios
+from SolveCache import SolveCache
+from benchmarks.synthetic import synthetic_problem
+
+
+def test_failed_solves_are_not_cached(tmp_path):
+    returns, _, covariance_df = synthetic_problem(10, seed=0)
+    expected_returns = np.array(list(returns.values()))
+    # A return target above every feasible portfolio fails on both backends
+    problems = [{'Optimization': 'MinRisk', 'Target': 10 * expected_returns.max(), 'Weight Change': 0.05},
+                {'Optimization': 'MinRisk', 'Target': expected_returns.mean(), 'Weight Change': 0.05}]
+    cache = SolveCache(path=tmp_path)
+    first = optimize_portfolios(expected_returns, covariance_df, problems, cache=cache)
+    assert list(first['Success']) == [False, True]
+    assert cache.stats()['Size'] == cache.stats()['Files'] == 1
+
+    for rerun_cache in (cache, SolveCache(path=tmp_path)):
+        rerun = optimize_portfolios(expected_returns, covariance_df, problems, cache=rerun_cache)
+        assert list(rerun['Cached']) == [False, True]
+        np.testing.assert_array_equal(rerun['Weights'][1], first['Weights'][1])
+
+
+def test_disk_keeps_the_most_recently_used(tmp_path):
+    cache = SolveCache(max_size=2, path=tmp_path, max_disk=3)
+    for i in range(5):
+        cache.put(f'key{i}', np.full(3, i), True, 1, 'MinRisk', np.zeros(4))
+    assert cache.get('key2') is not None # Read back from disk, now the most recently used
+    cache.put('key5', np.full(3, 5), True, 1, 'MinRisk', np.zeros(4))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['key2.npz', 'key4.npz', 'key5.npz']
+
+    reopened = SolveCache(path=tmp_path, max_disk=2)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['key2.npz', 'key5.npz']
+    assert reopened.get('key4') is None and reopened.get('key2') is not None
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from MonteCarlo import scenario_model, simulate_scenarios, simulate_var_cvar
+from ValueAtRisk import calculate_cvar, calculate_var, calculate_var_cvar_batch, rolling_var_cvar, stream_var_cvar
+from benchmarks.synthetic import synthetic_returns
+
+alphas = [0.01, 0.05, 0.1]
+
+
+@pytest.fixture
+def portfolio_returns():
+    # Returns of 20 assets and 30 portfolios of them
+    scenarios = synthetic_returns(20, 600, seed=5).values
+    weights = np.random.default_rng(5).dirichlet(np.ones(20), 30).T
+    return scenarios, weights
+
+
+@pytest.mark.parametrize('type', ['normal', 'parametric'])
+def test_batch_matches_calculate_var(portfolio_returns, type):
+    scenarios, weights = portfolio_returns
+    # A small chunk_size so the portfolios go through several column blocks
+    var_values, cvar_values = calculate_var_cvar_batch(scenarios, weights, alphas, type, chunk_size=600 * 7)
+    assert var_values.shape == cvar_values.shape == (len(alphas), weights.shape[1])
+    frame = pd.DataFrame(scenarios @ weights)
+    for i, alpha in enumerate(alphas):
+        np.testing.assert_allclose(var_values[i], calculate_var(frame, alpha, type), rtol=1e-12)
+        np.testing.assert_allclose(cvar_values[i], calculate_cvar(frame, alpha, type), rtol=1e-12)
+
+
+@pytest.mark.parametrize('type', ['normal', 'parametric'])
+def test_rolling_matches_calculate_var(portfolio_returns, type):
+    scenarios, weights = portfolio_returns
+    frame = pd.DataFrame(scenarios @ weights[:, :5])
+    window = 120
+    var_frame, cvar_frame = rolling_var_cvar(frame, window, alpha=0.05, type=type)
+    assert var_frame.iloc[:window - 1].isna().all().all() and cvar_frame.iloc[:window - 1].isna().all().all()
+    for day in range(window - 1, len(frame), 37):
+        window_returns = frame.iloc[day - window + 1:day + 1]
+        np.testing.assert_allclose(var_frame.iloc[day], calculate_var(window_returns, 0.05, type), rtol=1e-9)
+        np.testing.assert_allclose(cvar_frame.iloc[day], calculate_cvar(window_returns, 0.05, type), rtol=1e-9)
+
+
+@pytest.mark.parametrize('type', ['normal', 'parametric'])
+def test_stream_matches_rolling(portfolio_returns, type):
+    scenarios, weights = portfolio_returns
+    pfolio_returns = scenarios @ weights[:, :3]
+    var_frame, cvar_frame = rolling_var_cvar(pd.DataFrame(pfolio_returns), 60, alpha=0.05, type=type)
+    streamed = list(stream_var_cvar(iter(pfolio_returns), 60, alpha=0.05, type=type))
+    np.testing.assert_allclose(np.array([var for var, _ in streamed]), var_frame.to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(np.array([cvar for _, cvar in streamed]), cvar_frame.to_numpy(), rtol=1e-12)
+
+
+@pytest.mark.parametrize('distribution', ['normal', 't'])
+def test_montecarlo_matches_its_scenarios(portfolio_returns, distribution):
+    scenarios, weights = portfolio_returns
+    weights = weights[:, :6].copy()
+    weights[:, 5] = 0 # A riskless portfolio, every scenario returns the same
+    model = scenario_model(pd.DataFrame(scenarios), distribution)
+    n_scenarios, chunk_size = 100003, 4096
+    simulated = np.concatenate(list(simulate_scenarios(model.project(weights), n_scenarios, chunk_size, seed=1)))
+    expected = calculate_var_cvar_batch(simulated, np.eye(6), alphas)
+
+    # The running tail, then tails too large for tail_size (the chunks drawn again to select the VaR), on a pool too
+    for options in [{}, {'tail_size': 2000}, {'tail_size': 50, 'workers': 3}]:
+        var_values, cvar_values = simulate_var_cvar(model, weights, alphas, n_scenarios, chunk_size, seed=1, **options)
+        np.testing.assert_array_equal(var_values, expected[0])
+        np.testing.assert_allclose(cvar_values, expected[1], rtol=1e-12)